@@ -1,43 +1,269 @@
-from flask import Flask, render_template, jsonify, request, session, redirect, url_for
+import time
+
+# Startup time is counted from here, so it includes the imports below
+_started = time.perf_counter()
+
+from flask import Flask, Response, g, render_template, jsonify, request, session, redirect, url_for, stream_with_context
+import base64
+import gc
 import json
+import math
 import os
+import threading
+from contextlib import contextmanager
 from dotenv import load_dotenv
-from openai import OpenAI
-from flask_session import Session
 from functools import wraps
+from graph_analytics import AnalyticsRunner
+from graph_backends import create_backend
+from graph_batch import run_batch
+from graph_events import EventBroadcaster, stream_events
+from graph_extract import ExtractionError, GraphExtractor, merge_into_graph
+from graph_import import ImportFormatError, StreamingImporter, iter_records, node_fields, normalize_node
+from graph_layout import DEFAULT_ITERATIONS, MAX_ITERATIONS, compute_layout
+from graph_schema import iter_sql_schema, mongodb_schema, sql_schema
+from graph_search import SearchIndex
+from graph_store import GraphStore, field_error
+from llm_cache import ResponseCache, make_cache_key
+from llm_jobs import DeadlineExceeded, LLMExecutor, QueueFull, create_job_backend
+from rate_limit import RateLimited, TokenBucketLimiter
+from session_store import CachedSessionInterface, create_session_backend
+from user_store import Authenticator, create_user_backend
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
 
+# Behind nginx, take the client address from the X-Forwarded-For entries
+# appended by this many trusted proxies (login rate limits key on it)
+if int(os.getenv('TRUSTED_PROXIES', '0')):
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=int(os.getenv('TRUSTED_PROXIES')))
+
 # Session configuration
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
-app.config['SESSION_TYPE'] = 'filesystem'
-Session(app)
+app.config['PERMANENT_SESSION_LIFETIME'] = int(os.getenv('SESSION_TTL', '43200'))
+
+# Sessions live in a backend shared by the workers ('sqlite'), in the
+# process ('memory', single worker only), or in signed cookies ('cookie');
+# server-side sessions are read through an LRU cache (see session_store.py)
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'sqlite')
+session_backend = create_session_backend(SESSION_BACKEND, path=os.getenv('SESSION_DB_PATH'))
+if session_backend is not None:
+    app.session_interface = CachedSessionInterface(
+        session_backend,
+        ttl=app.permanent_session_lifetime.total_seconds(),
+        max_entries=int(os.getenv('SESSION_CACHE_SIZE', '10000')),
+        cache_ttl=float(os.getenv('SESSION_CACHE_TTL', '10')),
+        sweep_interval=float(os.getenv('SESSION_SWEEP_INTERVAL', '300'))
+    )
+
+# Milliseconds spent in each startup phase, and the latency of the first
+# request each worker serves; see /api/startup/metrics
+startup_metrics = {'phases': {}, 'startup_ms': None, 'initialized': False}
+_first_request = {'pid': None, 'path': None, 'latency_ms': None}
+_first_request_lock = threading.Lock()
+
+
+@contextmanager
+def startup_phase(name):
+    """Time a step of application startup."""
+    started = time.perf_counter()
+    yield
+    startup_metrics['phases'][name] = round((time.perf_counter() - started) * 1000, 3)
+
 
-# Initialize sample data when app starts
 @app.before_request
-def init_data_once():
-    """Initialize sample data on first request if empty."""
-    if len(nodes) == 0 and len(edges) == 0:
-        initialize_sample_data()
-    # Remove this handler after first execution
-    app.before_request_funcs[None].remove(init_data_once)
+def sync_graph():
+    """Pick up graph changes committed by other workers."""
+    graph.refresh()
+    if _first_request['pid'] != os.getpid():
+        g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_first_request(response):
+    """Record how long the first request of this process took."""
+    if _first_request['pid'] != os.getpid() and 'request_started' in g:
+        with _first_request_lock:
+            # A forked worker inherits the parent's values, so compare pids
+            if _first_request['pid'] != os.getpid():
+                _first_request['latency_ms'] = round((time.perf_counter() - g.request_started) * 1000, 3)
+                _first_request['path'] = request.path
+                _first_request['pid'] = os.getpid()
+    return response
 
 # Configuration flag for OpenAI NLP tab
 ENABLE_OPENAI_NLP = os.getenv('ENABLE_OPENAI_NLP', 'true').lower() == 'true'
 
-# Initialize OpenAI client
+# OpenAI client, created by create_app() and shared by every request so its
+# HTTP connection pool is reused
 openai_client = None
-if ENABLE_OPENAI_NLP:
+
+
+def create_openai_client():
+    """
+    Build the OpenAI client if the NLP feature is enabled and configured.
+    
+    The openai package is only imported here, so deployments without the
+    feature never pay for loading it. The timeout bounds how long a call
+    can hold a pool worker.
+    """
     api_key = os.getenv('OPENAI_API_KEY')
-    if api_key:
-        openai_client = OpenAI(api_key=api_key)
+    if not ENABLE_OPENAI_NLP or not api_key:
+        return None
+    from openai import OpenAI
+    return OpenAI(
+        api_key=api_key,
+        timeout=float(os.getenv('OPENAI_TIMEOUT', '20')),
+        max_retries=int(os.getenv('OPENAI_MAX_RETRIES', '1'))
+    )
+
+# Per-chunk results of /api/nlp/extract, keyed by chunk hash
+extraction_cache = ResponseCache(
+    max_entries=int(os.getenv('NLP_EXTRACT_CACHE_SIZE', '4096')),
+    ttl=float(os.getenv('NLP_EXTRACT_CACHE_TTL', '86400'))
+)
+
+# Model calls run on a bounded pool instead of the request threads; async
+# jobs are recorded in a backend shared by the workers ('sqlite') or in the
+# process ('memory', single worker only), so any worker can answer a poll
+JOB_BACKEND = os.getenv('JOB_BACKEND', 'sqlite')
+llm_pool = LLMExecutor(
+    max_workers=int(os.getenv('OPENAI_WORKERS', '4')),
+    max_queue=int(os.getenv('OPENAI_QUEUE_SIZE', '16')),
+    deadline=float(os.getenv('OPENAI_DEADLINE', '25')),
+    job_ttl=float(os.getenv('OPENAI_JOB_TTL', '600')),
+    backend=create_job_backend(JOB_BACKEND, path=os.getenv('JOB_DB_PATH'))
+)
+
+# Cache OpenAI answers so repeated admin questions cost no extra tokens
+openai_cache = ResponseCache(
+    max_entries=int(os.getenv('OPENAI_CACHE_SIZE', '256')),
+    ttl=float(os.getenv('OPENAI_CACHE_TTL', '3600'))
+)
+
+# Store nodes and edges in memory, backed by a storage backend: 'sqlite'
+# shares the graph between gunicorn workers, 'log' persists it with
+# snapshots and an append-only log for a single worker
+GRAPH_BACKEND = os.getenv('GRAPH_BACKEND', 'memory')
+with startup_phase('graph_load'):
+    graph = GraphStore(
+        create_backend(GRAPH_BACKEND, path=os.getenv('GRAPH_DB_PATH')),
+        change_log_size=int(os.getenv('GRAPH_CHANGE_LOG_SIZE', '10000'))
+    )
+
+# Push committed changes to Server-Sent Events clients
+graph_events = EventBroadcaster()
+graph.add_listener(graph_events.on_graph_change)
+
+# PageRank, components and centrality, computed once per graph version;
+# graphs above ANALYTICS_INLINE_EDGES are analyzed on a process pool
+analytics = AnalyticsRunner(
+    workers=int(os.getenv('ANALYTICS_WORKERS', '1')),
+    inline_edges=int(os.getenv('ANALYTICS_INLINE_EDGES', '200000')),
+    samples=int(os.getenv('ANALYTICS_SAMPLES', '64'))
+)
+
+# Label and id search, updated incrementally from committed changes
+with startup_phase('search_index'):
+    search_index = SearchIndex(graph)
+graph.add_listener(search_index.on_graph_change)
+
+# Serialized bodies of read-only graph views, valid for a single graph version
+_response_cache = {'etag': None, 'bodies': {}}
+_response_cache_lock = threading.Lock()
+
+
+def versioned_json_response(key, build):
+    """
+    Serve a read-only view of the graph with conditional GET support.
+    
+    The response carries the graph version as a strong ETag and a matching
+    If-None-Match gets a 304. The serialized body is cached per version,
+    so repeated polling never re-serializes an unchanged graph.
+    
+    Args:
+        key: Cache key identifying the view, or None to skip the body cache
+        build: Callable returning the dict to serialize
+    """
+    etag = graph.etag
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    elif key is None:
+        response = Response(app.json.dumps(build()) + '\n', mimetype='application/json')
+    else:
+        with _response_cache_lock:
+            body = _response_cache['bodies'].get(key) if _response_cache['etag'] == etag else None
+        if body is None:
+            # Built after reading etag, so the body is never older than its
+            # ETag; a newer one only makes the client fetch again
+            body = app.json.dumps(build()) + '\n'
+            with _response_cache_lock:
+                if graph.etag == etag:
+                    if _response_cache['etag'] != etag:
+                        _response_cache['etag'] = etag
+                        _response_cache['bodies'] = {}
+                    _response_cache['bodies'][key] = body
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(cursor):
+    """Encode a store cursor as an opaque URL-safe token."""
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode('utf-8')).decode('ascii').rstrip('=')
 
-# Store nodes and edges in memory
-nodes = {}
-edges = []
+
+def decode_cursor(token, length):
+    """Decode a cursor token; raises ValueError if it is malformed."""
+    try:
+        cursor = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'Invalid cursor ({e})')
+    if (not isinstance(cursor, list) or len(cursor) != length
+            or not all(isinstance(cursor[i], int) for i in range(0, length, 2))):
+        raise ValueError('Invalid cursor')
+    return cursor
+
+
+def paged_json_response(collection, fetch, cursor_length, **filters):
+    """
+    Serve one page of a listing.
+    
+    Query parameters:
+        limit: Page size, 1 to MAX_PAGE_SIZE
+        cursor: next_cursor from the previous page
+        fields: Comma-separated fields to keep in each item
+    
+    Pages are not cached, but carry the graph ETag, so an unchanged page
+    can still be revalidated with If-None-Match.
+    """
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify(error=f'limit must be between 1 and {MAX_PAGE_SIZE}'), 400
+    try:
+        after = decode_cursor(request.args['cursor'], cursor_length) if 'cursor' in request.args else None
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    fields = request.args.get('fields')
+    
+    def build():
+        items, next_cursor = fetch(after=after, limit=limit, **filters)
+        if fields:
+            keep = fields.split(',')
+            items = [{key: item[key] for key in keep if key in item} for item in items]
+        return {
+            collection: items,
+            'next_cursor': None if next_cursor is None else encode_cursor(next_cursor)
+        }
+    
+    return versioned_json_response(None, build)
 
 # Initialize with sample data
 def initialize_sample_data():
@@ -58,22 +284,36 @@ def initialize_sample_data():
     ]
     
     for node in sample_nodes:
-        nodes[node['id']] = node
+        graph.add_node(node)
     
     for edge in sample_edges:
-        edges.append({
-            'id': f"{edge['source']}-{edge['target']}",
-            'source': edge['source'],
-            'target': edge['target'],
-            'relation': edge['relation']
-        })
-
-# Demo credentials (in production, use a proper database)
-VALID_USERS = {
+        graph.add_edge(edge['source'], edge['target'], edge['relation'])
+
+# Demo credentials, added to an empty user store when SEED_DEMO_USERS is true
+DEMO_USERS = {
     'user': {'password': 'user123', 'role': 'user'},
     'admin': {'password': 'admin123', 'role': 'admin'}
 }
 
+# Accounts with scrypt password hashes; logins are rate limited per IP and
+# per username before any hashing (see user_store.py)
+with startup_phase('authenticator'):
+    authenticator = Authenticator(
+        create_user_backend(os.getenv('USER_BACKEND', 'memory'), path=os.getenv('USER_DB_PATH')),
+        app.config['SECRET_KEY'],
+        ip_limiter=TokenBucketLimiter(
+            rate=float(os.getenv('LOGIN_IP_RATE', '0.5')),
+            burst=int(os.getenv('LOGIN_IP_BURST', '20'))
+        ),
+        user_limiter=TokenBucketLimiter(
+            rate=float(os.getenv('LOGIN_USER_RATE', '0.1')),
+            burst=int(os.getenv('LOGIN_USER_BURST', '5'))
+        ),
+        max_hashes=int(os.getenv('LOGIN_MAX_HASHES', '2')),
+        hash_wait=float(os.getenv('LOGIN_HASH_WAIT', '1')),
+        n=int(os.getenv('PASSWORD_SCRYPT_N', str(2 ** 14)))
+    )
+
 # Decorator to require login
 def login_required(f):
     @wraps(f)
@@ -114,9 +354,20 @@ def login():
                 return jsonify(error='Username and password required'), 400
             return render_template('login.html', error='Username and password required')
         
-        if username in VALID_USERS and VALID_USERS[username]['password'] == password:
+        try:
+            user = authenticator.authenticate(username, password, request.remote_addr)
+        except RateLimited as e:
+            if request.is_json:
+                response = jsonify(error=str(e))
+            else:
+                response = app.make_response(render_template('login.html', error=str(e)))
+            response.status_code = 429
+            response.headers['Retry-After'] = str(math.ceil(e.retry_after))
+            return response
+        
+        if user is not None:
             session['user_id'] = username
-            session['role'] = VALID_USERS[username]['role']
+            session['role'] = user['role']
             session['username'] = username
             
             if request.is_json:
@@ -157,137 +408,414 @@ def nlp_screen():
 
 @app.route('/api/nodes', methods=['GET', 'POST'])
 def manage_nodes():
-    """Get all nodes or create a new node."""
+    """
+    Get all nodes or create a new node.
+    
+    GET returns every node, or one page of them when any of limit, cursor,
+    type or fields is given (see paged_json_response).
+    """
     if request.method == 'POST':
-        data = request.json
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify(error='Request body must be a JSON object'), 400
         node_id = data.get('id')
         node_label = data.get('label')
         node_type = data.get('type', 'default')
         
         if not node_id or not node_label:
             return jsonify(error='Node ID and label are required'), 400
+        error = field_error('node', data)
+        if error is not None:
+            return jsonify(error=error), 400
         
-        if node_id in nodes:
-            return jsonify(error='Node with this ID already exists'), 409
-        
-        nodes[node_id] = {
+        node = {
             'id': node_id,
             'label': node_label,
             'type': node_type,
             'x': data.get('x', 0),
             'y': data.get('y', 0)
         }
-        return jsonify(node=nodes[node_id]), 201
+        if not graph.add_node(node):
+            return jsonify(error='Node with this ID already exists'), 409
+        return jsonify(node=node), 201
     
-    return jsonify(nodes=list(nodes.values())), 200
+    if request.args.keys() & {'limit', 'cursor', 'type', 'fields'}:
+        return paged_json_response('nodes', graph.page_nodes, 2, node_type=request.args.get('type'))
+    
+    return versioned_json_response('nodes', lambda: {'nodes': graph.nodes()})
 
 
 @app.route('/api/nodes/<node_id>', methods=['GET', 'DELETE', 'PUT'])
 def manage_node(node_id):
     """Get, update, or delete a specific node."""
     if request.method == 'GET':
-        if node_id not in nodes:
+        node = graph.get_node(node_id)
+        if node is None:
             return jsonify(error='Node not found'), 404
-        return jsonify(node=nodes[node_id]), 200
+        return jsonify(node=node), 200
     
     elif request.method == 'PUT':
-        if node_id not in nodes:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify(error='Request body must be a JSON object of fields to update'), 400
+        error = field_error('node', data)
+        if error is not None:
+            return jsonify(error=error), 400
+        node = graph.update_node(node_id, data)
+        if node is None:
             return jsonify(error='Node not found'), 404
-        data = request.json
-        nodes[node_id].update(data)
-        return jsonify(node=nodes[node_id]), 200
+        return jsonify(node=node), 200
     
     elif request.method == 'DELETE':
-        if node_id not in nodes:
+        # Removes edges connected to this node as well
+        if not graph.delete_node(node_id):
             return jsonify(error='Node not found'), 404
-        del nodes[node_id]
-        # Remove edges connected to this node
-        edges[:] = [e for e in edges if e['source'] != node_id and e['target'] != node_id]
         return jsonify(message='Node deleted'), 200
 
 
+MAX_TRAVERSAL_DEPTH = 10
+MAX_TRAVERSAL_NODES = 10000
+
+
+@app.route('/api/nodes/<node_id>/neighbors', methods=['GET'])
+def get_node_neighbors(node_id):
+    """
+    Get the neighborhood of a node by breadth-first search.
+    
+    Query parameters:
+        depth: Hops to expand, 1 to MAX_TRAVERSAL_DEPTH (default 1)
+        direction: 'out', 'in' or 'both' (default 'both')
+        limit: Maximum nodes returned, start node included (default 500)
+    """
+    depth = request.args.get('depth', 1, type=int)
+    direction = request.args.get('direction', 'both')
+    limit = request.args.get('limit', 500, type=int)
+    if not 1 <= depth <= MAX_TRAVERSAL_DEPTH:
+        return jsonify(error=f'depth must be between 1 and {MAX_TRAVERSAL_DEPTH}'), 400
+    if not 1 <= limit <= MAX_TRAVERSAL_NODES:
+        return jsonify(error=f'limit must be between 1 and {MAX_TRAVERSAL_NODES}'), 400
+    
+    started = time.perf_counter()
+    try:
+        result = graph.neighborhood(node_id, depth=depth, direction=direction, limit=limit)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    if result is None:
+        return jsonify(error='Node not found'), 404
+    return jsonify(
+        node_id=node_id,
+        depth=depth,
+        direction=direction,
+        took_ms=round((time.perf_counter() - started) * 1000, 3),
+        **result
+    ), 200
+
+
+@app.route('/api/graph/path', methods=['GET'])
+def get_shortest_path():
+    """
+    Find a shortest path between two nodes by bidirectional breadth-first search.
+    
+    Query parameters:
+        source, target: End points (required)
+        direction: 'out' follows edges forward, 'in' backward, 'both' either way (default 'out')
+        max_depth: Longest path to look for in hops (optional)
+    """
+    source = request.args.get('source')
+    target = request.args.get('target')
+    if not source or not target:
+        return jsonify(error='Source and target are required'), 400
+    
+    started = time.perf_counter()
+    try:
+        result = graph.shortest_path(
+            source,
+            target,
+            direction=request.args.get('direction', 'out'),
+            max_depth=request.args.get('max_depth', type=int)
+        )
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    if result is None:
+        return jsonify(error='Source or target node not found'), 404
+    return jsonify(
+        source=source,
+        target=target,
+        found=result['path'] is not None,
+        length=None if result['path'] is None else len(result['path']) - 1,
+        took_ms=round((time.perf_counter() - started) * 1000, 3),
+        **result
+    ), 200
+
+
+MAX_SEARCH_RESULTS = 100
+
+
+@app.route('/api/search', methods=['GET'])
+def search_nodes():
+    """
+    Search nodes by the words of their label or id.
+    
+    Query parameters:
+        q: Words that must all match whole words of a node
+        prefix: Typeahead text; its last word matches as a prefix
+        type: Only return nodes of this type (optional)
+        limit: Maximum results, 1 to MAX_SEARCH_RESULTS (default 20)
+    """
+    q = request.args.get('q', '')
+    prefix = request.args.get('prefix', '')
+    limit = request.args.get('limit', 20, type=int)
+    if not q.strip() and not prefix.strip():
+        return jsonify(error='q or prefix is required'), 400
+    if not 1 <= limit <= MAX_SEARCH_RESULTS:
+        return jsonify(error=f'limit must be between 1 and {MAX_SEARCH_RESULTS}'), 400
+    
+    started = time.perf_counter()
+    result = search_index.search(q=q, prefix=prefix, node_type=request.args.get('type'), limit=limit)
+    return jsonify(
+        count=len(result['results']),
+        took_ms=round((time.perf_counter() - started) * 1000, 3),
+        **result
+    ), 200
+
+
 @app.route('/api/edges', methods=['GET', 'POST'])
 def manage_edges():
-    """Get all edges or create a new edge."""
+    """
+    Get all edges or create a new edge.
+    
+    GET returns every edge, or one page of them when any of limit, cursor,
+    source, target, relation or fields is given (see paged_json_response).
+    """
     if request.method == 'POST':
-        data = request.json
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify(error='Request body must be a JSON object'), 400
         source = data.get('source')
         target = data.get('target')
         relation = data.get('relation', 'related_to')
         
         if not source or not target:
             return jsonify(error='Source and target are required'), 400
+        error = field_error('edge', {'source': source, 'target': target, 'relation': relation})
+        if error is not None:
+            return jsonify(error=error), 400
         
-        if source not in nodes or target not in nodes:
-            return jsonify(error='Source or target node not found'), 404
-        
-        # Check if edge already exists
-        for edge in edges:
-            if edge['source'] == source and edge['target'] == target:
-                return jsonify(error='Edge already exists'), 409
-        
-        edge = {
-            'id': f"{source}-{target}",
-            'source': source,
-            'target': target,
-            'relation': relation
-        }
-        edges.append(edge)
+        with graph.transaction():
+            if not graph.has_node(source) or not graph.has_node(target):
+                return jsonify(error='Source or target node not found'), 404
+            
+            edge = graph.add_edge(source, target, relation)
+        if edge is None:
+            return jsonify(error='Edge already exists'), 409
         return jsonify(edge=edge), 201
     
-    return jsonify(edges=edges), 200
+    if request.args.keys() & {'limit', 'cursor', 'source', 'target', 'relation', 'fields'}:
+        return paged_json_response(
+            'edges',
+            graph.page_edges,
+            3,
+            source=request.args.get('source'),
+            target=request.args.get('target'),
+            relation=request.args.get('relation')
+        )
+    
+    return versioned_json_response('edges', lambda: {'edges': graph.edges()})
 
 
 @app.route('/api/edges/<edge_id>', methods=['GET', 'DELETE'])
 def manage_edge(edge_id):
     """Get or delete a specific edge."""
     if request.method == 'GET':
-        for edge in edges:
-            if edge['id'] == edge_id:
-                return jsonify(edge=edge), 200
-        return jsonify(error='Edge not found'), 404
+        edge = graph.get_edge(edge_id)
+        if edge is None:
+            return jsonify(error='Edge not found'), 404
+        return jsonify(edge=edge), 200
     
     elif request.method == 'DELETE':
-        for i, edge in enumerate(edges):
-            if edge['id'] == edge_id:
-                edges.pop(i)
-                return jsonify(message='Edge deleted'), 200
-        return jsonify(error='Edge not found'), 404
+        if not graph.delete_edge(edge_id):
+            return jsonify(error='Edge not found'), 404
+        return jsonify(message='Edge deleted'), 200
 
 
 @app.route('/api/graph', methods=['GET'])
 def get_graph():
     """Get the entire graph (nodes and edges)."""
+    return versioned_json_response('graph', lambda: dict(zip(('nodes', 'edges'), graph.snapshot()[1:])))
+
+
+# Layouts computed for the current graph version, by (incremental, iterations)
+_layout_cache = {'etag': None, 'results': {}}
+
+
+def cached_layout(incremental, iterations):
+    """Compute a layout of the current graph version at most once."""
+    etag = graph.etag
+    key = (incremental, iterations)
+    with _response_cache_lock:
+        result = _layout_cache['results'].get(key) if _layout_cache['etag'] == etag else None
+    if result is None:
+        started = time.perf_counter()
+        result = compute_layout(graph, iterations=iterations, incremental=incremental)
+        result['took_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        # Stored like versioned_json_response bodies: only while etag is current
+        with _response_cache_lock:
+            if graph.etag == etag:
+                if _layout_cache['etag'] != etag:
+                    _layout_cache['etag'] = etag
+                    _layout_cache['results'] = {}
+                _layout_cache['results'][key] = result
+    return result
+
+
+@app.route('/api/graph/layout', methods=['GET', 'POST'])
+def layout_graph():
+    """
+    Compute node positions with a force-directed layout.
+    
+    Query parameters:
+        mode: 'full' places every node; 'incremental' keeps placed nodes and
+            only relaxes nodes still at x=0, y=0 and their neighbours
+            (default 'full')
+        iterations: Simulation steps, 1 to MAX_ITERATIONS (default 50)
+    
+    GET returns the positions, computed once per graph version. POST also
+    writes them to the nodes in one transaction.
+    """
+    mode = request.args.get('mode', 'full')
+    iterations = request.args.get('iterations', DEFAULT_ITERATIONS, type=int)
+    if mode not in ('full', 'incremental'):
+        return jsonify(error="Invalid mode: use 'full' or 'incremental'"), 400
+    if not 1 <= iterations <= MAX_ITERATIONS:
+        return jsonify(error=f'iterations must be between 1 and {MAX_ITERATIONS}'), 400
+    incremental = mode == 'incremental'
+    
+    try:
+        if request.method == 'GET':
+            return versioned_json_response(('layout', incremental, iterations),
+                                           lambda: cached_layout(incremental, iterations))
+        
+        result = cached_layout(incremental, iterations)
+        with graph.transaction():
+            updates = [
+                {'id': node_id, 'x': x, 'y': y}
+                for node_id, (x, y) in result['positions'].items()
+                if graph.has_node(node_id)
+            ]
+            if updates:
+                graph.merge_nodes(updates)
+        return jsonify(
+            message='Layout applied',
+            mode=result['mode'],
+            nodes_moved=len(updates),
+            took_ms=result['took_ms']
+        ), 200
+    except RuntimeError as e:
+        return jsonify(error=str(e)), 503
+
+
+@app.route('/api/graph/changes', methods=['GET'])
+def get_graph_changes():
+    """
+    Get the changes made to the graph since a known version.
+    
+    Query parameters:
+        since: Graph version the client already has
+        instance: Instance id returned with that version
+    
+    Returns the deltas when the change log still covers `since`, otherwise
+    a full snapshot flagged with snapshot=true.
+    """
+    since = request.args.get('since', type=int)
+    instance = request.args.get('instance')
+    
+    if since is not None and instance in (None, graph.instance_id):
+        version, changes = graph.changes_since(since)
+        if changes is not None:
+            return jsonify(
+                version=version,
+                instance=graph.instance_id,
+                since=since,
+                snapshot=False,
+                changes=changes
+            ), 200
+    
+    version, nodes, edges = graph.snapshot()
     return jsonify(
-        nodes=list(nodes.values()),
+        version=version,
+        instance=graph.instance_id,
+        snapshot=True,
+        nodes=nodes,
         edges=edges
     ), 200
 
 
+@app.route('/api/graph/stream', methods=['GET'])
+def stream_graph():
+    """
+    Stream graph changes as Server-Sent Events.
+    
+    Sends a 'change' event per committed mutation and a 'reset' event when
+    the client must refetch the graph. Each event id is the graph version,
+    so a reconnecting EventSource resumes from its Last-Event-ID. Each open
+    stream holds a connection, which the default gevent worker class serves
+    from a greenlet (see gunicorn_config.py). Writes made by other workers
+    arrive as 'change' events within graph_events.POLL_SECONDS.
+    """
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    last_version = int(last_event_id) if last_event_id.isdigit() else None
+    response = Response(
+        stream_events(graph_events, graph, last_version),
+        mimetype='text/event-stream'
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    # Keep nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @app.route('/api/graph/clear', methods=['DELETE'])
 def clear_graph():
     """Clear all nodes and edges."""
-    nodes.clear()
-    edges[:] = []
+    graph.clear()
     return jsonify(message='Graph cleared'), 200
 
 
 @app.route('/api/graph/sample', methods=['POST'])
 def load_sample_data():
     """Load sample graph data."""
-    nodes.clear()
-    edges[:] = []
-    initialize_sample_data()
+    with graph.transaction():
+        graph.clear()
+        initialize_sample_data()
     return jsonify(
         message='Sample data loaded',
-        nodes=list(nodes.values()),
-        edges=edges
+        nodes=graph.nodes(),
+        edges=graph.edges()
     ), 200
 
 
 @app.route('/api/graph/import', methods=['POST'])
 def import_graph():
-    """Import a graph from JSON."""
+    """
+    Import a graph from JSON.
+    
+    By default the imported graph replaces the current one. With
+    ?mode=merge it is upserted instead: nodes by id (given fields replace
+    stored ones), edges by (source, target) (a new relation replaces the
+    stored one), and the response counts inserted, updated and skipped
+    items. A merge costs O(imported items), not O(graph).
+    
+    Requests sent as application/x-ndjson are parsed incrementally from the
+    request stream instead (see graph_import.py).
+    """
+    mode = request.args.get('mode', 'replace')
+    if mode not in ('replace', 'merge'):
+        return jsonify(error="Invalid mode: use 'replace' or 'merge'"), 400
+    merge = mode == 'merge'
+    
+    if request.mimetype == 'application/x-ndjson':
+        return import_graph_stream(merge)
+    
     try:
         data = request.json
         
@@ -297,244 +825,303 @@ def import_graph():
         imported_nodes = data.get('nodes', [])
         imported_edges = data.get('edges', [])
         
+        if not isinstance(imported_nodes, list) or not isinstance(imported_edges, list):
+            return jsonify(error='Invalid graph format: nodes and edges must be lists'), 400
+        
         # Validate nodes
         for node in imported_nodes:
             if not isinstance(node, dict) or 'id' not in node or 'label' not in node:
                 return jsonify(error='Invalid node format: each node must have id and label'), 400
+            error = field_error('node', node)
+            if error is not None:
+                return jsonify(error=f'Invalid node format: {error}'), 400
         
-        # Validate edges
+        # Validate edges before writing anything, so a bad edge leaves the graph untouched
+        imported_ids = {node['id'] for node in imported_nodes}
         for edge in imported_edges:
             if not isinstance(edge, dict) or 'source' not in edge or 'target' not in edge:
                 return jsonify(error='Invalid edge format: each edge must have source and target'), 400
+            error = field_error('edge', {
+                'source': edge['source'], 'target': edge['target'], 'relation': edge.get('relation', 'related_to')
+            })
+            if error is not None:
+                return jsonify(error=f'Invalid edge format: {error}'), 400
+            for endpoint in (edge['source'], edge['target']):
+                if endpoint not in imported_ids and not (merge and graph.has_node(endpoint)):
+                    return jsonify(error=f"Edge references non-existent node: {edge['source']} or {edge['target']}"), 400
         
-        # Clear existing data
-        nodes.clear()
-        edges[:] = []
+        edges = [
+            {'source': edge['source'], 'target': edge['target'], 'relation': edge.get('relation', 'related_to')}
+            for edge in imported_edges
+        ]
         
-        # Import nodes
-        for node in imported_nodes:
-            node_id = node.get('id')
-            nodes[node_id] = {
-                'id': node_id,
-                'label': node.get('label', ''),
-                'type': node.get('type', 'default'),
-                'x': node.get('x', 0),
-                'y': node.get('y', 0)
-            }
+        if merge:
+            with graph.transaction():
+                nodes = [
+                    node_fields(node) if graph.has_node(node['id']) else normalize_node(node)
+                    for node in imported_nodes
+                ]
+                node_counts = graph.merge_nodes(nodes)
+                edge_counts = graph.merge_edges(edges)
+            return jsonify(
+                message='Graph merged successfully',
+                nodes_count=graph.node_count(),
+                edges_count=graph.edge_count(),
+                nodes=dict(zip(('inserted', 'updated', 'skipped'), node_counts)),
+                edges=dict(zip(('inserted', 'updated', 'skipped'), edge_counts))
+            ), 200
         
-        # Import edges
-        for edge in imported_edges:
-            source = edge.get('source')
-            target = edge.get('target')
+        with graph.transaction():
+            # Clear existing data
+            graph.clear()
             
-            # Validate that nodes exist
-            if source not in nodes or target not in nodes:
-                return jsonify(error=f'Edge references non-existent node: {source} or {target}'), 400
+            # Import nodes
+            graph.put_nodes([normalize_node(node) for node in imported_nodes])
             
-            # Check for duplicate
-            if any(e['source'] == source and e['target'] == target for e in edges):
-                continue  # Skip duplicate edges
-            
-            edges.append({
-                'id': f"{source}-{target}",
-                'source': source,
-                'target': target,
-                'relation': edge.get('relation', 'related_to')
-            })
+            # Import edges; duplicate edges are skipped by the store
+            graph.add_edges(edges)
         
         return jsonify(
             message='Graph imported successfully',
-            nodes_count=len(nodes),
-            edges_count=len(edges)
+            nodes_count=graph.node_count(),
+            edges_count=graph.edge_count()
         ), 200
     
     except Exception as e:
         return jsonify(error=f'Import error: {str(e)}'), 400
 
 
-@app.route('/api/schemas/sql', methods=['GET'])
-def generate_sql_schema():
-    """Generate SQL schema from domain model."""
-    try:
-        sql_statements = []
-        
-        # Create tables for each node type
-        node_types = set(node['type'] for node in nodes.values())
-        
-        for node_type in node_types:
-            type_nodes = [n for n in nodes.values() if n['type'] == node_type]
-            
-            table_name = node_type.lower() + 's'
-            sql = f"""-- Table for {node_type} entities
-CREATE TABLE {table_name} (
-    id VARCHAR(255) PRIMARY KEY,
-    label VARCHAR(255) NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
-"""
-            sql_statements.append(sql)
-        
-        # Create junction tables for relationships
-        for edge in edges:
-            junction_table = f"{edge['source']}_to_{edge['target']}"
-            sql = f"""-- Relationship table for {edge['relation']}
-CREATE TABLE {junction_table} (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    source_id VARCHAR(255) NOT NULL,
-    target_id VARCHAR(255) NOT NULL,
-    relation VARCHAR(255) NOT NULL DEFAULT '{edge['relation']}',
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (source_id) REFERENCES {edge['source']}(id),
-    FOREIGN KEY (target_id) REFERENCES {edge['target']}(id),
-    UNIQUE KEY unique_relation (source_id, target_id, relation)
-);
-"""
-            sql_statements.append(sql)
-        
-        sql_schema = '\n'.join(sql_statements)
+def import_graph_stream(merge=False):
+    """
+    Import NDJSON read from the request stream in batches.
+    
+    The graph is replaced unless merge is set, in which case the records
+    are upserted into it.
+    
+    Query parameters:
+        batch_size: Records inserted per batch
+        progress: 'true' to stream one NDJSON progress line per batch
+    """
+    batch_size = request.args.get('batch_size', 5000, type=int)
+    importer = StreamingImporter(graph, batch_size=max(batch_size, 1), merge=merge)
+    
+    def run():
+        with graph.transaction():
+            if not merge:
+                graph.clear()
+            yield from importer.run(iter_records(request.stream))
+    
+    if request.args.get('progress', 'false').lower() == 'true':
+        progress_lines = run()
+        # Errors before the first batch is flushed still get a 400; later
+        # ones can only end the stream with an error line
+        try:
+            first = next(progress_lines)
+        except ImportFormatError as e:
+            return jsonify(error=f'Import error: {str(e)}'), 400
         
+        def generate():
+            try:
+                yield json.dumps(first) + '\n'
+                for progress in progress_lines:
+                    yield json.dumps(progress) + '\n'
+            except ImportFormatError as e:
+                yield json.dumps({'error': f'Import error: {str(e)}', 'done': True}) + '\n'
+            finally:
+                progress_lines.close()
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    
+    try:
+        for progress in run():
+            pass
+    except ImportFormatError as e:
+        return jsonify(error=f'Import error: {str(e)}'), 400
+    
+    if merge:
         return jsonify(
-            schema_type='SQL',
-            database='MySQL/PostgreSQL',
-            schema=sql_schema,
-            table_count=len(node_types),
-            relationship_count=len(edges)
+            message='Graph merged successfully',
+            nodes_count=graph.node_count(),
+            edges_count=graph.edge_count(),
+            **progress['merge']
         ), 200
+    
+    return jsonify(
+        message='Graph imported successfully',
+        nodes_count=graph.node_count(),
+        edges_count=graph.edge_count(),
+        duplicate_edges=progress['duplicate_edges']
+    ), 200
+
+
+MAX_BATCH_OPERATIONS = int(os.getenv('GRAPH_BATCH_MAX_OPS', '50000'))
+
+
+@app.route('/api/graph/batch', methods=['POST'])
+def batch_graph():
+    """
+    Apply a list of node and edge operations atomically.
+    
+    Takes {"operations": [...]} with add_node, update_node, delete_node,
+    add_edge, update_edge and delete_edge operations (see graph_batch.py),
+    applied in order in one transaction. Every operation is validated
+    before anything is written: if any fails the graph is untouched and
+    the response carries the status of the first error and every error
+    with its operation index. Otherwise the response lists one result per
+    operation, with the status the matching per-element route would return.
+    """
+    data = request.get_json(silent=True)
+    operations = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(operations, list):
+        return jsonify(error='Invalid batch format: must contain a list of operations'), 400
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify(error=f'A batch holds at most {MAX_BATCH_OPERATIONS} operations'), 413
+    
+    started = time.perf_counter()
+    applied, results = run_batch(graph, operations)
+    took_ms = round((time.perf_counter() - started) * 1000, 3)
+    if not applied:
+        return jsonify(
+            error=f"Operation {results[0]['index']}: {results[0]['error']}",
+            applied=False,
+            errors=results,
+            took_ms=took_ms
+        ), results[0]['status']
+    return jsonify(
+        applied=True,
+        version=graph.version,
+        count=len(results),
+        results=results,
+        took_ms=took_ms
+    ), 200
+
+
+@app.route('/api/schemas/sql', methods=['GET'])
+def generate_sql_schema():
+    """
+    Generate SQL schema from domain model.
+    
+    The report is cached per graph version. ?format=text streams the DDL
+    as plain text one statement at a time instead, for graphs too large
+    to build the whole document in memory.
+    """
+    try:
+        if request.args.get('format') == 'text':
+            return Response(
+                stream_with_context(iter_sql_schema(graph)),
+                mimetype='text/plain'
+            )
+        return versioned_json_response('schema_sql', lambda: sql_schema(graph))
     except Exception as e:
         return jsonify(error=f'Schema generation error: {str(e)}'), 400
 
 
 @app.route('/api/schemas/mongodb', methods=['GET'])
 def generate_mongodb_schema():
-    """Generate MongoDB schema from domain model."""
+    """Generate MongoDB schema from domain model, cached per graph version."""
     try:
-        import json
-        
-        collections = {}
-        
-        # Create collection schema for each node type
-        for node in nodes.values():
-            node_type = node['type'].lower()
-            
-            if node_type not in collections:
-                collections[node_type] = {
-                    "collectionName": node_type + "s",
-                    "validator": {
-                        "$jsonSchema": {
-                            "bsonType": "object",
-                            "required": ["_id", "label", "type"],
-                            "properties": {
-                                "_id": {
-                                    "bsonType": "string",
-                                    "description": "Unique identifier"
-                                },
-                                "label": {
-                                    "bsonType": "string",
-                                    "description": "Display name"
-                                },
-                                "type": {
-                                    "bsonType": "string",
-                                    "enum": [node_type],
-                                    "description": "Entity type"
-                                },
-                                "relationships": {
-                                    "bsonType": "array",
-                                    "description": "Array of related entities",
-                                    "items": {
-                                        "bsonType": "object",
-                                        "properties": {
-                                            "targetId": {"bsonType": "string"},
-                                            "relation": {"bsonType": "string"},
-                                            "metadata": {"bsonType": "object"}
-                                        }
-                                    }
-                                },
-                                "metadata": {
-                                    "bsonType": "object",
-                                    "description": "Additional properties"
-                                },
-                                "createdAt": {
-                                    "bsonType": "date"
-                                },
-                                "updatedAt": {
-                                    "bsonType": "date"
-                                }
-                            }
-                        }
-                    }
-                }
-        
-        # Create relationship metadata
-        relationship_types = set(edge['relation'] for edge in edges)
-        
-        mongodb_schema = {
-            "database": "knowledge_graph",
-            "collections": collections,
-            "relationshipTypes": list(relationship_types),
-            "indexSuggestions": {
-                "common": [
-                    {"key": {"label": 1}},
-                    {"key": {"type": 1}},
-                    {"key": {"createdAt": -1}}
-                ],
-                "forSearch": [
-                    {"key": {"label": "text"}},
-                    {"key": {"relationships.relation": 1}}
-                ]
-            }
-        }
-        
-        return jsonify(
-            schema_type='MongoDB',
-            schema=mongodb_schema,
-            collection_count=len(collections),
-            relationship_count=len(relationship_types)
-        ), 200
+        return versioned_json_response('schema_mongodb', lambda: mongodb_schema(graph))
     except Exception as e:
         return jsonify(error=f'Schema generation error: {str(e)}'), 400
 
 
 @app.route('/api/report/graph-stats', methods=['GET'])
 def get_graph_statistics():
-    """Get statistics about the current graph."""
+    """
+    Get statistics about the current graph.
+    
+    Degrees come straight from the store's adjacency indexes, so the base
+    report is O(N) with no scan of the edges. Heavier metrics are opt-in:
+    
+        ?components=true  weakly connected component sizes (O(N+E))
+        ?top_k=<n>        the n nodes with the highest total degree
+        ?histogram=true   number of nodes per total degree
+        ?degrees=false    omit the per-node degree map
+    """
     try:
-        node_types = {}
-        for node in nodes.values():
-            node_type = node['type']
-            node_types[node_type] = node_types.get(node_type, 0) + 1
-        
-        relationship_types = {}
-        for edge in edges:
-            rel = edge['relation']
-            relationship_types[rel] = relationship_types.get(rel, 0) + 1
-        
-        # Calculate graph metrics
-        node_degrees = {}
-        for node_id in nodes.keys():
-            in_degree = sum(1 for e in edges if e['target'] == node_id)
-            out_degree = sum(1 for e in edges if e['source'] == node_id)
-            node_degrees[node_id] = {
-                'in_degree': in_degree,
-                'out_degree': out_degree,
-                'total_degree': in_degree + out_degree
-            }
+        include_degrees = request.args.get('degrees', 'true').lower() == 'true'
+        node_count = graph.node_count()
+        edge_count = graph.edge_count()
         
         stats = {
-            'total_nodes': len(nodes),
-            'total_edges': len(edges),
-            'node_types': node_types,
-            'relationship_types': relationship_types,
-            'node_degrees': node_degrees,
-            'density': len(edges) / (len(nodes) * (len(nodes) - 1)) if len(nodes) > 1 else 0,
-            'average_degree': sum(d['total_degree'] for d in node_degrees.values()) / len(nodes) if nodes else 0
+            'total_nodes': node_count,
+            'total_edges': edge_count,
+            'node_types': graph.type_counts(),
+            'relationship_types': graph.relation_counts(),
+            'density': edge_count / (node_count * (node_count - 1)) if node_count > 1 else 0,
+            # Every edge adds one to an in-degree and one to an out-degree
+            'average_degree': 2 * edge_count / node_count if node_count else 0
         }
         
+        if include_degrees:
+            stats['node_degrees'] = {
+                node_id: {
+                    'in_degree': in_degree,
+                    'out_degree': out_degree,
+                    'total_degree': in_degree + out_degree
+                }
+                for node_id, in_degree, out_degree in graph.degrees()
+            }
+        
+        if request.args.get('components', 'false').lower() == 'true':
+            sizes = graph.weak_components()
+            stats['components'] = {
+                'count': len(sizes),
+                'largest': sizes[0] if sizes else 0,
+                'sizes': sizes
+            }
+        
+        top_k = request.args.get('top_k', type=int)
+        if top_k:
+            stats['top_degree_nodes'] = [
+                {'id': node_id, 'total_degree': degree}
+                for node_id, degree in graph.top_degree_nodes(top_k)
+            ]
+        
+        if request.args.get('histogram', 'false').lower() == 'true':
+            stats['degree_histogram'] = graph.degree_histogram()
+        
         return jsonify(stats), 200
     except Exception as e:
         return jsonify(error=f'Stats error: {str(e)}'), 400
 
 
+@app.route('/api/report/analytics', methods=['GET'])
+def get_graph_analytics():
+    """
+    Get PageRank, connected components and approximate betweenness.
+    
+    Query parameters:
+        top: Nodes listed per ranking, 1 to 100 (default 20)
+        background: 'true' always runs on the process pool, 'false' never
+            does (default: only graphs above ANALYTICS_INLINE_EDGES)
+    
+    Results are computed once per graph version. While a background run
+    for the current version is in progress the response is 202 with a
+    Retry-After header; poll the same URL until it returns 200. A failed
+    run returns 500 with a JSON error and is retried by the next request.
+    """
+    top = request.args.get('top', 20, type=int)
+    if not 1 <= top <= 100:
+        return jsonify(error='top must be between 1 and 100'), 400
+    background = request.args.get('background')
+    if background is not None:
+        background = background.lower() == 'true'
+    
+    try:
+        report = analytics.get(graph, top=top, background=background)
+    except RuntimeError as e:
+        return jsonify(error=str(e)), 503
+    except Exception as e:
+        # The failed run is not cached, so the next request retries it
+        return jsonify(error=f'Analytics error: {str(e)}'), 500
+    if report is None:
+        response = jsonify(status='running', version=graph.version)
+        response.status_code = 202
+        response.headers['Retry-After'] = '1'
+        return response
+    return versioned_json_response(('analytics', top), lambda: report)
+
+
 @app.route('/api/mongodb/databases', methods=['GET'])
 def list_mongodb_databases():
     """List available MongoDB sample databases."""
@@ -555,45 +1142,92 @@ def list_mongodb_databases():
 
 @app.route('/api/mongodb/import/<database_name>', methods=['POST'])
 def import_mongodb_sample(database_name):
-    """Import a MongoDB sample database as a knowledge graph."""
+    """
+    Import a MongoDB sample database as a knowledge graph.
+    
+    With MONGODB_URI configured the documents are read from that server
+    (optional ?limit=<docs per collection>, ?batch_size=, ?workers=);
+    otherwise a placeholder graph is built from the database's config.
+    The import replaces the graph unless ?mode=merge upserts it into the
+    existing one.
+    """
     try:
-        from mongodb_importer import get_sample_graph
-        
-        graph_data = get_sample_graph(database_name)
+        from mongodb_importer import SAMPLE_DATABASES, get_client, get_sample_graph, import_database
         
-        if graph_data is None:
+        if database_name not in SAMPLE_DATABASES:
             return jsonify(error=f'Database {database_name} not found'), 404
         
-        # Clear existing data
-        nodes.clear()
-        edges[:] = []
+        mode = request.args.get('mode', 'replace')
+        if mode not in ('replace', 'merge'):
+            return jsonify(error="Invalid mode: use 'replace' or 'merge'"), 400
+        merge = mode == 'merge'
         
-        # Import nodes
-        for node in graph_data['nodes']:
-            node_id = node['id']
-            nodes[node_id] = {
-                'id': node_id,
+        if os.getenv('MONGODB_URI'):
+            with graph.transaction():
+                if not merge:
+                    graph.clear()
+                counts = import_database(
+                    graph,
+                    get_client()[database_name],
+                    database_name,
+                    batch_size=request.args.get('batch_size', 1000, type=int),
+                    workers=request.args.get('workers', 4, type=int),
+                    limit=request.args.get('limit', type=int),
+                    merge=merge
+                )
+            return jsonify(
+                message=f'MongoDB database "{database_name}" imported successfully',
+                nodes_count=graph.node_count(),
+                edges_count=graph.edge_count(),
+                source='mongodb',
+                **counts
+            ), 200
+        
+        graph_data = get_sample_graph(database_name)
+        nodes = [
+            {
+                'id': node['id'],
                 'label': node['label'],
                 'type': node['type'],
                 'x': 0,
                 'y': 0,
                 'source': database_name
             }
+            for node in graph_data['nodes']
+        ]
         
-        # Import edges
-        for edge in graph_data['edges']:
-            edges.append({
-                'id': f"{edge['source']}-{edge['target']}",
-                'source': edge['source'],
-                'target': edge['target'],
-                'relation': edge['relation']
-            })
+        with graph.transaction():
+            if merge:
+                node_counts = graph.merge_nodes([
+                    {key: value for key, value in node.items() if key not in ('x', 'y')}
+                    if graph.has_node(node['id']) else node
+                    for node in nodes
+                ])
+            else:
+                # Clear existing data
+                graph.clear()
+                graph.put_nodes(nodes)
+            
+            # Import edges between nodes that exist
+            edges = [
+                edge for edge in graph_data['edges']
+                if graph.has_node(edge['source']) and graph.has_node(edge['target'])
+            ]
+            if merge:
+                edge_counts = graph.merge_edges(edges)
+            else:
+                graph.add_edges(edges)
         
+        result = {}
+        if merge:
+            result['nodes'] = dict(zip(('inserted', 'updated', 'skipped'), node_counts))
+            result['edges'] = dict(zip(('inserted', 'updated', 'skipped'), edge_counts))
         return jsonify(
             message=f'MongoDB sample database "{database_name}" imported successfully',
-            nodes_count=len(nodes),
-            edges_count=len(edges),
-            source='mongodb_sample'
+            nodes_count=graph.node_count(),
+            edges_count=graph.edge_count(),
+            source='mongodb_sample',
+            **result
         ), 200
     
     except Exception as e:
@@ -603,7 +1237,16 @@ def import_mongodb_sample(database_name):
 @app.route('/api/openai/query', methods=['POST'])
 @admin_required
 def openai_query():
-    """Query OpenAI for general questions - Admin only."""
+    """
+    Query OpenAI for general questions - Admin only.
+    
+    Answers are cached by normalized question and model parameters, and
+    concurrent identical questions share a single upstream call. Calls run
+    on the bounded llm_pool: a full pool answers 429 and a call that misses
+    its deadline answers 504. With "async": true an uncached question is
+    queued as a job and the response is 202 with a job id to poll at
+    /api/openai/jobs/<job_id>.
+    """
     if not ENABLE_OPENAI_NLP or not openai_client:
         return jsonify(error='OpenAI NLP feature is disabled'), 403
     
@@ -614,38 +1257,219 @@ def openai_query():
         if not question:
             return jsonify(error='Question cannot be empty'), 400
         
-        # Call OpenAI API
-        response = openai_client.chat.completions.create(
-            model='gpt-3.5-turbo',
-            messages=[
-                {
-                    'role': 'user',
-                    'content': question
+        params = {'model': 'gpt-3.5-turbo', 'temperature': 0.7, 'max_tokens': 2000}
+        key = make_cache_key(question, **params)
+        tokens = lambda result: result['usage']['total_tokens']
+        
+        def ask():
+            # Call OpenAI API
+            response = openai_client.chat.completions.create(
+                messages=[
+                    {
+                        'role': 'user',
+                        'content': question
+                    }
+                ],
+                **params
+            )
+            return {
+                'answer': response.choices[0].message.content,
+                'model': response.model,
+                'usage': {
+                    'prompt_tokens': response.usage.prompt_tokens,
+                    'completion_tokens': response.usage.completion_tokens,
+                    'total_tokens': response.usage.total_tokens
                 }
-            ],
-            temperature=0.7,
-            max_tokens=2000
+            }
+        
+        if data.get('async'):
+            result = openai_cache.lookup(key, tokens=tokens)
+            if result is not None:
+                return jsonify(question=question, cached=True, **result), 200
+            job = llm_pool.submit(
+                lambda: dict(openai_cache.get_or_compute(key, ask, tokens=tokens)[0], question=question, cached=False)
+            )
+            response = jsonify(job.to_dict())
+            response.headers['Location'] = url_for('openai_job', job_id=job.id)
+            return response, 202
+        
+        result, status = openai_cache.get_or_compute(key, lambda: llm_pool.run(ask), tokens=tokens)
+        return jsonify(question=question, cached=status != 'miss', **result), 200
+    
+    except QueueFull as e:
+        response = jsonify(error=str(e))
+        response.headers['Retry-After'] = '1'
+        return response, 429
+    except DeadlineExceeded as e:
+        return jsonify(error=f'OpenAI query timed out: {str(e)}'), 504
+    except Exception as e:
+        return jsonify(error=f'OpenAI query error: {str(e)}'), 500
+
+
+@app.route('/api/nlp/extract', methods=['POST'])
+@admin_required
+def nlp_extract():
+    """
+    Extract entities and relations from text into the graph - Admin only.
+    
+    Accepts {"text": "...", "dry_run": false} or a text/plain body. The text
+    is chunked and sent to the model in batched, concurrent calls; chunks
+    seen before are answered from the cache. Extracted entities become
+    nodes keyed by their normalized name and are merged in one bulk write.
+    With dry_run the extracted nodes and edges are returned instead.
+    """
+    if not ENABLE_OPENAI_NLP or not openai_client:
+        return jsonify(error='OpenAI NLP feature is disabled'), 403
+    
+    try:
+        if request.is_json:
+            data = request.json
+            text = data.get('text', '')
+            dry_run = bool(data.get('dry_run'))
+        else:
+            text = request.get_data(as_text=True)
+            dry_run = request.args.get('dry_run', 'false').lower() == 'true'
+        
+        if not isinstance(text, str) or not text.strip():
+            return jsonify(error='Text cannot be empty'), 400
+        
+        extractor = GraphExtractor(
+            openai_client,
+            llm_pool,
+            extraction_cache,
+            chunk_chars=int(os.getenv('NLP_EXTRACT_CHUNK_CHARS', '3000')),
+            chunks_per_call=int(os.getenv('NLP_EXTRACT_CHUNKS_PER_CALL', '4'))
         )
+        extracted = extractor.extract(text)
+        nodes, edges = extracted.pop('nodes'), extracted.pop('edges')
         
-        answer = response.choices[0].message.content
+        if dry_run:
+            return jsonify(nodes=nodes, edges=edges, **extracted), 200
         
+        nodes_added, edges_added = merge_into_graph(graph, nodes, edges)
         return jsonify(
-            question=question,
-            answer=answer,
-            model=response.model,
-            usage={
-                'prompt_tokens': response.usage.prompt_tokens,
-                'completion_tokens': response.usage.completion_tokens,
-                'total_tokens': response.usage.total_tokens
-            }
+            message='Text extracted into graph',
+            entities_found=len(nodes),
+            relations_found=len(edges),
+            nodes_added=nodes_added,
+            edges_added=edges_added,
+            **extracted
         ), 200
     
+    except QueueFull as e:
+        response = jsonify(error=str(e))
+        response.headers['Retry-After'] = '1'
+        return response, 429
+    except DeadlineExceeded as e:
+        return jsonify(error=f'Extraction timed out: {str(e)}'), 504
+    except ExtractionError as e:
+        return jsonify(error=f'Extraction error: {str(e)}'), 502
     except Exception as e:
-        return jsonify(error=f'OpenAI query error: {str(e)}'), 500
+        return jsonify(error=f'Extraction error: {str(e)}'), 500
+
+
+@app.route('/api/openai/jobs/<job_id>', methods=['GET'])
+@admin_required
+def openai_job(job_id):
+    """Poll a queued OpenAI query - Admin only."""
+    job = llm_pool.get_job(job_id)
+    if job is None:
+        return jsonify(error='Job not found'), 404
+    return jsonify(job), 200
+
+
+@app.route('/api/openai/metrics', methods=['GET'])
+@admin_required
+def openai_metrics():
+    """OpenAI response cache and call pool statistics - Admin only."""
+    return jsonify(cache=openai_cache.metrics(), pool=llm_pool.metrics()), 200
+
+
+@app.route('/api/auth/metrics', methods=['GET'])
+@admin_required
+def auth_metrics():
+    """Login hashing, cache and rate limit statistics - Admin only."""
+    return jsonify(authenticator.metrics()), 200
+
+
+@app.route('/api/sessions/metrics', methods=['GET'])
+@admin_required
+def session_metrics():
+    """Session store cache and sweep statistics - Admin only."""
+    if session_backend is None:
+        return jsonify(backend='cookie'), 200
+    return jsonify(app.session_interface.metrics()), 200
+
+
+@app.route('/api/startup/metrics', methods=['GET'])
+@admin_required
+def startup_metrics_report():
+    """Startup phase timings and this worker's first request latency - Admin only."""
+    first_request = dict(_first_request) if _first_request['pid'] == os.getpid() else None
+    return jsonify(dict(startup_metrics, pid=os.getpid(), first_request=first_request)), 200
+
+
+_init_lock = threading.Lock()
+
+
+def create_app():
+    """
+    Initialize the application once and return it.
+    
+    Seeds the sample graph (unless the graph was ever written) and the
+    demo users, creates the OpenAI client and imports the MongoDB importer
+    when those features are enabled, and optionally builds the paging
+    indexes. With the sqlite graph backend gunicorn calls this in the
+    master process (preload_app), so all of it happens once before the
+    workers are forked and shares memory with them copy-on-write (see
+    prepare_fork()); other backends build it in their single worker.
+    Safe to call again; later calls return the app unchanged.
+    """
+    global openai_client
+    with _init_lock:
+        if startup_metrics['initialized']:
+            return app
+        with startup_phase('sample_data'):
+            with graph.transaction():
+                # A persisted graph that was cleared on purpose stays empty
+                if graph.version == 0 and graph.is_empty():
+                    initialize_sample_data()
+        if os.getenv('SEED_DEMO_USERS', 'true').lower() == 'true' and authenticator.backend.count() == 0:
+            with startup_phase('demo_users'):
+                for demo_name, demo_user in DEMO_USERS.items():
+                    authenticator.add_user(demo_name, demo_user['password'], demo_user['role'])
+        with startup_phase('openai_client'):
+            openai_client = create_openai_client()
+        if os.getenv('MONGODB_URI'):
+            with startup_phase('mongodb_importer'):
+                import mongodb_importer  # noqa: F401
+        if os.getenv('PRELOAD_PAGING_INDEXES', 'false').lower() == 'true':
+            with startup_phase('paging_indexes'):
+                graph.build_paging_indexes()
+        startup_metrics['startup_ms'] = round((time.perf_counter() - _started) * 1000, 3)
+        startup_metrics['initialized'] = True
+    return app
+
+
+def prepare_fork():
+    """
+    Get the initialized master process ready to fork workers.
+    
+    SQLite connections must not cross a fork, so they are closed here and
+    reopened by each worker on first use. gc.freeze() moves every object
+    allocated so far out of the collector's reach, so collections in the
+    workers never write to (and un-share) the preloaded graph's pages.
+    """
+    graph.close()
+    if session_backend is not None:
+        session_backend.close()
+    llm_pool.backend.close()
+    authenticator.backend.close()
+    gc.freeze()
 
 
 if __name__ == '__main__':
     # Only run development server if DEBUG is True
     # In production, use gunicorn instead
     debug_mode = os.getenv('DEBUG', 'false').lower() == 'true'
-    app.run(debug=debug_mode, host='127.0.0.1', port=5000)
+    create_app().run(debug=debug_mode, host='127.0.0.1', port=5000)
@@ -0,0 +1 @@
+"""Benchmarks for the NLP graph builder; run modules with python -m benchmarks.<name>."""
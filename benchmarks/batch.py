@@ -0,0 +1,84 @@
+"""
+Batch Mutation Throughput Benchmark
+
+Builds the same synthetic graph through the Flask test client twice:
+once with one POST /api/nodes or POST /api/edges per element, as nlp.html
+does, and once with POST /api/graph/batch in chunks of --batch-size
+operations. Reports elements per second for both.
+
+The backend is chosen with --backend before app.py is imported, so the
+SQLite numbers include its per-transaction commit.
+
+Usage:
+    python -m benchmarks.batch --nodes 10000 --edges 20000 --backend sqlite
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.memory import generate_graph
+
+
+def per_element(client, nodes, edges):
+    for node in nodes:
+        client.post('/api/nodes', json=node)
+    for edge in edges:
+        client.post('/api/edges', json=edge)
+
+
+def batched(client, nodes, edges, batch_size):
+    operations = [{'op': 'add_node', 'node': node} for node in nodes]
+    operations += [{'op': 'add_edge', 'edge': edge} for edge in edges]
+    for start in range(0, len(operations), batch_size):
+        response = client.post('/api/graph/batch', json={'operations': operations[start:start + batch_size]})
+        assert response.status_code == 200, response.json
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nodes', type=int, default=10000)
+    parser.add_argument('--edges', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--backend', choices=['memory', 'sqlite'], default='memory')
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ['GRAPH_BACKEND'] = args.backend
+    os.environ['GRAPH_DB_PATH'] = os.path.join(tmp.name, 'graph.db')
+    from app import create_app
+    app = create_app()
+
+    nodes, edges = generate_graph(args.nodes, args.edges)
+    elements = len(nodes) + len(edges)
+    results = {}
+    with app.test_client() as client:
+        runs = {
+            'per_element': lambda: per_element(client, nodes, edges),
+            'batch': lambda: batched(client, nodes, edges, args.batch_size)
+        }
+        for name, run in runs.items():
+            client.delete('/api/graph/clear')
+            started = time.perf_counter()
+            run()
+            seconds = time.perf_counter() - started
+            results[name] = {
+                'seconds': round(seconds, 3),
+                'elements_per_second': round(elements / seconds)
+            }
+
+    results['speedup'] = round(results['per_element']['seconds'] / results['batch']['seconds'], 1)
+    print(json.dumps({
+        'backend': args.backend,
+        'nodes': args.nodes,
+        'edges': args.edges,
+        'batch_size': args.batch_size,
+        'results': results
+    }, indent=2))
+    tmp.cleanup()
+
+
+if __name__ == '__main__':
+    main()
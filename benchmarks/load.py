@@ -0,0 +1,208 @@
+"""
+Concurrent Load Test Against Gunicorn
+
+Starts gunicorn locally with gunicorn_config.py on temporary SQLite graph,
+session and user databases, imports a synthetic graph (see
+benchmarks.memory.generate_graph), then runs --clients threads for
+--duration seconds, each sending a weighted mix of requests over its own
+keep-alive connection:
+
+    lookup_node 40%, neighbors 20%, search 15%, create_node 10%,
+    update_node 10%, stats 5% (graph-stats without the degree map)
+
+Reports throughput and latency percentiles per request kind and overall
+as JSON (see benchmarks/report.py). With --baseline the run fails when a
+p95 latency grew by more than --tolerance. Pass --url to load an already
+running server instead of starting one.
+
+Usage:
+    python -m benchmarks.load --nodes 100000 --workers 4 --clients 32 --duration 30
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+from benchmarks import report
+from benchmarks.memory import generate_graph
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MIX = [
+    (40, 'lookup_node', lambda rng, nodes, ids: ('GET', f'/api/nodes/{rng.choice(nodes)["id"]}', None)),
+    (20, 'neighbors', lambda rng, nodes, ids: ('GET', f'/api/nodes/{rng.choice(nodes)["id"]}/neighbors', None)),
+    (15, 'search', lambda rng, nodes, ids: ('GET', f'/api/search?prefix=Node%20{rng.randrange(100)}', None)),
+    (10, 'create_node', lambda rng, nodes, ids: ('POST', '/api/nodes', {'id': next(ids), 'label': 'Load'})),
+    (10, 'update_node', lambda rng, nodes, ids: (
+        'PUT', f'/api/nodes/{rng.choice(nodes)["id"]}', {'label': f'Updated {rng.random()}'})),
+    (5, 'stats', lambda rng, nodes, ids: ('GET', '/api/report/graph-stats?degrees=false', None)),
+]
+
+
+class Client:
+    """Keep-alive HTTP connection that reconnects after the server closes it."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.conn = None
+
+    def request(self, method, path, body=None):
+        payload = None if body is None else json.dumps(body)
+        headers = {} if body is None else {'Content-Type': 'application/json'}
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self.conn.request(method, path, payload, headers)
+                response = self.conn.getresponse()
+                response.read()
+                return response.status
+            except (http.client.HTTPException, ConnectionError):
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+
+def start_server(tmp, port, workers, threads, worker_class='gevent'):
+    """Start gunicorn on the given port; return the process once /health answers."""
+    env = dict(
+        os.environ,
+        GRAPH_BACKEND='sqlite',
+        GRAPH_DB_PATH=os.path.join(tmp, 'graph.db'),
+        SESSION_BACKEND='sqlite',
+        SESSION_DB_PATH=os.path.join(tmp, 'sessions.db'),
+        USER_BACKEND='sqlite',
+        USER_DB_PATH=os.path.join(tmp, 'users.db'),
+        GUNICORN_BIND=f'127.0.0.1:{port}',
+        GUNICORN_WORKERS=str(workers),
+        GUNICORN_WORKER_CLASS=worker_class,
+        GUNICORN_THREADS=str(threads),
+        GUNICORN_ACCESS_LOG=os.devnull,
+        GUNICORN_ERROR_LOG=os.path.join(tmp, 'error.log'),
+        GUNICORN_PIDFILE=os.path.join(tmp, 'gunicorn.pid')
+    )
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn_config.py'], cwd=ROOT, env=env
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            sys.exit(f'gunicorn exited with {server.returncode}, see {env["GUNICORN_ERROR_LOG"]}')
+        try:
+            if Client('127.0.0.1', port).request('GET', '/health') == 200:
+                return server
+        except OSError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    sys.exit('gunicorn did not answer /health within 60 seconds')
+
+
+def run_load(host, port, nodes, clients, duration, seed=0):
+    """Run the request mix from several threads; return {kind: summary}."""
+    weights = [weight for weight, _, _ in MIX]
+    latencies = {name: [] for _, name, _ in MIX}
+    errors = {name: 0 for _, name, _ in MIX}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        ids = (f'load_{index}_{i}' for i in range(10 ** 9))
+        client = Client(host, port)
+        local = {name: [] for name in latencies}
+        failed = dict.fromkeys(errors, 0)
+        while time.perf_counter() < deadline:
+            _, name, build = rng.choices(MIX, weights)[0]
+            method, path, body = build(rng, nodes, ids)
+            started = time.perf_counter()
+            try:
+                status = client.request(method, path, body)
+            except (OSError, http.client.HTTPException):
+                status = None
+            local[name].append(time.perf_counter() - started)
+            if status not in (200, 201):
+                failed[name] += 1
+        with lock:
+            for name in latencies:
+                latencies[name].extend(local[name])
+                errors[name] += failed[name]
+
+    pool = [threading.Thread(target=worker, args=(index,)) for index in range(clients)]
+    wall = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    wall = time.perf_counter() - wall
+
+    results = {}
+    for name, samples in latencies.items():
+        if samples:
+            results[name] = dict(report.summarize(samples), errors=errors[name])
+    everything = [sample for samples in latencies.values() for sample in samples]
+    results['total'] = dict(
+        report.summarize(everything),
+        errors=sum(errors.values()),
+        requests_per_second=round(len(everything) / wall, 1)
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nodes', type=int, default=10000)
+    parser.add_argument('--edge-factor', type=int, default=2, help='Edges per node')
+    parser.add_argument('--workers', type=int, default=2, help='Gunicorn worker processes')
+    parser.add_argument('--worker-class', default='gevent', help='Gunicorn worker class')
+    parser.add_argument('--threads', type=int, default=8, help='Gunicorn threads per worker (gthread only)')
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent client threads')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds to run the mix')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--url', help='Load this server instead of starting gunicorn')
+    report.add_arguments(parser)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    server = None
+    if args.url:
+        url = urllib.parse.urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        host, port = '127.0.0.1', args.port
+        server = start_server(tmp.name, port, args.workers, args.threads, args.worker_class)
+
+    try:
+        nodes, edges = generate_graph(args.nodes, args.nodes * args.edge_factor)
+        status = Client(host, port).request('POST', '/api/graph/import', {'nodes': nodes, 'edges': edges})
+        if status != 200:
+            sys.exit(f'Importing the graph failed with HTTP {status}')
+        print(f'Loading {args.nodes} nodes with {args.clients} clients for {args.duration}s...', file=sys.stderr)
+        results = run_load(host, port, nodes, args.clients, args.duration)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(30)
+        tmp.cleanup()
+
+    results = {
+        'meta': report.metadata(
+            benchmark='load', workers=args.workers, worker_class=args.worker_class, threads=args.threads,
+            clients=args.clients, duration=args.duration
+        ),
+        'runs': [{'nodes': args.nodes, 'edges': len(edges), 'results': results}]
+    }
+    sys.exit(report.finish(results, args.output, args.baseline, args.tolerance, key='p95_ms'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Login Latency and CPU Benchmark
+
+Sends concurrent POST /login requests through the Flask test client and
+reports latency percentiles, throughput and process CPU time for:
+
+    cold: valid credentials that must be verified with scrypt
+    cached: valid credentials already in the verified-credential cache
+    stuffing: wrong passwords for one account from one IP, as in a
+        credential-stuffing burst; the rate limits reject most of them
+        before any hashing
+
+Usage:
+    python -m benchmarks.login --requests 400 --threads 16
+"""
+
+import argparse
+import json
+import os
+import statistics
+import threading
+import time
+
+
+def run(app, requests, threads, credentials):
+    """Send requests from several threads; return latencies, status counts and CPU seconds."""
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    per_thread = requests // threads
+
+    def worker(offset):
+        client = app.test_client()
+        for i in range(per_thread):
+            username, password = credentials(offset * per_thread + i)
+            started = time.perf_counter()
+            response = client.post('/login', json={'username': username, 'password': password})
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    cpu = time.process_time()
+    wall = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(offset,)) for offset in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'statuses': statuses,
+        'requests_per_second': round(len(latencies) / wall, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+        'cpu_ms_per_request': round(cpu / len(latencies) * 1000, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--users', type=int, default=100)
+    args = parser.parse_args()
+
+    # Generous limits while measuring hashing; the stuffing run restores real ones
+    os.environ['SEED_DEMO_USERS'] = 'false'
+    os.environ['LOGIN_IP_BURST'] = os.environ['LOGIN_USER_BURST'] = str(10 ** 9)
+    os.environ['LOGIN_HASH_WAIT'] = '60'
+    from app import authenticator, create_app
+    app = create_app()
+    from rate_limit import TokenBucketLimiter
+
+    for i in range(args.users):
+        authenticator.add_user(f'user{i}', f'password{i}')
+    valid = lambda i: (f'user{i % args.users}', f'password{i % args.users}')
+
+    results = {}
+    # Count only the first args.users requests as cold: later ones would hit the cache
+    results['cold'] = run(app, min(args.requests, args.users), args.threads, valid)
+    results['cached'] = run(app, args.requests, args.threads, valid)
+    authenticator.ip_limiter = TokenBucketLimiter(rate=0.5, burst=20)
+    authenticator.user_limiter = TokenBucketLimiter(rate=0.1, burst=5)
+    hashes = authenticator.hashes
+    results['stuffing'] = run(app, args.requests, args.threads, lambda i: ('user0', f'guess{i}'))
+    results['stuffing']['hashes'] = authenticator.hashes - hashes
+
+    print(json.dumps({
+        'threads': args.threads,
+        'scrypt': authenticator.metrics()['scrypt'],
+        'results': results
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
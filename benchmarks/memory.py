@@ -0,0 +1,143 @@
+"""
+Memory Benchmark for Graph Layouts
+
+Builds the same synthetic graph in three layouts and reports the memory
+each one holds, measured with tracemalloc:
+
+    dict_list: the original app.py layout, a dict of node dicts and a
+        list of edge dicts with no indexes
+    indexed_dicts: node and edge dicts plus the edge id, pair and
+        adjacency-set indexes the first GraphStore kept
+    graph_store: the current compact GraphStore
+
+Usage:
+    python -m benchmarks.memory --nodes 100000 --edges 500000
+"""
+
+import argparse
+import gc
+import json
+import random
+import tracemalloc
+
+from graph_store import GraphStore
+
+
+def generate_graph(node_count, edge_count, seed=0):
+    """
+    Generate node and edge dicts the way a JSON import produces them.
+
+    Ids are rebuilt per edge, as json.loads does, so repeated ids are
+    separate string objects unless the layout interns them.
+    """
+    rng = random.Random(seed)
+    types = ['person', 'organization', 'location', 'concept', 'event']
+    relations = ['related_to', 'knows', 'works_for', 'located_in', 'part_of']
+    nodes = [
+        {'id': f'node_{i}', 'label': f'Node {i}', 'type': rng.choice(types), 'x': 0, 'y': 0}
+        for i in range(node_count)
+    ]
+    edges = []
+    seen = set()
+    while len(edges) < edge_count:
+        source, target = rng.randrange(node_count), rng.randrange(node_count)
+        if (source, target) in seen:
+            continue
+        seen.add((source, target))
+        edges.append({
+            'source': f'node_{source}',
+            'target': f'node_{target}',
+            # A fresh string per edge, as json.loads would produce
+            'relation': ''.join(rng.choice(relations))
+        })
+    return nodes, edges
+
+
+def build_dict_list(nodes, edges):
+    node_index = {}
+    edge_list = []
+    for node in nodes:
+        node_index[node['id']] = dict(node)
+    for edge in edges:
+        edge_list.append({
+            'id': f"{edge['source']}-{edge['target']}",
+            'source': edge['source'],
+            'target': edge['target'],
+            'relation': edge['relation']
+        })
+    return node_index, edge_list
+
+
+def build_indexed_dicts(nodes, edges):
+    node_index, edge_index, pairs, out_index, in_index = {}, {}, {}, {}, {}
+    for node in nodes:
+        node_index[node['id']] = dict(node)
+        out_index[node['id']] = set()
+        in_index[node['id']] = set()
+    for edge in edges:
+        edge_id = f"{edge['source']}-{edge['target']}"
+        edge_index[edge_id] = {
+            'id': edge_id,
+            'source': edge['source'],
+            'target': edge['target'],
+            'relation': edge['relation']
+        }
+        pairs[(edge['source'], edge['target'])] = edge_id
+        out_index[edge['source']].add(edge_id)
+        in_index[edge['target']].add(edge_id)
+    return node_index, edge_index, pairs, out_index, in_index
+
+
+def build_graph_store(nodes, edges):
+    store = GraphStore()
+    with store.transaction():
+        store.put_nodes(nodes)
+        store.add_edges(edges)
+    return store
+
+
+LAYOUTS = {
+    'dict_list': build_dict_list,
+    'indexed_dicts': build_indexed_dicts,
+    'graph_store': build_graph_store,
+}
+
+
+def measure(build, node_count, edge_count):
+    """Return the bytes a built layout keeps alive."""
+    gc.collect()
+    tracemalloc.start()
+    # Generate inside the trace so string allocations from "parsing" count
+    nodes, edges = generate_graph(node_count, edge_count)
+    graph = build(nodes, edges)
+    del nodes, edges
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del graph
+    return used
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nodes', type=int, default=50000)
+    parser.add_argument('--edges', type=int, default=250000)
+    args = parser.parse_args()
+
+    results = {}
+    for name, build in LAYOUTS.items():
+        used = measure(build, args.nodes, args.edges)
+        results[name] = {
+            'bytes': used,
+            'bytes_per_edge': round(used / max(args.edges, 1), 1)
+        }
+
+    baseline = results['dict_list']['bytes']
+    for result in results.values():
+        result['vs_dict_list'] = round(result['bytes'] / baseline, 3)
+
+    print(json.dumps({'nodes': args.nodes, 'edges': args.edges, 'layouts': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
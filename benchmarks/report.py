@@ -0,0 +1,121 @@
+"""
+Benchmark Results and Baselines
+
+Shared helpers for benchmarks that write JSON results and fail when they
+regress against a saved baseline. A results document looks like:
+
+    {"meta": {...}, "runs": [{"nodes": 1000, "edges": 2000, "results": {
+        "<benchmark>": {"ops": ..., "p50_ms": ..., "p95_ms": ..., ...}}}]}
+
+Runs are matched to the baseline by graph size, and benchmarks within a
+run by name. A benchmark regresses when its median latency grows by more
+than the tolerance; medians are steadier than means or tail percentiles
+on shared CI machines.
+"""
+
+import datetime
+import json
+import platform
+import statistics
+import sys
+
+
+def summarize(latencies):
+    """Summarize per-operation latencies in seconds."""
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    count = len(latencies)
+    return {
+        'ops': count,
+        'seconds': round(total, 6),
+        'ops_per_second': round(count / total, 1) if total else None,
+        'mean_ms': round(total / count * 1000, 4),
+        'p50_ms': round(statistics.median(latencies) * 1000, 4),
+        'p95_ms': round(latencies[max(int(count * 0.95) - 1, 0)] * 1000, 4),
+        'p99_ms': round(latencies[max(int(count * 0.99) - 1, 0)] * 1000, 4),
+        'max_ms': round(latencies[-1] * 1000, 4)
+    }
+
+
+def metadata(**extra):
+    """Describe the machine and settings a results document was measured with."""
+    return dict(
+        python=platform.python_version(),
+        platform=platform.platform(),
+        created=datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        **extra
+    )
+
+
+def compare(current, baseline, tolerance, key='p50_ms'):
+    """
+    Compare results with a baseline.
+
+    Args:
+        current, baseline: Results documents
+        tolerance: Allowed relative slowdown, e.g. 0.25 for 25%
+        key: Latency field to compare
+
+    Returns:
+        list: One dict per benchmark found in both, with the baseline and
+            current values, their ratio and whether it regressed
+    """
+    baseline_runs = {(run['nodes'], run['edges']): run for run in baseline['runs']}
+    rows = []
+    for run in current['runs']:
+        base = baseline_runs.get((run['nodes'], run['edges']))
+        if base is None:
+            continue
+        for name, result in run['results'].items():
+            if name not in base['results']:
+                continue
+            before, after = base['results'][name][key], result[key]
+            ratio = after / before if before else 1.0
+            rows.append({
+                'nodes': run['nodes'],
+                'benchmark': name,
+                'baseline': before,
+                'current': after,
+                'ratio': round(ratio, 3),
+                'regressed': ratio > 1 + tolerance
+            })
+    return rows
+
+
+def finish(results, output=None, baseline=None, tolerance=0.25, key='p50_ms'):
+    """
+    Print and save results, then check them against a baseline.
+
+    Returns:
+        int: Process exit status, 1 if any benchmark regressed
+    """
+    text = json.dumps(results, indent=2)
+    print(text)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    if not baseline:
+        return 0
+
+    with open(baseline, encoding='utf-8') as f:
+        rows = compare(results, json.load(f), tolerance, key)
+    if not rows:
+        print(f'No run matches the graph sizes in {baseline}', file=sys.stderr)
+        return 1
+    regressed = [row for row in rows if row['regressed']]
+    for row in rows:
+        flag = 'REGRESSED' if row['regressed'] else 'ok'
+        print(f"{row['nodes']:>9} {row['benchmark']:<24} {row['baseline']:>10.3f} -> {row['current']:>10.3f} "
+              f"{key} (x{row['ratio']}) {flag}", file=sys.stderr)
+    if regressed:
+        print(f'{len(regressed)} of {len(rows)} benchmarks regressed by more than {tolerance:.0%}', file=sys.stderr)
+        return 1
+    return 0
+
+
+def add_arguments(parser):
+    """Add the --output, --baseline and --tolerance options."""
+    parser.add_argument('--output', help='Write the results JSON here')
+    parser.add_argument('--baseline', help='Fail if slower than this results JSON')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed slowdown against the baseline (default 0.25 = 25%%)')
@@ -0,0 +1,139 @@
+"""
+Route Microbenchmarks
+
+Times the graph API routes of app.py through the Flask test client on
+synthetic graphs (see benchmarks.memory.generate_graph) of one or more
+sizes:
+
+    import: POST /api/graph/import replacing the graph with the generated one
+    create_node, create_edge: POST /api/nodes, POST /api/edges
+    lookup_node, lookup_edge: GET /api/nodes/<id>, GET /api/edges/<id>
+    neighbors: GET /api/nodes/<id>/neighbors
+    stats: GET /api/report/graph-stats with components and top 10 degrees
+    schema_sql, schema_mongodb: GET /api/schemas/sql, /api/schemas/mongodb,
+        each after an untimed node update so the body cache is cold
+    delete_cascade: DELETE /api/nodes/<id> of a node with edges
+
+Every route is timed per request, and the results are written as JSON
+(see benchmarks/report.py). With --baseline the run fails when a median
+latency grew by more than --tolerance, e.g. in CI:
+
+    python -m benchmarks.routes --nodes 1000,10000 --output routes.json
+    python -m benchmarks.routes --nodes 1000,10000 --baseline routes.json
+
+Baselines are only comparable on the machine that recorded them.
+
+Usage:
+    python -m benchmarks.routes --nodes 1000,100000,1000000 --requests 200
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks import report
+from benchmarks.memory import generate_graph
+
+
+def timed(client, requests, expected=(200, 201)):
+    """Send (method, path, json, before) requests; return their latencies."""
+    latencies = []
+    for method, path, body, before in requests:
+        if before is not None:
+            before()
+        started = time.perf_counter()
+        response = client.open(path, method=method, json=body)
+        latencies.append(time.perf_counter() - started)
+        # Checked explicitly so the benchmark still fails on errors under python -O
+        if response.status_code not in expected:
+            raise RuntimeError(f'{method} {path} failed with HTTP {response.status_code}')
+    return latencies
+
+
+def run_size(client, node_count, edge_count, requests, imports, seed=0):
+    """Benchmark every route on one graph size; return {name: summary}."""
+    nodes, edges = generate_graph(node_count, edge_count, seed)
+    rng = random.Random(seed)
+    results = {}
+
+    results['import'] = report.summarize(timed(client, [
+        ('POST', '/api/graph/import', {'nodes': nodes, 'edges': edges}, None)
+    ] * imports))
+
+    node_ids = [rng.choice(nodes)['id'] for _ in range(requests)]
+    edge_ids = [f"{edge['source']}-{edge['target']}" for edge in rng.sample(edges, min(requests, len(edges)))]
+    results['lookup_node'] = report.summarize(timed(client, [
+        ('GET', f'/api/nodes/{node_id}', None, None) for node_id in node_ids
+    ]))
+    results['lookup_edge'] = report.summarize(timed(client, [
+        ('GET', f'/api/edges/{edge_id}', None, None) for edge_id in edge_ids
+    ]))
+    results['neighbors'] = report.summarize(timed(client, [
+        ('GET', f'/api/nodes/{node_id}/neighbors', None, None) for node_id in node_ids
+    ]))
+
+    # Reports are slower by orders of magnitude; a handful of samples suffice
+    samples = max(3, requests // 50)
+    results['stats'] = report.summarize(timed(client, [
+        ('GET', '/api/report/graph-stats?components=true&top_k=10', None, None)
+    ] * samples))
+    touch = lambda: client.put(f'/api/nodes/{nodes[0]["id"]}', json={'label': f'Touched {rng.random()}'})
+    for name in ('sql', 'mongodb'):
+        results[f'schema_{name}'] = report.summarize(timed(client, [
+            ('GET', f'/api/schemas/{name}', None, touch)
+        ] * samples))
+
+    results['create_node'] = report.summarize(timed(client, [
+        ('POST', '/api/nodes', {'id': f'bench_{i}', 'label': f'Bench {i}', 'type': 'concept'}, None)
+        for i in range(requests)
+    ]))
+    results['create_edge'] = report.summarize(timed(client, [
+        ('POST', '/api/edges', {'source': f'bench_{i}', 'target': node_id, 'relation': 'related_to'}, None)
+        for i, node_id in enumerate(node_ids)
+    ]))
+    # Each node deleted has at least the edge just created to cascade
+    results['delete_cascade'] = report.summarize(timed(client, [
+        ('DELETE', f'/api/nodes/{node_id}', None, None) for node_id in dict.fromkeys(node_ids)
+    ]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nodes', default='1000',
+                        help='Comma-separated graph sizes, e.g. 1000,100000,1000000')
+    parser.add_argument('--edge-factor', type=int, default=2, help='Edges per node')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per lookup/create/delete benchmark')
+    parser.add_argument('--imports', type=int, default=3, help='Timed imports per size')
+    parser.add_argument('--backend', choices=['memory', 'sqlite'], default='memory')
+    report.add_arguments(parser)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ['GRAPH_BACKEND'] = args.backend
+    os.environ['GRAPH_DB_PATH'] = os.path.join(tmp.name, 'graph.db')
+    os.environ['SEED_DEMO_USERS'] = 'false'
+    from app import create_app
+    app = create_app()
+
+    runs = []
+    with app.test_client() as client:
+        for node_count in (int(size) for size in args.nodes.split(',')):
+            edge_count = node_count * args.edge_factor
+            print(f'Benchmarking {node_count} nodes, {edge_count} edges...', file=sys.stderr)
+            runs.append({
+                'nodes': node_count,
+                'edges': edge_count,
+                'results': run_size(client, node_count, edge_count, args.requests, args.imports)
+            })
+    tmp.cleanup()
+
+    results = {'meta': report.metadata(benchmark='routes', backend=args.backend, requests=args.requests), 'runs': runs}
+    sys.exit(report.finish(results, args.output, args.baseline, args.tolerance))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+"""
+Graph Analytics
+
+PageRank, weakly and strongly connected components and approximate
+betweenness centrality, computed on a SciPy CSR adjacency matrix built
+straight from the store's edge tuples. Every algorithm is expressed as
+sparse matrix-vector products or csgraph calls, never as Python loops
+over edges.
+
+Results are computed once per graph version. Small graphs are analyzed
+in the request thread; larger ones go to a process pool and the caller
+polls until the result for the current version is ready.
+
+NumPy and SciPy are optional; without them AnalyticsRunner raises
+RuntimeError.
+"""
+
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+try:
+    import numpy as np
+    from scipy import sparse
+    from scipy.sparse import csgraph
+except ImportError:
+    np = None
+
+DAMPING = 0.85
+PAGERANK_TOLERANCE = 1e-8
+PAGERANK_MAX_ITERATIONS = 100
+
+# BFS sources sampled for approximate betweenness
+DEFAULT_SAMPLES = 64
+
+# Graphs with more edges than this are analyzed on the process pool
+DEFAULT_INLINE_EDGES = 200000
+
+
+def _require_scipy():
+    if np is None:
+        raise RuntimeError('Graph analytics requires numpy and scipy (pip install numpy scipy)')
+
+
+def graph_arrays(graph):
+    """
+    Number the nodes of a graph and return its edges as index arrays.
+
+    Returns:
+        tuple: (node ids, source index array, target index array)
+    """
+    ids = [row[0] for row in graph.node_tuples(('id',))]
+    index = {node_id: i for i, node_id in enumerate(ids)}
+    pairs = [(index[s], index[t]) for s, t, _ in graph.edge_tuples() if s in index and t in index]
+    edges = np.array(pairs, dtype=np.int32).reshape(-1, 2)
+    return ids, edges[:, 0], edges[:, 1]
+
+
+def adjacency_matrix(n, sources, targets):
+    """Return the n x n CSR matrix with a 1 at (source, target) for every edge."""
+    data = np.ones(len(sources), dtype=np.float64)
+    return sparse.csr_matrix((data, (sources, targets)), shape=(n, n))
+
+
+def pagerank(matrix, damping=DAMPING, tol=PAGERANK_TOLERANCE, max_iterations=PAGERANK_MAX_ITERATIONS):
+    """
+    PageRank by power iteration; rank of dangling nodes is spread evenly.
+
+    Returns:
+        tuple: (scores summing to 1, iterations run)
+    """
+    n = matrix.shape[0]
+    if not n:
+        return np.zeros(0), 0
+    out_degree = np.asarray(matrix.sum(axis=1)).ravel()
+    dangling = out_degree == 0
+    inverse = np.divide(1.0, out_degree, out=np.zeros(n), where=~dangling)
+    transposed = matrix.T.tocsr()
+    rank = np.full(n, 1.0 / n)
+    for iteration in range(1, max_iterations + 1):
+        spread = transposed @ (rank * inverse)
+        updated = damping * (spread + rank[dangling].sum() / n) + (1 - damping) / n
+        error = np.abs(updated - rank).sum()
+        rank = updated
+        if error < n * tol:
+            break
+    return rank, iteration
+
+
+def approximate_betweenness(matrix, samples=DEFAULT_SAMPLES, seed=0):
+    """
+    Betweenness centrality estimated from BFS trees of sampled sources.
+
+    Brandes' algorithm, level-synchronous: each BFS level is one sparse
+    product counting shortest paths, and dependencies are accumulated
+    back up the levels the same way. Scores are scaled up by n / samples
+    and normalized by (n - 1)(n - 2) like an exact directed betweenness.
+
+    Returns:
+        ndarray: Score per node
+    """
+    n = matrix.shape[0]
+    scores = np.zeros(n)
+    if n < 3:
+        return scores
+    transposed = matrix.T.tocsr()
+    pivots = np.random.default_rng(seed).choice(n, size=min(samples, n), replace=False)
+    for source in pivots:
+        sigma = np.zeros(n)
+        sigma[source] = 1.0
+        depth = np.full(n, -1, dtype=np.int32)
+        depth[source] = 0
+        levels = [np.array([source])]
+        while True:
+            frontier = np.zeros(n)
+            frontier[levels[-1]] = sigma[levels[-1]]
+            reached = transposed @ frontier
+            new = np.flatnonzero((reached > 0) & (depth < 0))
+            if not len(new):
+                break
+            depth[new] = len(levels)
+            sigma[new] = reached[new]
+            levels.append(new)
+
+        delta = np.zeros(n)
+        for level in range(len(levels) - 1, 0, -1):
+            below = np.zeros(n)
+            below[levels[level]] = (1 + delta[levels[level]]) / sigma[levels[level]]
+            above = levels[level - 1]
+            delta[above] = sigma[above] * (matrix @ below)[above]
+        delta[source] = 0
+        scores += delta
+    scores *= n / len(pivots) / ((n - 1) * (n - 2))
+    return scores
+
+
+def analyze(n, sources, targets, samples=DEFAULT_SAMPLES):
+    """
+    Run every analysis on a graph given as edge index arrays.
+
+    Module-level and free of store objects so it can run in a worker
+    process; summarize() maps the arrays back to node ids.
+
+    Returns:
+        dict: Per-node arrays and scalar run information
+    """
+    matrix = adjacency_matrix(n, sources, targets)
+    rank, iterations = pagerank(matrix)
+    weak_count, weak = csgraph.connected_components(matrix, directed=True, connection='weak')
+    strong_count, strong = csgraph.connected_components(matrix, directed=True, connection='strong')
+    return {
+        'pagerank': rank,
+        'pagerank_iterations': iterations,
+        'weak_count': weak_count,
+        'weak': weak,
+        'strong_count': strong_count,
+        'strong': strong,
+        'betweenness': approximate_betweenness(matrix, samples),
+        'betweenness_samples': min(samples, n)
+    }
+
+
+def _top_nodes(ids, scores, top):
+    if not len(scores):
+        return []
+    top = min(top, len(scores))
+    best = np.argpartition(-scores, top - 1)[:top]
+    best = best[np.argsort(-scores[best], kind='stable')]
+    return [{'id': ids[i], 'score': float(scores[i])} for i in best]
+
+
+def _components(labels, count, top):
+    sizes = np.bincount(labels, minlength=count)
+    order = np.argsort(-sizes, kind='stable')[:top]
+    return {
+        'count': int(count),
+        'largest': [int(sizes[label]) for label in order],
+        'singletons': int((sizes == 1).sum())
+    }
+
+
+def summarize(ids, result, top=20):
+    """Build the JSON report of an analyze() result: top nodes and component sizes."""
+    return {
+        'nodes': len(ids),
+        'pagerank': {
+            'iterations': result['pagerank_iterations'],
+            'top': _top_nodes(ids, result['pagerank'], top)
+        },
+        'weak_components': _components(result['weak'], result['weak_count'], top),
+        'strong_components': _components(result['strong'], result['strong_count'], top),
+        'betweenness': {
+            'samples': result['betweenness_samples'],
+            'top': _top_nodes(ids, result['betweenness'], top)
+        }
+    }
+
+
+class AnalyticsRunner:
+    """
+    Analytics of the current graph version, computed at most once.
+
+    Args:
+        workers: Size of the process pool for large graphs
+        inline_edges: Graphs with at most this many edges are analyzed in
+            the calling thread
+        samples: BFS sources for approximate betweenness
+    """
+
+    def __init__(self, workers=1, inline_edges=DEFAULT_INLINE_EDGES, samples=DEFAULT_SAMPLES):
+        self.workers = workers
+        self.inline_edges = inline_edges
+        self.samples = samples
+        self._lock = threading.Lock()
+        self._pool = None
+        self._etag = None
+        self._future = None
+
+    def _executor(self):
+        if self._pool is None:
+            # Forking a threaded server process is unsafe; start workers fresh
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    def get(self, graph, top=20, background=None):
+        """
+        Return the analytics of the graph's current version.
+
+        Args:
+            graph: GraphStore to analyze
+            top: Nodes listed per ranking and components per size list
+            background: Force (True) or forbid (False) the process pool;
+                by default only graphs above inline_edges use it
+
+        Returns:
+            dict or None: The report, or None while a background run for
+                this version is still in progress
+
+        Raises:
+            RuntimeError: If numpy or scipy is not installed
+        """
+        _require_scipy()
+        etag = graph.etag
+        with self._lock:
+            start = self._etag != etag
+            if start:
+                self._etag = etag
+                self._future = Future()
+            future = self._future
+
+        if start:
+            # Any error must resolve the future, or this version stays pending
+            try:
+                ids, sources, targets = graph_arrays(graph)
+                if background is None:
+                    background = len(sources) > self.inline_edges
+                if background:
+                    with self._lock:
+                        pool_future = self._executor().submit(analyze, len(ids), sources, targets, self.samples)
+                    pool_future.add_done_callback(lambda done: self._finish(future, ids, done))
+                else:
+                    future.set_result((ids, analyze(len(ids), sources, targets, self.samples)))
+            except Exception as e:
+                future.set_exception(e)
+
+        if not future.done():
+            return None
+        if future.exception() is not None:
+            # Report a failed run once; the next request for the version retries
+            with self._lock:
+                if self._future is future:
+                    self._etag = None
+                    self._future = None
+        ids, result = future.result()
+        return summarize(ids, result, top)
+
+    @staticmethod
+    def _finish(future, ids, done):
+        if done.cancelled():
+            future.set_exception(RuntimeError('Analytics run was cancelled'))
+        elif done.exception() is not None:
+            future.set_exception(done.exception())
+        else:
+            future.set_result((ids, done.result()))
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
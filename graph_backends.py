@@ -0,0 +1,563 @@
+"""
+Storage Backends for the Knowledge Graph
+
+A backend persists the graph held by GraphStore and carries a version
+counter that is bumped on every committed write. Each process keeps its
+own indexed copy of the graph and catches up whenever the backend's
+version differs from the one it last saw, so several gunicorn workers
+can share one graph. A backend that logs each version's operations lets
+a process replay just the versions it missed (see ops_since()); otherwise
+it reloads the whole graph.
+
+Available backends:
+    memory: nothing leaves the process (single worker only)
+    sqlite: a SQLite database in WAL mode shared by all workers on a host
+    log: binary snapshots plus an append-only operation log (single worker)
+
+load() returns (version, graph, ops): graph is either a (node dicts, edge
+dicts) pair or graph_store.SnapshotColumns, and ops are logged operations
+to replay on top of it in GraphStore.
+"""
+
+import atexit
+import glob
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+
+
+class MemoryBackend:
+    """Backend that keeps nothing outside the process."""
+
+    def __init__(self):
+        self._version = 0
+        # Versions restart at zero with the process, so tag them per process
+        self.instance_id = uuid.uuid4().hex[:16]
+
+    def begin(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def current_version(self):
+        return self._version
+
+    def bump_version(self):
+        self._version += 1
+        return self._version
+
+    def load(self):
+        """A memory backend has nothing to load."""
+        return self._version, ([], []), []
+
+    def ops_since(self, version, limit):
+        return None
+
+    def wants_snapshot(self):
+        return False
+
+    def write_snapshot(self, version, columns):
+        pass
+
+    def put_node(self, node):
+        pass
+
+    def put_nodes(self, nodes):
+        pass
+
+    def delete_node(self, node_id):
+        pass
+
+    def put_edge(self, edge):
+        pass
+
+    def put_edges(self, edges):
+        pass
+
+    def delete_edge(self, edge_id):
+        pass
+
+    def clear(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SQLiteBackend:
+    """
+    Backend storing the graph in a SQLite database in WAL mode.
+
+    WAL lets readers in every worker proceed while one worker writes.
+    Writes run inside BEGIN IMMEDIATE transactions so concurrent writers
+    are serialized by SQLite's write lock.
+
+    Each committed version also stores its operations as one JSON row in
+    the ops table, so other workers replay the few versions they missed
+    instead of reloading the graph. Only the last `op_log_size` versions
+    are kept, and a transaction writing more than `max_logged_items`
+    items is logged as a gap that forces a reload, which is cheaper than
+    replaying it.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS nodes (
+            id TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS edges (
+            id TEXT PRIMARY KEY,
+            source TEXT NOT NULL,
+            target TEXT NOT NULL,
+            relation TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+        INSERT OR IGNORE INTO meta (key, value) VALUES ('instance', abs(random()));
+        CREATE TABLE IF NOT EXISTS ops (
+            version INTEGER PRIMARY KEY,
+            ops TEXT
+        );
+    """
+
+    def __init__(self, path, timeout=30.0, op_log_size=1000, max_logged_items=10000):
+        self.path = path
+        self.timeout = timeout
+        self.op_log_size = op_log_size
+        self.max_logged_items = max_logged_items
+        self._conn = None
+        self._pid = None
+        self._instance_id = None
+        self._ops = []
+        self._logged_items = 0
+
+    @property
+    def conn(self):
+        """Connection for the current process, reopened after a fork."""
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(
+                self.path,
+                timeout=self.timeout,
+                isolation_level=None,
+                check_same_thread=False
+            )
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(self.SCHEMA)
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    @property
+    def instance_id(self):
+        """Random id of the database, so versions of a recreated file never collide."""
+        if self._instance_id is None:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'instance'").fetchone()
+            self._instance_id = format(row[0], 'x')
+        return self._instance_id
+
+    def begin(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        self._ops = []
+        self._logged_items = 0
+
+    def commit(self):
+        self.conn.execute('COMMIT')
+
+    def rollback(self):
+        self.conn.execute('ROLLBACK')
+        self._ops = []
+
+    def current_version(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return row[0]
+
+    def bump_version(self):
+        """Bump the version and log the transaction's ops under it."""
+        self.conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+        version = self.current_version()
+        ops = None if self._ops is None else '[' + ','.join(self._ops) + ']'
+        self.conn.execute('INSERT OR REPLACE INTO ops (version, ops) VALUES (?, ?)', (version, ops))
+        self.conn.execute('DELETE FROM ops WHERE version <= ?', (version - self.op_log_size,))
+        return version
+
+    def ops_since(self, version, limit):
+        """
+        Return the ops committed after `version`, in one consistent read.
+
+        Returns:
+            list: (version, ops) pairs in commit order, where ops is a list
+                of [method name, argument] lists as passed to this backend;
+                None if more than `limit` versions are missing or any of
+                them is no longer or was never logged
+        """
+        conn = self.conn
+        own_transaction = not conn.in_transaction
+        if own_transaction:
+            conn.execute('BEGIN')
+        try:
+            current = self.current_version()
+            if not version < current <= version + limit:
+                return None
+            rows = conn.execute(
+                'SELECT version, ops FROM ops WHERE version > ? AND version <= ? ORDER BY version',
+                (version, current)
+            ).fetchall()
+        finally:
+            if own_transaction:
+                conn.execute('COMMIT')
+        if len(rows) != current - version or any(ops is None for _, ops in rows):
+            return None
+        return [(logged, json.loads(ops)) for logged, ops in rows]
+
+    def _logs(self, items):
+        """Count items toward this transaction's op log; False once it is too large to keep."""
+        if self._ops is not None:
+            self._logged_items += items
+            if self._logged_items > self.max_logged_items:
+                self._ops = None
+        return self._ops is not None
+
+    def load(self):
+        """
+        Read the whole graph in one consistent snapshot.
+
+        Returns:
+            tuple: (version, (node dicts, edge dicts), no ops)
+        """
+        conn = self.conn
+        own_transaction = not conn.in_transaction
+        if own_transaction:
+            conn.execute('BEGIN')
+        try:
+            version = self.current_version()
+            nodes = [json.loads(data) for (data,) in conn.execute('SELECT data FROM nodes ORDER BY rowid')]
+            edges = [
+                {'id': edge_id, 'source': source, 'target': target, 'relation': relation}
+                for edge_id, source, target, relation in conn.execute(
+                    'SELECT id, source, target, relation FROM edges ORDER BY rowid'
+                )
+            ]
+        finally:
+            if own_transaction:
+                conn.execute('COMMIT')
+        return version, (nodes, edges), []
+
+    def wants_snapshot(self):
+        return False
+
+    def write_snapshot(self, version, columns):
+        pass
+
+    def put_node(self, node):
+        self.put_nodes([node])
+
+    def put_nodes(self, nodes):
+        rows = [(node['id'], json.dumps(node)) for node in nodes]
+        self.conn.executemany(
+            'INSERT INTO nodes (id, data) VALUES (?, ?) '
+            'ON CONFLICT(id) DO UPDATE SET data = excluded.data',
+            rows
+        )
+        if self._logs(len(rows)):
+            # Reuse the row JSON instead of encoding every node twice
+            self._ops.append('["put_nodes",[' + ','.join(data for _, data in rows) + ']]')
+
+    def delete_node(self, node_id):
+        self.conn.execute('DELETE FROM nodes WHERE id = ?', (node_id,))
+        if self._logs(1):
+            self._ops.append(json.dumps(['delete_node', node_id]))
+
+    def put_edge(self, edge):
+        self.put_edges([edge])
+
+    def put_edges(self, edges):
+        self.conn.executemany(
+            'INSERT INTO edges (id, source, target, relation) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(id) DO UPDATE SET relation = excluded.relation',
+            ((edge['id'], edge['source'], edge['target'], edge['relation']) for edge in edges)
+        )
+        if self._logs(len(edges)):
+            self._ops.append(json.dumps(['put_edges', edges]))
+
+    def delete_edge(self, edge_id):
+        self.conn.execute('DELETE FROM edges WHERE id = ?', (edge_id,))
+        if self._logs(1):
+            self._ops.append(json.dumps(['delete_edge', edge_id]))
+
+    def clear(self):
+        self.conn.execute('DELETE FROM nodes')
+        self.conn.execute('DELETE FROM edges')
+        if self._logs(1):
+            self._ops.append('["clear"]')
+
+    def close(self):
+        """Close this process's connection, e.g. before forking; the next use reopens it."""
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+
+
+class LogBackend:
+    """
+    Backend storing the graph as a snapshot plus an append-only op log.
+
+    Each committed transaction is appended to the current log file as one
+    JSON line. A background thread fsyncs the log every `fsync_interval`
+    seconds, so commits never wait on the disk; at most that window of
+    writes is lost on power failure. Once `snapshot_every` operations have
+    been logged, the graph is written to a snapshot in the background and
+    the log files it covers are deleted. On startup the snapshot is loaded
+    and newer log lines are replayed.
+
+    Snapshots are columnar (graph_store.SnapshotColumns) rather than a
+    list of dicts: node fields and flattened adjacency lists, pickled so
+    that each id is written once and referenced everywhere else. Loading
+    builds every adjacency dict in one dict() call, and GraphStore replays
+    newer log ops on top.
+
+    Only one process may write to a data directory.
+    """
+
+    SNAPSHOT_FILE = 'snapshot.pickle'
+    LOG_PATTERN = 'oplog.*.ndjson'
+
+    def __init__(self, directory, fsync_interval=0.05, snapshot_every=100000):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        self.snapshot_every = snapshot_every
+        self.instance_id = None
+        self._version = 0
+        self._ops = []
+        self._log = None
+        self._log_index = 0
+        self._logged_ops = 0
+        self._unsynced = False
+        self._snapshotting = False
+        self._snapshot_thread = None
+        self._file_lock = threading.Lock()
+        self._flusher_pid = None
+        atexit.register(self.close)
+
+    def begin(self):
+        self._ops = []
+
+    def commit(self):
+        if not self._ops:
+            return
+        line = json.dumps({'v': self._version, 'ops': self._ops}, separators=(',', ':'))
+        with self._file_lock:
+            self._log.write(line + '\n')
+            self._unsynced = True
+        self._logged_ops += self._count_items(self._ops)
+        self._ops = []
+        self._start_flusher()
+
+    def rollback(self):
+        self._ops = []
+
+    def current_version(self):
+        return self._version
+
+    def bump_version(self):
+        self._version += 1
+        return self._version
+
+    def put_node(self, node):
+        self._ops.append(['put_nodes', [node]])
+
+    def put_nodes(self, nodes):
+        self._ops.append(['put_nodes', nodes])
+
+    def delete_node(self, node_id):
+        self._ops.append(['delete_node', node_id])
+
+    def put_edge(self, edge):
+        self._ops.append(['put_edges', [edge]])
+
+    def put_edges(self, edges):
+        self._ops.append(['put_edges', edges])
+
+    def delete_edge(self, edge_id):
+        self._ops.append(['delete_edge', edge_id])
+
+    def clear(self):
+        self._ops.append(['clear'])
+
+    def load(self):
+        """
+        Read the snapshot and the op logs written after it.
+
+        Returns:
+            tuple: (version, SnapshotColumns or (node dicts, edge dicts) from
+                an older snapshot, ops to replay on top)
+        """
+        with self._file_lock:
+            if self._log is not None:
+                self._log.flush()
+
+        snapshot_path = os.path.join(self.directory, self.SNAPSHOT_FILE)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, 'rb') as f:
+                snapshot = pickle.load(f)
+        else:
+            snapshot = {'instance': uuid.uuid4().hex[:16], 'version': 0, 'columns': None}
+            self._dump_snapshot(snapshot)
+
+        self.instance_id = snapshot['instance']
+        version = snapshot['version']
+        graph = snapshot.get('columns')
+        if graph is None:
+            # Empty, or written as node and edge dicts by an older release
+            graph = (snapshot.get('nodes', []), snapshot.get('edges', []))
+        ops = []
+
+        log_paths = self._log_paths()
+        for path in log_paths:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Torn write at the tail of a crashed log
+                        break
+                    if record['v'] <= version:
+                        continue
+                    ops.extend(record['ops'])
+                    version = record['v']
+
+        # Never append after a possibly torn line; start a fresh log file
+        with self._file_lock:
+            if self._log is not None:
+                self._log.close()
+            last_index = self._log_index_of(log_paths[-1]) if log_paths else 0
+            self._open_log(max(last_index, self._log_index) + 1)
+
+        self._version = version
+        self._logged_ops = self._count_items(ops)
+        return version, graph, ops
+
+    @staticmethod
+    def _count_items(ops):
+        """Count the nodes and edges written by logged ops."""
+        return sum(len(op[1]) if op[0] in ('put_nodes', 'put_edges') else 1 for op in ops)
+
+    def ops_since(self, version, limit):
+        # Only one process writes, so its copy is never behind
+        return None
+
+    def wants_snapshot(self):
+        return self._logged_ops >= self.snapshot_every and not self._snapshotting
+
+    def write_snapshot(self, version, columns):
+        """
+        Compact the op log into a snapshot of the given SnapshotColumns.
+
+        The log is rotated immediately; serialization happens on a
+        background thread so the committing request is not held up.
+        """
+        self._snapshotting = True
+        self._logged_ops = 0
+        with self._file_lock:
+            self._sync_log()
+            self._log.close()
+            self._open_log(self._log_index + 1)
+            keep_from = self._log_index
+        snapshot = {'instance': self.instance_id, 'version': version, 'columns': columns}
+
+        def run():
+            try:
+                self._dump_snapshot(snapshot)
+                for path in self._log_paths():
+                    if self._log_index_of(path) < keep_from:
+                        os.remove(path)
+            finally:
+                self._snapshotting = False
+
+        self._snapshot_thread = threading.Thread(target=run, name='graph-snapshot', daemon=True)
+        self._snapshot_thread.start()
+
+    def close(self):
+        """Finish any snapshot in progress and fsync the open log file."""
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+        with self._file_lock:
+            if self._log is not None and not self._log.closed:
+                self._sync_log()
+
+    def _dump_snapshot(self, snapshot):
+        path = os.path.join(self.directory, self.SNAPSHOT_FILE)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _log_paths(self):
+        return sorted(
+            glob.glob(os.path.join(self.directory, self.LOG_PATTERN)),
+            key=self._log_index_of
+        )
+
+    @staticmethod
+    def _log_index_of(path):
+        return int(os.path.basename(path).split('.')[1])
+
+    def _open_log(self, index):
+        self._log_index = index
+        path = os.path.join(self.directory, f'oplog.{index:06d}.ndjson')
+        self._log = open(path, 'a', encoding='utf-8')
+
+    def _sync_log(self):
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self._unsynced = False
+
+    def _start_flusher(self):
+        # Threads do not survive fork, so start one per process
+        if self._flusher_pid == os.getpid():
+            return
+        self._flusher_pid = os.getpid()
+
+        def run():
+            while True:
+                time.sleep(self.fsync_interval)
+                with self._file_lock:
+                    if self._unsynced and not self._log.closed:
+                        self._sync_log()
+
+        threading.Thread(target=run, name='graph-log-fsync', daemon=True).start()
+
+
+def create_backend(name, path=None):
+    """
+    Create a storage backend by name.
+
+    Args:
+        name: 'memory', 'sqlite' or 'log'
+        path: Database file for the sqlite backend, data directory for the
+            log backend
+
+    Returns:
+        A backend instance
+    """
+    if name == 'memory':
+        return MemoryBackend()
+    if name == 'sqlite':
+        return SQLiteBackend(path or 'graph.db')
+    if name == 'log':
+        return LogBackend(path or 'graph_data')
+    raise ValueError(f'Unknown graph backend: {name}')
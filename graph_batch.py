@@ -0,0 +1,249 @@
+"""
+Atomic Graph Batches
+
+Applies a mixed list of node and edge operations to a GraphStore as one
+transaction, so a client building a graph pays for one request instead of
+one per element.
+
+Each operation is a JSON object in one of these forms:
+    {"op": "add_node", "node": {"id": ..., "label": ..., "type": ..., "x": ..., "y": ...}}
+    {"op": "update_node", "id": ..., "node": {fields to change}}
+    {"op": "delete_node", "id": ...}
+    {"op": "add_edge", "edge": {"source": ..., "target": ..., "relation": ...}}
+    {"op": "update_edge", "id": ..., "edge": {"relation": ...}}
+    {"op": "delete_edge", "id": ...}
+
+Operations see the effects of earlier ones in the same batch: an edge can
+join nodes added above it, and deleting a node also deletes its edges.
+The whole batch is checked against the graph in one pass before anything
+is written, so it is applied all or none.
+"""
+
+from graph_import import normalize_node
+from graph_store import field_error, make_edge, make_edge_id
+
+BATCH_OPS = ('add_node', 'update_node', 'delete_node', 'add_edge', 'update_edge', 'delete_edge')
+
+
+def _is_key(value):
+    return isinstance(value, (str, int)) and not isinstance(value, bool) and value != ''
+
+
+class _Overlay:
+    """
+    The graph as earlier operations of a batch leave it, without writing it.
+
+    Node and edge states set by the batch shadow the store; anything the
+    batch has not touched is read from the store's indexes.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.nodes = {}
+        self.edges = {}
+        self.edges_of = {}
+
+    def has_node(self, node_id):
+        if node_id in self.nodes:
+            return self.nodes[node_id]
+        return self.graph.has_node(node_id)
+
+    def find_edge(self, edge_id):
+        """Return the (source, target) pair of a live edge id, or None."""
+        if edge_id in self.edges:
+            return self.edges[edge_id]
+        edge = self.graph.get_edge(edge_id)
+        return None if edge is None else (edge['source'], edge['target'])
+
+    def add_node(self, node_id):
+        self.nodes[node_id] = True
+
+    def delete_node(self, node_id):
+        self.nodes[node_id] = False
+        if self.graph.has_node(node_id):
+            for edge in self.graph.out_edges(node_id) + self.graph.in_edges(node_id):
+                self.edges[edge['id']] = None
+        for edge_id in self.edges_of.pop(node_id, ()):
+            self.edges[edge_id] = None
+
+    def add_edge(self, source, target):
+        edge_id = make_edge_id(source, target)
+        self.edges[edge_id] = (source, target)
+        self.edges_of.setdefault(source, set()).add(edge_id)
+        self.edges_of.setdefault(target, set()).add(edge_id)
+
+    def delete_edge(self, edge_id):
+        self.edges[edge_id] = None
+
+
+def _check(overlay, op):
+    """
+    Validate one operation against the overlay and advance it.
+
+    Returns:
+        tuple: (step to apply, None) or (None, (status, error message))
+    """
+    kind = op.get('op')
+    if kind not in BATCH_OPS:
+        return None, (400, f"Invalid op: use one of {', '.join(BATCH_OPS)}")
+
+    if kind == 'add_node':
+        node = op.get('node')
+        if not isinstance(node, dict) or not _is_key(node.get('id')) or not node.get('label'):
+            return None, (400, 'Node ID and label are required')
+        error = field_error('node', node)
+        if error is not None:
+            return None, (400, error)
+        if overlay.has_node(node['id']):
+            return None, (409, 'Node with this ID already exists')
+        overlay.add_node(node['id'])
+        return (kind, normalize_node(node)), None
+
+    if kind == 'add_edge':
+        edge = op.get('edge')
+        if not isinstance(edge, dict) or not _is_key(edge.get('source')) or not _is_key(edge.get('target')):
+            return None, (400, 'Source and target are required')
+        error = field_error('edge', {'relation': edge.get('relation', 'related_to')})
+        if error is not None:
+            return None, (400, error)
+        source, target = edge['source'], edge['target']
+        if not overlay.has_node(source) or not overlay.has_node(target):
+            return None, (404, 'Source or target node not found')
+        if overlay.find_edge(make_edge_id(source, target)) is not None:
+            return None, (409, 'Edge already exists')
+        overlay.add_edge(source, target)
+        return (kind, {'source': source, 'target': target, 'relation': edge.get('relation', 'related_to')}), None
+
+    item_id = op.get('id')
+    if not _is_key(item_id):
+        return None, (400, 'id is required')
+
+    if kind in ('update_node', 'delete_node'):
+        if not overlay.has_node(item_id):
+            return None, (404, 'Node not found')
+        if kind == 'delete_node':
+            overlay.delete_node(item_id)
+            return (kind, item_id), None
+        fields = op.get('node')
+        if not isinstance(fields, dict):
+            return None, (400, 'node must be an object of fields to update')
+        error = field_error('node', fields)
+        if error is not None:
+            return None, (400, error)
+        # The id names the node; it cannot be changed in place
+        return (kind, item_id, {key: value for key, value in fields.items() if key != 'id'}), None
+
+    pair = overlay.find_edge(item_id)
+    if pair is None:
+        return None, (404, 'Edge not found')
+    if kind == 'delete_edge':
+        overlay.delete_edge(item_id)
+        return (kind, item_id), None
+    fields = op.get('edge')
+    if not isinstance(fields, dict) or not fields.get('relation'):
+        return None, (400, 'edge.relation is required')
+    error = field_error('edge', fields)
+    if error is not None:
+        return None, (400, error)
+    return (kind, {'source': pair[0], 'target': pair[1], 'relation': fields['relation']}), None
+
+
+def validate_batch(graph, operations):
+    """
+    Check every operation in order without changing the graph.
+
+    Costs O(batch + degree of deleted nodes) whatever the size of the
+    graph. Call it inside the transaction that applies the batch, so the
+    graph cannot change in between.
+
+    Returns:
+        tuple: (steps for apply_batch(), errors); errors is a list of
+            dicts with the 'index', 'op', 'status' and 'error' of each
+            rejected operation, empty when the batch is valid
+    """
+    overlay = _Overlay(graph)
+    steps = []
+    errors = []
+    for index, op in enumerate(operations):
+        if not isinstance(op, dict):
+            step, error = None, (400, 'Each operation must be an object')
+        else:
+            step, error = _check(overlay, op)
+        if error is not None:
+            status, message = error
+            errors.append({
+                'index': index,
+                'op': op.get('op') if isinstance(op, dict) else None,
+                'status': status,
+                'error': message
+            })
+        elif not errors:
+            steps.append(step)
+    return steps, errors
+
+
+def apply_batch(graph, steps):
+    """
+    Apply validated steps in order.
+
+    Consecutive node and edge inserts are grouped into one bulk store
+    call, so a batch that builds a graph costs one backend write per run
+    of inserts rather than one per element.
+
+    Returns:
+        list: One result dict per step, with its 'index', 'op', 'status'
+            and the resulting 'node' or 'edge', or the deleted 'id'
+    """
+    results = []
+    index = 0
+    while index < len(steps):
+        kind = steps[index][0]
+        if kind in ('add_node', 'add_edge'):
+            end = index
+            while end < len(steps) and steps[end][0] == kind:
+                end += 1
+            items = [step[1] for step in steps[index:end]]
+            if kind == 'add_node':
+                # Validation guarantees the ids are new, so every item is inserted
+                graph.merge_nodes(items)
+                key = 'node'
+            else:
+                items = [make_edge(item['source'], item['target'], item['relation']) for item in items]
+                graph.add_edges(items)
+                key = 'edge'
+            for position, item in enumerate(items, index):
+                results.append({'index': position, 'op': kind, 'status': 201, key: item})
+            index = end
+            continue
+
+        step = steps[index]
+        if kind == 'update_node':
+            result = {'node': graph.update_node(step[1], step[2])}
+        elif kind == 'update_edge':
+            graph.merge_edges([step[1]])
+            item = step[1]
+            result = {'edge': make_edge(item['source'], item['target'], item['relation'])}
+        elif kind == 'delete_node':
+            graph.delete_node(step[1])
+            result = {'id': step[1]}
+        else:
+            graph.delete_edge(step[1])
+            result = {'id': step[1]}
+        results.append(dict(result, index=index, op=kind, status=200))
+        index += 1
+    return results
+
+
+def run_batch(graph, operations):
+    """
+    Validate and apply a batch in one transaction.
+
+    Returns:
+        tuple: (applied, results); when any operation is invalid nothing
+            is written, applied is False and results are the errors
+    """
+    with graph.transaction():
+        steps, errors = validate_batch(graph, operations)
+        if errors:
+            return False, errors
+        return True, apply_batch(graph, steps)
@@ -0,0 +1,154 @@
+"""
+Live Graph Events
+
+Fans committed graph changes out to Server-Sent Events (SSE) clients.
+Each connected client gets its own bounded queue, so a slow client can
+never hold up the request that committed a change.
+
+Commits made by other workers reach this process when the graph store
+catches up with the shared backend, which replays them as deltas. While
+any client is subscribed, one poller per process refreshes the graph
+every `poll_interval` seconds, so streams see those changes within about
+that time however many clients are connected.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+
+HEARTBEAT_SECONDS = 15
+POLL_SECONDS = 1.0
+
+
+class EventBroadcaster:
+    """Deliver graph change events to every subscribed client queue."""
+
+    def __init__(self, max_queue=1000, poll_interval=POLL_SECONDS):
+        self.max_queue = max_queue
+        self.poll_interval = poll_interval
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._poller_pid = None
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def subscribe(self):
+        """Register a new client and return its event queue."""
+        events = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers.add(events)
+        return events
+
+    def unsubscribe(self, events):
+        with self._lock:
+            self._subscribers.discard(events)
+
+    def watch(self, graph):
+        """
+        Start this process's poller for commits from other workers, if not
+        running. It stops once the last subscriber has left.
+        """
+        with self._lock:
+            # Threads do not survive fork, so start one per process
+            if self._poller_pid == os.getpid():
+                return
+            self._poller_pid = os.getpid()
+
+        def run():
+            while True:
+                time.sleep(self.poll_interval)
+                with self._lock:
+                    if not self._subscribers:
+                        self._poller_pid = None
+                        return
+                try:
+                    graph.refresh()
+                except Exception:
+                    # Retried on the next tick; requests report backend errors themselves
+                    pass
+
+        threading.Thread(target=run, name='graph-events-poll', daemon=True).start()
+
+    def on_graph_change(self, version, changes):
+        """
+        GraphStore listener publishing one event per change.
+
+        A None changes list means the graph was reloaded or bulk replaced,
+        which clients handle by refetching the graph.
+        """
+        if changes is None:
+            self.publish({'event': 'reset', 'version': version})
+            return
+        for change in changes:
+            self.publish(dict(change, event='change'))
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for events in subscribers:
+            try:
+                events.put_nowait(event)
+            except queue.Full:
+                # The client fell behind; drop its backlog and make it resync
+                self._drain(events)
+                events.put_nowait({'event': 'reset', 'version': event['version']})
+
+    @staticmethod
+    def _drain(events):
+        try:
+            while True:
+                events.get_nowait()
+        except queue.Empty:
+            pass
+
+
+def format_sse(event):
+    """Serialize an event dict as an SSE message whose id is the graph version."""
+    data = {key: value for key, value in event.items() if key != 'event'}
+    return f"id: {event['version']}\nevent: {event['event']}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_events(broadcaster, graph, last_version=None, heartbeat=HEARTBEAT_SECONDS):
+    """
+    Generate the SSE stream for one client.
+
+    Args:
+        broadcaster: EventBroadcaster the client subscribes to
+        graph: GraphStore, used to replay missed changes; the broadcaster
+            polls it for writes from other workers
+        last_version: Version from the client's Last-Event-ID header, if any
+        heartbeat: Seconds between keep-alive comments
+
+    Yields:
+        str: SSE messages
+    """
+    events = broadcaster.subscribe()
+    broadcaster.watch(graph)
+    try:
+        yield 'retry: 3000\n\n'
+        if last_version is None:
+            last_version = graph.version
+            yield format_sse({'event': 'hello', 'version': last_version, 'instance': graph.instance_id})
+        else:
+            version, changes = graph.changes_since(last_version)
+            if changes is None:
+                yield format_sse({'event': 'reset', 'version': version})
+            for change in changes or ():
+                yield format_sse(dict(change, event='change'))
+            # Anything already replayed may also be queued; skip it below
+            last_version = version
+
+        while True:
+            try:
+                event = events.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ': keep-alive\n\n'
+                continue
+            if event['event'] == 'change' and event['version'] <= last_version:
+                continue
+            yield format_sse(event)
+    finally:
+        broadcaster.unsubscribe(events)
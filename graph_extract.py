@@ -0,0 +1,315 @@
+"""
+NLP Graph Extraction
+
+Turns free text into graph nodes and edges with a language model. The
+text is split into chunks, several chunks share one structured-output
+model call, and the calls run concurrently on the LLM job pool. Results
+are cached per chunk, so re-submitting a document only pays for the
+chunks that changed. Entities and relations from every chunk are
+deduplicated before being merged into the graph in one bulk write.
+"""
+
+import hashlib
+import json
+import re
+
+DEFAULT_CHUNK_CHARS = 3000
+DEFAULT_CHUNKS_PER_CALL = 4
+DEFAULT_MAX_CONCURRENT_CALLS = 4
+
+EXTRACTION_PROMPT = (
+    'You extract a knowledge graph from text. For every numbered chunk, list '
+    'the named entities it mentions with a short lower-case type, and the '
+    'relations between those entities, using a short snake_case verb phrase '
+    'as the relation. Reply with JSON only, in the form '
+    '{"chunks": [{"index": 0, "entities": [{"name": "...", "type": "..."}], '
+    '"relations": [{"source": "...", "target": "...", "relation": "..."}]}]}'
+)
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+# \W is Unicode-aware, so letters and digits of any script are kept
+_NON_ID_CHARS = re.compile(r'[\W_]+')
+
+
+class ExtractionError(ValueError):
+    """Raised when the model's reply is not the expected JSON document."""
+
+
+def make_node_id(name):
+    """
+    Build a stable node id from an entity name, e.g. 'New York' -> 'new_york'
+    or '東京' -> '東京'. A name without letters or digits, such as '++', gets
+    a short hash of the name instead; a blank name gets ''.
+    """
+    slug = _NON_ID_CHARS.sub('_', name.casefold()).strip('_')
+    if slug or not name.strip():
+        return slug
+    return _name_hash(name)
+
+
+def _name_key(name):
+    """Return the key under which entity names are the same entity: case and spacing are ignored."""
+    return ' '.join(name.casefold().split())
+
+
+def _name_hash(name):
+    """Return a short hash of an entity name, stable across runs."""
+    return hashlib.sha256(_name_key(name).encode('utf-8')).hexdigest()[:8]
+
+
+def chunk_hash(chunk):
+    """Return the cache key of a chunk, ignoring whitespace differences."""
+    return hashlib.sha256(' '.join(chunk.split()).encode('utf-8')).hexdigest()
+
+
+def split_chunks(text, max_chars=DEFAULT_CHUNK_CHARS):
+    """
+    Split text into chunks of at most max_chars.
+
+    Paragraphs are kept together where they fit, long paragraphs are split
+    between sentences, and only a sentence longer than max_chars is cut.
+
+    Returns:
+        list: Non-empty chunk strings
+    """
+    pieces = []
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = paragraph.strip()
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        for sentence in _SENTENCE_END.split(paragraph):
+            pieces.extend(sentence[i:i + max_chars] for i in range(0, len(sentence), max_chars))
+
+    chunks = []
+    current = ''
+    for piece in pieces:
+        if not piece:
+            continue
+        if current and len(current) + len(piece) + 2 > max_chars:
+            chunks.append(current)
+            current = ''
+        current = f'{current}\n\n{piece}' if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _clean_name(value):
+    return value.strip() if isinstance(value, str) else ''
+
+
+def parse_extraction(content, chunk_count):
+    """
+    Parse one model reply into a result per chunk of its batch.
+
+    Returns:
+        list: {'entities': [...], 'relations': [...]} per chunk, or None for
+            a chunk the reply left out
+
+    Raises:
+        ExtractionError: If the reply is not the expected JSON document
+    """
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError) as e:
+        raise ExtractionError(f'Model reply is not valid JSON ({e})')
+    if not isinstance(data, dict) or not isinstance(data.get('chunks'), list):
+        raise ExtractionError('Model reply has no "chunks" list')
+
+    results = [None] * chunk_count
+    for item in data['chunks']:
+        if not isinstance(item, dict):
+            continue
+        index = item.get('index')
+        if not isinstance(index, int) or not 0 <= index < chunk_count:
+            continue
+        entities = [
+            {'name': _clean_name(entity.get('name')), 'type': _clean_name(entity.get('type')) or 'entity'}
+            for entity in item.get('entities') or () if isinstance(entity, dict)
+        ]
+        relations = [
+            {
+                'source': _clean_name(relation.get('source')),
+                'target': _clean_name(relation.get('target')),
+                'relation': _clean_name(relation.get('relation')) or 'related_to'
+            }
+            for relation in item.get('relations') or () if isinstance(relation, dict)
+        ]
+        results[index] = {'entities': entities, 'relations': relations}
+    return results
+
+
+def merge_extractions(results):
+    """
+    Deduplicate entities and relations across chunk results.
+
+    Entities are keyed by name, ignoring case and spacing, get
+    make_node_id(name) as their id, and keep the first label and type seen. When two different names
+    share a slug, such as 'C++' and 'C#', the later one gets the name's
+    hash appended to its id. Relations are keyed by (source, target) like graph edges,
+    and an endpoint no chunk listed as an entity becomes one.
+
+    Returns:
+        tuple: (node dicts, edge dicts)
+    """
+    nodes = {}
+    edges = {}
+    ids = {}
+
+    def add_node(name, node_type):
+        key = _name_key(name)
+        if key in ids:
+            return ids[key]
+        node_id = make_node_id(name)
+        if not node_id:
+            return node_id
+        if node_id in nodes:
+            node_id = f'{node_id}_{_name_hash(name)}'
+        ids[key] = node_id
+        nodes[node_id] = {'id': node_id, 'label': name, 'type': make_node_id(node_type) or 'entity'}
+        return node_id
+
+    for result in results:
+        for entity in result['entities']:
+            add_node(entity['name'], entity['type'])
+        for relation in result['relations']:
+            source = add_node(relation['source'], 'entity')
+            target = add_node(relation['target'], 'entity')
+            if source and target and source != target and (source, target) not in edges:
+                edges[source, target] = {
+                    'source': source,
+                    'target': target,
+                    'relation': make_node_id(relation['relation']) or 'related_to'
+                }
+    return list(nodes.values()), list(edges.values())
+
+
+def merge_into_graph(graph, nodes, edges):
+    """
+    Bulk insert extracted nodes and edges in one transaction.
+
+    Nodes already in the graph are left untouched, so their labels and
+    positions survive. New nodes are laid out on a grid below the graph.
+
+    Returns:
+        tuple: (nodes added, edges added)
+    """
+    with graph.transaction():
+        new_nodes = [dict(node) for node in nodes if not graph.has_node(node['id'])]
+        start = graph.node_count()
+        for i, node in enumerate(new_nodes, start):
+            node['x'] = 100 + (i % 10) * 150
+            node['y'] = 100 + (i // 10) * 120
+        if new_nodes:
+            graph.put_nodes(new_nodes)
+        added = graph.add_edges(edges)
+    return len(new_nodes), len(added)
+
+
+class GraphExtractor:
+    """
+    Extract entities and relations from text with batched model calls.
+
+    Args:
+        client: OpenAI client, or any object with chat.completions.create
+        pool: LLMExecutor the calls run on
+        cache: ResponseCache holding per-chunk results
+        model: Chat model name
+        chunk_chars: Maximum characters per chunk
+        chunks_per_call: Chunks sent together in one model call
+        max_concurrent_calls: Calls one extraction keeps in flight
+    """
+
+    def __init__(self, client, pool, cache, model='gpt-3.5-turbo', chunk_chars=DEFAULT_CHUNK_CHARS,
+                 chunks_per_call=DEFAULT_CHUNKS_PER_CALL, max_concurrent_calls=DEFAULT_MAX_CONCURRENT_CALLS):
+        self.client = client
+        self.pool = pool
+        self.cache = cache
+        self.model = model
+        self.chunk_chars = chunk_chars
+        self.chunks_per_call = chunks_per_call
+        self.max_concurrent_calls = max_concurrent_calls
+
+    def extract(self, text):
+        """
+        Extract a deduplicated graph from text.
+
+        Returns:
+            dict: nodes, edges and run statistics
+
+        Raises:
+            QueueFull: If the LLM pool is saturated
+            DeadlineExceeded: If a model call missed its deadline
+            ExtractionError: If a model reply cannot be parsed
+        """
+        chunks = split_chunks(text, self.chunk_chars)
+        keys = []
+        results = {}
+        missing = {}
+        for chunk in chunks:
+            key = ('extract', self.model, chunk_hash(chunk))
+            if key in results or key in missing:
+                continue
+            keys.append(key)
+            result = self.cache.lookup(key)
+            if result is None:
+                missing[key] = chunk
+            else:
+                results[key] = result
+        cached_chunks = len(results)
+
+        pending = list(missing.items())
+        batches = [pending[i:i + self.chunks_per_call] for i in range(0, len(pending), self.chunks_per_call)]
+        total_tokens = 0
+        jobs = []
+        try:
+            for batch in batches:
+                # Keep a bounded window of calls in flight on the shared pool
+                if len(jobs) >= self.max_concurrent_calls:
+                    total_tokens += self._collect(self.pool.wait(jobs.pop(0)), results)
+                jobs.append(self.pool.submit(lambda batch=batch: self._call(batch), track=False))
+            while jobs:
+                total_tokens += self._collect(self.pool.wait(jobs.pop(0)), results)
+        finally:
+            # Calls still running finish in the background and fill the cache
+            for job in jobs:
+                job.future.cancel()
+
+        nodes, edges = merge_extractions(results[key] for key in keys)
+        return {
+            'nodes': nodes,
+            'edges': edges,
+            'chunks': len(chunks),
+            'cached_chunks': cached_chunks,
+            'llm_calls': len(batches),
+            'total_tokens': total_tokens
+        }
+
+    @staticmethod
+    def _collect(reply, results):
+        batch_results, tokens = reply
+        results.update(batch_results)
+        return tokens
+
+    def _call(self, batch):
+        """Run one model call for a batch of (key, chunk) pairs and cache each chunk's result."""
+        prompt = '\n\n'.join(f'[chunk {index}]\n{chunk}' for index, (_, chunk) in enumerate(batch))
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {'role': 'system', 'content': EXTRACTION_PROMPT},
+                {'role': 'user', 'content': prompt}
+            ],
+            response_format={'type': 'json_object'},
+            temperature=0
+        )
+        parsed = parse_extraction(response.choices[0].message.content, len(batch))
+        batch_results = {}
+        for (key, _), result in zip(batch, parsed):
+            if result is None:
+                result = {'entities': [], 'relations': []}
+            else:
+                self.cache.put(key, result)
+            batch_results[key] = result
+        return batch_results, response.usage.total_tokens
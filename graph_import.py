@@ -0,0 +1,214 @@
+"""
+Streaming Graph Importer
+
+Loads newline-delimited JSON (NDJSON) graph data into a GraphStore one
+line at a time, so large imports never hold the whole payload in memory.
+
+Each line is a JSON object in one of these forms:
+    {"node": {"id": ..., "label": ..., "type": ..., "x": ..., "y": ...}}
+    {"edge": {"source": ..., "target": ..., "relation": ...}}
+    {"nodes": [...]}   a chunk of nodes
+    {"edges": [...]}   a chunk of edges
+
+Nodes must appear before the edges that reference them.
+
+In the default replace mode the caller clears the graph first. In merge
+mode the records are upserted into the existing graph instead: nodes by
+id, edges by (source, target), so each batch costs O(batch) however large
+the graph already is.
+"""
+
+import json
+
+from graph_store import NODE_FIELDS, field_error
+
+DEFAULT_BATCH_SIZE = 5000
+
+# Decoding str directly skips json.loads' per-call encoding detection
+_decode = json.JSONDecoder().decode
+
+
+class ImportFormatError(ValueError):
+    """Raised when a line of the import stream is malformed."""
+
+    def __init__(self, line_number, message):
+        super().__init__(f'Line {line_number}: {message}')
+        self.line_number = line_number
+
+
+def normalize_node(node):
+    """Build a stored node dict from an imported node."""
+    return {
+        'id': node.get('id'),
+        'label': node.get('label', ''),
+        'type': node.get('type', 'default'),
+        'x': node.get('x', 0),
+        'y': node.get('y', 0)
+    }
+
+
+def node_fields(node):
+    """Keep only the node fields an imported item actually sets."""
+    return {key: node[key] for key in NODE_FIELDS if key in node}
+
+
+def iter_records(stream):
+    """
+    Parse an NDJSON stream incrementally.
+
+    Args:
+        stream: Iterable of lines (bytes or str), e.g. request.stream
+
+    Yields:
+        tuple: (line_number, 'node' or 'edge', item dict)
+    """
+    for line_number, line in enumerate(stream, 1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = _decode(line)
+        except ValueError as e:
+            raise ImportFormatError(line_number, f'invalid JSON ({e})')
+        if not isinstance(record, dict):
+            raise ImportFormatError(line_number, 'each line must be a JSON object')
+
+        if 'node' in record:
+            yield line_number, 'node', record['node']
+        elif 'edge' in record:
+            yield line_number, 'edge', record['edge']
+        elif 'nodes' in record or 'edges' in record:
+            for key in ('nodes', 'edges'):
+                if not isinstance(record.get(key, []), list):
+                    raise ImportFormatError(line_number, f'{key} must be a list')
+            for item in record.get('nodes', []):
+                yield line_number, 'node', item
+            for item in record.get('edges', []):
+                yield line_number, 'edge', item
+        else:
+            raise ImportFormatError(line_number, 'expected a node, edge, nodes or edges key')
+
+
+class StreamingImporter:
+    """
+    Validate records and insert them into a graph in batches.
+
+    Edge deduplication relies on the store's (source, target) index, so
+    each edge costs O(1) no matter how large the graph already is.
+
+    With merge=True batches are upserted with merge_nodes()/merge_edges()
+    and progress also reports inserted, updated and skipped counts.
+    """
+
+    def __init__(self, graph, batch_size=DEFAULT_BATCH_SIZE, merge=False):
+        self.graph = graph
+        self.batch_size = batch_size
+        self.merge = merge
+        self.nodes_imported = 0
+        self.edges_imported = 0
+        self.duplicate_edges = 0
+        self.merge_counts = {
+            'nodes': {'inserted': 0, 'updated': 0, 'skipped': 0},
+            'edges': {'inserted': 0, 'updated': 0, 'skipped': 0}
+        }
+        self.line_number = 0
+
+    def progress(self, done=False):
+        progress = {
+            'line': self.line_number,
+            'nodes_imported': self.nodes_imported,
+            'edges_imported': self.edges_imported,
+            'duplicate_edges': self.duplicate_edges,
+            'done': done
+        }
+        if self.merge:
+            progress['merge'] = self.merge_counts
+        return progress
+
+    def run(self, records):
+        """
+        Import records from iter_records().
+
+        Yields:
+            dict: Progress after every flushed batch, and a final one with done=True
+
+        Raises:
+            ImportFormatError: On the first invalid node or edge
+        """
+        node_batch = []
+        edge_batch = []
+
+        for line_number, kind, item in records:
+            self.line_number = line_number
+
+            if kind == 'node':
+                if not isinstance(item, dict) or 'id' not in item or 'label' not in item:
+                    raise ImportFormatError(line_number, 'each node must have id and label')
+                error = field_error('node', item)
+                if error is not None:
+                    raise ImportFormatError(line_number, error)
+                node_batch.append(item)
+                if len(node_batch) >= self.batch_size:
+                    self._flush_nodes(node_batch)
+                    node_batch = []
+                    yield self.progress()
+                continue
+
+            if not isinstance(item, dict) or 'source' not in item or 'target' not in item:
+                raise ImportFormatError(line_number, 'each edge must have source and target')
+            error = field_error('edge', {
+                'source': item['source'], 'target': item['target'], 'relation': item.get('relation', 'related_to')
+            })
+            if error is not None:
+                raise ImportFormatError(line_number, error)
+            # Endpoints are checked against the graph, so pending nodes go in first
+            if node_batch:
+                self._flush_nodes(node_batch)
+                node_batch = []
+            source, target = item['source'], item['target']
+            if not self.graph.has_node(source) or not self.graph.has_node(target):
+                raise ImportFormatError(line_number, f'Edge references non-existent node: {source} or {target}')
+            edge_batch.append({
+                'source': source,
+                'target': target,
+                'relation': item.get('relation', 'related_to')
+            })
+            if len(edge_batch) >= self.batch_size:
+                self._flush_edges(edge_batch)
+                edge_batch = []
+                yield self.progress()
+
+        if node_batch:
+            self._flush_nodes(node_batch)
+        if edge_batch:
+            self._flush_edges(edge_batch)
+        yield self.progress(done=True)
+
+    def _flush_nodes(self, batch):
+        if self.merge:
+            # Defaults only fill in new nodes; existing ones keep unset fields
+            batch = [
+                node_fields(node) if self.graph.has_node(node['id']) else normalize_node(node)
+                for node in batch
+            ]
+            self._count('nodes', self.graph.merge_nodes(batch))
+        else:
+            self.graph.put_nodes([normalize_node(node) for node in batch])
+        self.nodes_imported += len(batch)
+
+    def _flush_edges(self, batch):
+        if self.merge:
+            inserted, updated, skipped = self._count('edges', self.graph.merge_edges(batch))
+            added = inserted + updated
+        else:
+            added = len(self.graph.add_edges(batch))
+        self.edges_imported += added
+        self.duplicate_edges += len(batch) - added
+
+    def _count(self, kind, counts):
+        totals = self.merge_counts[kind]
+        for key, count in zip(('inserted', 'updated', 'skipped'), counts):
+            totals[key] += count
+        return counts
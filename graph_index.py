@@ -0,0 +1,175 @@
+"""
+Ordered Secondary Indexes
+
+Cursor pagination over the graph store needs a stable order in which a
+page can be resumed without counting from the start. Every node gets an
+increasing sequence number when it is created; the indexes here keep node
+ids sorted by that number, globally, per node type and, for the sources
+of edges, per relation. Resuming after a cursor is one bisect.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+
+_DEAD = object()
+
+
+class OrderedIndex:
+    """
+    Keys sorted by a unique sequence number.
+
+    Removal leaves a tombstone, compacted away once tombstones make up
+    half of the index, so adds at the end and removals cost O(log n).
+    """
+
+    __slots__ = ('_seqs', '_keys', '_dead')
+
+    def __init__(self):
+        self._seqs = array('q')
+        self._keys = []
+        self._dead = 0
+
+    @classmethod
+    def from_sorted(cls, seqs, keys):
+        """Build an index from parallel lists already sorted by seq."""
+        index = cls()
+        index._seqs = array('q', seqs)
+        index._keys = keys
+        return index
+
+    def __len__(self):
+        return len(self._keys) - self._dead
+
+    def add(self, seq, key):
+        seqs = self._seqs
+        if not seqs or seq > seqs[-1]:
+            seqs.append(seq)
+            self._keys.append(key)
+            return
+        i = bisect_left(seqs, seq)
+        if i < len(seqs) and seqs[i] == seq and self._keys[i] is _DEAD:
+            # Re-adding a removed entry, e.g. a node whose type was replaced by itself
+            self._keys[i] = key
+            self._dead -= 1
+            return
+        seqs.insert(i, seq)
+        self._keys.insert(i, key)
+
+    def remove(self, seq):
+        seqs, keys = self._seqs, self._keys
+        i = bisect_left(seqs, seq)
+        while i < len(seqs) and seqs[i] == seq:
+            if keys[i] is not _DEAD:
+                keys[i] = _DEAD
+                self._dead += 1
+                if self._dead > 64 and self._dead * 2 > len(keys):
+                    self._compact()
+                return
+            i += 1
+
+    def _compact(self):
+        live = [(seq, key) for seq, key in zip(self._seqs, self._keys) if key is not _DEAD]
+        self._seqs = array('q', (seq for seq, _ in live))
+        self._keys = [key for _, key in live]
+        self._dead = 0
+
+    def after(self, seq=None):
+        """Yield (seq, key) for live entries whose sequence number is above seq."""
+        seqs, keys = self._seqs, self._keys
+        start = 0 if seq is None else bisect_right(seqs, seq)
+        for i in range(start, len(keys)):
+            key = keys[i]
+            if key is not _DEAD:
+                yield seqs[i], key
+
+
+class PagingIndexes:
+    """
+    The secondary indexes behind paginated node and edge listings.
+
+    Attributes:
+        nodes: OrderedIndex of every node id
+        types: node type -> OrderedIndex of node ids
+        relations: relation -> OrderedIndex of the ids of nodes with at
+            least one outgoing edge of that relation
+    """
+
+    def __init__(self):
+        self.nodes = OrderedIndex()
+        self.types = {}
+        self.relations = {}
+        self._relation_sources = {}
+
+    @classmethod
+    def build(cls, nodes, out_index, seq):
+        """
+        Index a whole graph, numbering its nodes in dict order.
+
+        Args:
+            nodes: node id -> Node record; each record's seq is assigned here
+            out_index: node id -> {target id: relation}
+            seq: Last sequence number already issued
+
+        Returns:
+            tuple: (PagingIndexes, last sequence number issued)
+        """
+        paging = cls()
+        node_seqs, node_ids = [], []
+        types = {}
+        relations = {}
+        relation_sources = paging._relation_sources
+        for node_id, node in nodes.items():
+            seq += 1
+            node.seq = seq
+            node_seqs.append(seq)
+            node_ids.append(node_id)
+            entries = types.get(node.type)
+            if entries is None:
+                entries = types[node.type] = ([], [])
+            entries[0].append(seq)
+            entries[1].append(node_id)
+            targets = out_index.get(node_id)
+            if not targets:
+                continue
+            for relation in targets.values():
+                counts = relation_sources.get(relation)
+                if counts is None:
+                    counts = relation_sources[relation] = {}
+                    relations[relation] = ([], [])
+                count = counts.get(node_id, 0)
+                counts[node_id] = count + 1
+                if not count:
+                    entries = relations[relation]
+                    entries[0].append(seq)
+                    entries[1].append(node_id)
+
+        paging.nodes = OrderedIndex.from_sorted(node_seqs, node_ids)
+        paging.types = {key: OrderedIndex.from_sorted(*entries) for key, entries in types.items()}
+        paging.relations = {key: OrderedIndex.from_sorted(*entries) for key, entries in relations.items()}
+        return paging, seq
+
+    def type_index(self, node_type):
+        index = self.types.get(node_type)
+        if index is None:
+            index = self.types[node_type] = OrderedIndex()
+        return index
+
+    def add_relation(self, relation, seq, source):
+        """Count an edge of relation leaving source, indexing source on its first one."""
+        counts = self._relation_sources.get(relation)
+        if counts is None:
+            counts = self._relation_sources[relation] = {}
+            self.relations[relation] = OrderedIndex()
+        count = counts.get(source, 0)
+        counts[source] = count + 1
+        if not count:
+            self.relations[relation].add(seq, source)
+
+    def remove_relation(self, relation, seq, source):
+        counts = self._relation_sources[relation]
+        count = counts[source] - 1
+        if count:
+            counts[source] = count
+            return
+        del counts[source]
+        self.relations[relation].remove(seq)
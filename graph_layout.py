@@ -0,0 +1,261 @@
+"""
+Force-Directed Graph Layout
+
+Computes node positions on the server so clients do not have to lay out
+large imported graphs themselves. The algorithm is Fruchterman-Reingold
+with NumPy arrays throughout: edge attraction is summed with bincount,
+and the all-pairs repulsion is approximated on a grid (particle-mesh)
+by depositing nodes on grid points and convolving with the repulsive
+force kernel through an FFT, so an iteration costs O(n + g² log g) for
+a g x g grid instead of O(n²).
+
+NumPy is optional; without it compute_layout() raises RuntimeError.
+"""
+
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_ITERATIONS = 50
+MAX_ITERATIONS = 500
+
+# Ideal distance between connected nodes, in the canvas units of the UI
+EDGE_LENGTH = 150.0
+
+# Grid points per side for the repulsion field; cells grow beyond this
+MAX_GRID = 256
+
+# Neighbour-averaging rounds that build the starting point of a full layout
+SMOOTHING_ROUNDS = 30
+
+# Pull towards the centre keeping disconnected components together
+GRAVITY = 0.1
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError('Server-side layout requires numpy (pip install numpy)')
+
+
+def _deposit(pos, origin, cell, shape):
+    """Cloud-in-cell weights: the 4 grid points around each node and their weights."""
+    grid = (pos - origin) / cell
+    base = np.floor(grid).astype(np.int64)
+    frac = grid - base
+    base[:, 0] = np.clip(base[:, 0], 0, shape[0] - 2)
+    base[:, 1] = np.clip(base[:, 1], 0, shape[1] - 2)
+    points = []
+    for dx, wx in ((0, 1 - frac[:, 0]), (1, frac[:, 0])):
+        for dy, wy in ((0, 1 - frac[:, 1]), (1, frac[:, 1])):
+            points.append(((base[:, 0] + dx) * shape[1] + base[:, 1] + dy, wx * wy))
+    return points
+
+
+def _repulsion(pos, k):
+    """
+    Approximate the repulsive force k² / d from every other node.
+
+    Returns:
+        ndarray: (n, 2) force per node
+    """
+    lo = pos.min(axis=0) - k
+    hi = pos.max(axis=0) + k
+    cell = max(k, float((hi - lo).max()) / (MAX_GRID - 1))
+    shape = (int((hi[0] - lo[0]) / cell) + 2, int((hi[1] - lo[1]) / cell) + 2)
+
+    points = _deposit(pos, lo, cell, shape)
+    size = shape[0] * shape[1]
+    density = sum(np.bincount(index, weights=weight, minlength=size) for index, weight in points)
+    density = density.reshape(shape)
+
+    # Force kernel over every grid offset, zero at the origin
+    ox = np.arange(-(shape[0] - 1), shape[0]) * cell
+    oy = np.arange(-(shape[1] - 1), shape[1]) * cell
+    dx, dy = np.meshgrid(ox, oy, indexing='ij')
+    dist2 = dx * dx + dy * dy
+    dist2[shape[0] - 1, shape[1] - 1] = np.inf
+    scale = k * k / dist2
+
+    # Linear (not circular) convolution needs at least 3g - 2 points per side
+    fft_shape = (3 * shape[0] - 2, 3 * shape[1] - 2)
+    density_f = np.fft.rfft2(density, fft_shape)
+    crop = (slice(shape[0] - 1, 2 * shape[0] - 1), slice(shape[1] - 1, 2 * shape[1] - 1))
+    fields = [
+        np.fft.irfft2(density_f * np.fft.rfft2(component * scale, fft_shape), fft_shape)[crop].ravel()
+        for component in (dx, dy)
+    ]
+
+    force = np.zeros_like(pos)
+    for index, weight in points:
+        force[:, 0] += fields[0][index] * weight
+        force[:, 1] += fields[1][index] * weight
+    return force
+
+
+def _attraction(pos, sources, targets, k):
+    """Spring force d² / k along every edge, summed per node."""
+    delta = pos[targets] - pos[sources]
+    dist = np.sqrt((delta * delta).sum(axis=1))
+    pull = delta * (dist / k)[:, None]
+    n = len(pos)
+    force = np.empty_like(pos)
+    for axis in (0, 1):
+        force[:, axis] = (np.bincount(sources, weights=pull[:, axis], minlength=n) -
+                          np.bincount(targets, weights=pull[:, axis], minlength=n))
+    return force
+
+
+def force_layout(pos, sources, targets, iterations=DEFAULT_ITERATIONS, movable=None,
+                 edge_length=EDGE_LENGTH, temperature=None):
+    """
+    Relax node positions with a force-directed simulation.
+
+    Args:
+        pos: (n, 2) float array of starting positions, updated in place
+        sources, targets: Int arrays of edge end point indexes
+        iterations: Simulation steps; the step size cools linearly to zero
+        movable: Optional bool mask; other nodes keep their position but
+            still push and pull the movable ones
+        edge_length: Ideal edge length
+        temperature: Largest step of the first iteration
+
+    Returns:
+        ndarray: pos
+    """
+    if len(pos) < 2:
+        return pos
+    k = edge_length
+    if temperature is None:
+        temperature = float(np.ptp(pos, axis=0).max()) / 10 or k
+    for step in range(iterations):
+        force = _repulsion(pos, k)
+        if len(sources):
+            force += _attraction(pos, sources, targets, k)
+        force -= GRAVITY * (pos - pos.mean(axis=0)) * (len(pos) ** 0.5)
+        length = np.sqrt((force * force).sum(axis=1))
+        limit = temperature * (1 - step / iterations)
+        move = force * (np.minimum(length, limit) / np.maximum(length, 1e-9))[:, None]
+        if movable is not None:
+            move[~movable] = 0
+        pos += move
+    return pos
+
+
+def _graph_arrays(graph):
+    """Return node ids, (n, 2) positions with NaN for unplaced nodes, and edge index arrays."""
+    rows = graph.node_tuples(('id', 'x', 'y'))
+    ids = [row[0] for row in rows]
+    index = {node_id: i for i, node_id in enumerate(ids)}
+
+    def coordinate(value):
+        return float(value) if isinstance(value, (int, float)) else math.nan
+
+    pos = np.array([(coordinate(x), coordinate(y)) for _, x, y in rows], dtype=float).reshape(-1, 2)
+    # The importers leave nodes at the origin when they have no position
+    pos[(pos[:, 0] == 0) & (pos[:, 1] == 0)] = math.nan
+
+    pairs = [(index[s], index[t]) for s, t, _ in graph.edge_tuples() if s in index and t in index]
+    edges = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+    return ids, pos, edges[:, 0], edges[:, 1]
+
+
+def _smoothed_start(pos, sources, targets, side, rounds=SMOOTHING_ROUNDS):
+    """
+    Pull connected nodes together before the simulation starts.
+
+    A few rounds of moving every node halfway to the mean of its
+    neighbours turn a random start into a rough low-frequency embedding,
+    which the forces then only have to refine; this converges in far
+    fewer iterations than starting from noise.
+    """
+    n = len(pos)
+    if not len(sources) or n < 3:
+        return pos
+    a = np.concatenate([sources, targets])
+    b = np.concatenate([targets, sources])
+    degree = np.bincount(a, minlength=n)
+    connected = degree > 0
+    for _ in range(rounds):
+        total = np.stack([np.bincount(a, weights=pos[b, axis], minlength=n) for axis in (0, 1)], axis=1)
+        pos[connected] = (pos[connected] + total[connected] / degree[connected, None]) / 2
+        # Rescale to the target size, or the drawing collapses to a point
+        pos -= pos.mean(axis=0)
+        pos *= side / max(float(np.ptp(pos, axis=0).max()), 1e-9)
+    return pos
+
+
+def _place_near_neighbors(pos, sources, targets, rng, spread):
+    """Start unplaced nodes at the mean position of their placed neighbours."""
+    n = len(pos)
+    for _ in range(3):
+        unplaced = np.isnan(pos[:, 0])
+        if not unplaced.any():
+            break
+        placed = ~unplaced
+        a = np.concatenate([sources, targets])
+        b = np.concatenate([targets, sources])
+        # Edges from an unplaced node to a placed one
+        use = unplaced[a] & placed[b]
+        if not use.any():
+            break
+        count = np.bincount(a[use], minlength=n)
+        total = np.stack([np.bincount(a[use], weights=pos[b[use], axis], minlength=n) for axis in (0, 1)], axis=1)
+        ready = count > 0
+        pos[ready] = total[ready] / count[ready, None] + rng.uniform(-spread, spread, (int(ready.sum()), 2))
+
+
+def compute_layout(graph, iterations=DEFAULT_ITERATIONS, incremental=False, edge_length=EDGE_LENGTH):
+    """
+    Lay out the graph.
+
+    A full layout places every node from a seeded random start. An
+    incremental layout keeps placed nodes fixed and only relaxes nodes
+    still at the origin, together with their direct neighbours: new nodes
+    start next to their placed neighbours, or at random inside the
+    current drawing.
+
+    Returns:
+        dict: 'positions' mapping moved node ids to [x, y], 'moved' and
+            'nodes' counts, and the mode used
+
+    Raises:
+        RuntimeError: If numpy is not installed
+    """
+    _require_numpy()
+    ids, pos, sources, targets = _graph_arrays(graph)
+    n = len(ids)
+    rng = np.random.default_rng(n)
+    unplaced = np.isnan(pos[:, 0])
+    incremental = incremental and not unplaced.all()
+
+    if incremental:
+        if not unplaced.any():
+            return {'mode': 'incremental', 'nodes': n, 'moved': 0, 'positions': {}}
+        movable = unplaced.copy()
+        movable[sources[unplaced[targets]]] = True
+        movable[targets[unplaced[sources]]] = True
+        placed = pos[~unplaced]
+        _place_near_neighbors(pos, sources, targets, rng, edge_length / 2)
+        still = np.isnan(pos[:, 0])
+        pos[still] = rng.uniform(placed.min(axis=0), placed.max(axis=0) + edge_length, (int(still.sum()), 2))
+        force_layout(pos, sources, targets, iterations, movable, edge_length, temperature=edge_length)
+    else:
+        movable = np.ones(n, dtype=bool)
+        side = edge_length * math.sqrt(max(n, 1))
+        pos = _smoothed_start(rng.uniform(0, side, (n, 2)), sources, targets, side)
+        force_layout(pos, sources, targets, iterations, edge_length=edge_length)
+        # Shift the drawing to the same top-left margin as the sample data
+        if n:
+            pos += 100 - pos.min(axis=0)
+
+    pos = np.round(pos, 1)
+    moved = np.flatnonzero(movable)
+    return {
+        'mode': 'incremental' if incremental else 'full',
+        'nodes': n,
+        'moved': len(moved),
+        'positions': {ids[i]: pos[i].tolist() for i in moved}
+    }
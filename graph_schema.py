@@ -0,0 +1,166 @@
+"""
+Schema Generation
+
+Builds SQL DDL and a MongoDB validator document from the graph's node
+types and relations. Every fragment is a pure function of its inputs and
+is memoized, so regenerating the schema after a change only formats the
+tables, junction tables or collections that are new; the rest come
+straight from the caches.
+"""
+
+from functools import lru_cache
+
+# Fragments are keyed by user-supplied type and relation names, so every
+# cache is bounded; junction tables are one per edge
+TYPE_FRAGMENT_CACHE_SIZE = 4096
+EDGE_FRAGMENT_CACHE_SIZE = 65536
+
+MONGODB_INDEX_SUGGESTIONS = {
+    "common": [
+        {"key": {"label": 1}},
+        {"key": {"type": 1}},
+        {"key": {"createdAt": -1}}
+    ],
+    "forSearch": [
+        {"key": {"label": "text"}},
+        {"key": {"relationships.relation": 1}}
+    ]
+}
+
+
+@lru_cache(maxsize=TYPE_FRAGMENT_CACHE_SIZE)
+def sql_table(node_type):
+    """Return the CREATE TABLE statement for one node type."""
+    table_name = node_type.lower() + 's'
+    return f"""-- Table for {node_type} entities
+CREATE TABLE {table_name} (
+    id VARCHAR(255) PRIMARY KEY,
+    label VARCHAR(255) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+@lru_cache(maxsize=EDGE_FRAGMENT_CACHE_SIZE)
+def sql_junction_table(source, target, relation):
+    """Return the CREATE TABLE statement for one relationship."""
+    return f"""-- Relationship table for {relation}
+CREATE TABLE {source}_to_{target} (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    source_id VARCHAR(255) NOT NULL,
+    target_id VARCHAR(255) NOT NULL,
+    relation VARCHAR(255) NOT NULL DEFAULT '{relation}',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (source_id) REFERENCES {source}(id),
+    FOREIGN KEY (target_id) REFERENCES {target}(id),
+    UNIQUE KEY unique_relation (source_id, target_id, relation)
+);
+"""
+
+
+def iter_sql_schema(graph):
+    """
+    Generate the SQL schema one statement at a time.
+
+    Statements are separated by a blank line exactly as in the joined
+    document, so the chunks can be streamed straight to a client.
+
+    Yields:
+        str: A CREATE TABLE statement, preceded by a newline after the first
+    """
+    separator = ''
+    for node_type in graph.type_counts():
+        yield separator + sql_table(node_type)
+        separator = '\n'
+    for source, target, relation in graph.edge_tuples():
+        yield separator + sql_junction_table(source, target, relation)
+        separator = '\n'
+
+
+def sql_schema(graph):
+    """Return the SQL schema report for the graph."""
+    return {
+        'schema_type': 'SQL',
+        'database': 'MySQL/PostgreSQL',
+        'schema': ''.join(iter_sql_schema(graph)),
+        'table_count': len(graph.type_counts()),
+        'relationship_count': graph.edge_count()
+    }
+
+
+@lru_cache(maxsize=TYPE_FRAGMENT_CACHE_SIZE)
+def mongodb_collection(node_type):
+    """Return the collection definition for one lower-cased node type."""
+    return {
+        "collectionName": node_type + "s",
+        "validator": {
+            "$jsonSchema": {
+                "bsonType": "object",
+                "required": ["_id", "label", "type"],
+                "properties": {
+                    "_id": {
+                        "bsonType": "string",
+                        "description": "Unique identifier"
+                    },
+                    "label": {
+                        "bsonType": "string",
+                        "description": "Display name"
+                    },
+                    "type": {
+                        "bsonType": "string",
+                        "enum": [node_type],
+                        "description": "Entity type"
+                    },
+                    "relationships": {
+                        "bsonType": "array",
+                        "description": "Array of related entities",
+                        "items": {
+                            "bsonType": "object",
+                            "properties": {
+                                "targetId": {"bsonType": "string"},
+                                "relation": {"bsonType": "string"},
+                                "metadata": {"bsonType": "object"}
+                            }
+                        }
+                    },
+                    "metadata": {
+                        "bsonType": "object",
+                        "description": "Additional properties"
+                    },
+                    "createdAt": {
+                        "bsonType": "date"
+                    },
+                    "updatedAt": {
+                        "bsonType": "date"
+                    }
+                }
+            }
+        }
+    }
+
+
+def mongodb_schema(graph):
+    """
+    Return the MongoDB schema report for the graph.
+
+    Collection definitions are shared between calls and must not be mutated.
+    """
+    collections = {}
+    for node_type in graph.type_counts():
+        node_type = node_type.lower()
+        if node_type not in collections:
+            collections[node_type] = mongodb_collection(node_type)
+    relationship_types = list(graph.relation_counts())
+
+    return {
+        'schema_type': 'MongoDB',
+        'schema': {
+            "database": "knowledge_graph",
+            "collections": collections,
+            "relationshipTypes": relationship_types,
+            "indexSuggestions": MONGODB_INDEX_SUGGESTIONS
+        },
+        'collection_count': len(collections),
+        'relationship_count': len(relationship_types)
+    }
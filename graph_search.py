@@ -0,0 +1,268 @@
+"""
+Node Search Index
+
+An in-process index over node labels and ids for full-text and
+typeahead search. Labels and ids are split into lower-case word tokens:
+an inverted index maps each token to the nodes containing it, and a
+sorted array of the tokens answers prefix queries with a bisect.
+
+The index follows the graph as a GraphStore listener, applying each
+committed change incrementally and rebuilding only when the graph was
+reloaded or bulk replaced.
+"""
+
+import gc
+import heapq
+import re
+import threading
+from bisect import bisect_left, insort
+
+# Candidates gathered before ranking; keeps short, common prefixes fast
+MAX_CANDIDATES = 1000
+
+# Tokens first seen since the last merge are kept in a second, small
+# sorted list; merging it into the main array costs O(n), so it waits
+# until this many have piled up
+MAX_RECENT_TOKENS = 16384
+
+_TOKEN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Split text into lower-case word tokens."""
+    if text is None:
+        return []
+    return _TOKEN.findall(str(text).casefold())
+
+
+class SearchIndex:
+    """
+    Inverted and prefix index over the nodes of a GraphStore.
+
+    Register on_graph_change() with graph.add_listener() to keep it current.
+
+    A posting is stored as a bare node id while a token belongs to a
+    single node, and as a set from the second node on; most tokens of
+    ids are unique, so this keeps the index small on large graphs.
+    """
+
+    def __init__(self, graph):
+        self._graph = graph
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._postings = {}
+        self._sorted_tokens = []
+        self._recent_tokens = []
+        self._stale_tokens = 0
+        self.rebuild()
+
+    def __len__(self):
+        return len(self._entries)
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def rebuild(self):
+        """Index every node of the graph from scratch."""
+        # Like GraphStore._reload(), skip cyclic GC while allocating objects that stay alive
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            entries = {}
+            postings = {}
+            tokens_of = self._tokens_of
+            for node_id, label, node_type in self._graph.node_tuples(('id', 'label', 'type')):
+                entry = tokens_of(node_id, label, node_type)
+                entries[node_id] = entry
+                for token in entry[3]:
+                    posting = postings.get(token)
+                    if posting is None:
+                        postings[token] = node_id
+                    elif type(posting) is set:
+                        posting.add(node_id)
+                    else:
+                        postings[token] = {posting, node_id}
+            sorted_tokens = sorted(postings)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        with self._lock:
+            self._entries = entries
+            self._postings = postings
+            self._sorted_tokens = sorted_tokens
+            self._recent_tokens = []
+            self._stale_tokens = 0
+
+    def on_graph_change(self, version, changes):
+        """GraphStore listener keeping the index in step with committed changes."""
+        if changes is None:
+            self.rebuild()
+            return
+        with self._lock:
+            for change in changes:
+                op = change['op']
+                if 'node' in change:
+                    node = change['node']
+                    self._remove(node['id'])
+                    self._add(node['id'], node.get('label'), node.get('type'))
+                elif op == 'delete_node':
+                    self._remove(change['id'])
+                elif op == 'clear':
+                    self._entries = {}
+                    self._postings = {}
+                    self._sorted_tokens = []
+                    self._recent_tokens = []
+                    self._stale_tokens = 0
+            self._compact_tokens()
+
+    @staticmethod
+    def _tokens_of(node_id, label, node_type):
+        """Build the entry of a node: (type, label, folded label, tokens)."""
+        folded = '' if label is None else str(label).casefold()
+        key = str(node_id).casefold()
+        tokens = _TOKEN.findall(f'{folded} {key}')
+        # The whole id is a token too, so exact id lookups always work
+        if key not in tokens:
+            tokens.append(key)
+        return node_type, label, folded, tuple(dict.fromkeys(tokens))
+
+    def _add(self, node_id, label, node_type):
+        entry = self._tokens_of(node_id, label, node_type)
+        self._entries[node_id] = entry
+        postings = self._postings
+        for token in entry[3]:
+            posting = postings.get(token)
+            if posting is None:
+                postings[token] = node_id
+                if self._listed(token):
+                    # Removed earlier but not yet compacted away
+                    self._stale_tokens -= 1
+                else:
+                    insort(self._recent_tokens, token)
+            elif type(posting) is set:
+                posting.add(node_id)
+            else:
+                postings[token] = {posting, node_id}
+
+    def _remove(self, node_id):
+        entry = self._entries.pop(node_id, None)
+        if entry is None:
+            return
+        postings = self._postings
+        for token in entry[3]:
+            posting = postings[token]
+            if type(posting) is set:
+                posting.discard(node_id)
+                if len(posting) == 1:
+                    postings[token] = next(iter(posting))
+            else:
+                # The token stays in the sorted arrays until the next compaction
+                del postings[token]
+                self._stale_tokens += 1
+
+    def _listed(self, token):
+        """Whether token is already in one of the sorted arrays."""
+        for tokens in (self._sorted_tokens, self._recent_tokens):
+            i = bisect_left(tokens, token)
+            if i < len(tokens) and tokens[i] == token:
+                return True
+        return False
+
+    def _compact_tokens(self):
+        """Merge recent tokens into the main array and drop removed ones once they pile up."""
+        if len(self._recent_tokens) > MAX_RECENT_TOKENS:
+            # Appending a sorted run lets the sort merge two runs in linear time
+            self._sorted_tokens.extend(self._recent_tokens)
+            self._sorted_tokens.sort()
+            self._recent_tokens = []
+        if self._stale_tokens > MAX_RECENT_TOKENS and self._stale_tokens * 4 > len(self._sorted_tokens):
+            postings = self._postings
+            self._sorted_tokens = [token for token in self._sorted_tokens if token in postings]
+            self._recent_tokens = [token for token in self._recent_tokens if token in postings]
+            self._stale_tokens = 0
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def _posting(self, token):
+        posting = self._postings.get(token)
+        if posting is None:
+            return ()
+        return posting if type(posting) is set else (posting,)
+
+    def _prefix_tokens(self, prefix):
+        """Yield indexed tokens starting with prefix."""
+        postings = self._postings
+        for tokens in (self._recent_tokens, self._sorted_tokens):
+            i = bisect_left(tokens, prefix)
+            while i < len(tokens) and tokens[i].startswith(prefix):
+                if tokens[i] in postings:
+                    yield tokens[i]
+                i += 1
+
+    def search(self, q=None, prefix=None, node_type=None, limit=20):
+        """
+        Find nodes by words in their label or id.
+
+        Args:
+            q: Words that must all appear as whole tokens
+            prefix: Typeahead text; its last word only has to start a token
+            node_type: Only return nodes of this type
+            limit: Maximum number of results
+
+        Returns:
+            dict: 'results' as (node id, label, type) dicts, best first, and
+                'truncated' when the search stopped at MAX_CANDIDATES
+                matches and ranked only those
+        """
+        words = tokenize(q)
+        prefix_words = tokenize(prefix)
+        last = prefix_words.pop() if prefix_words else None
+        words.extend(prefix_words)
+        if not words and last is None:
+            return {'results': [], 'truncated': False}
+
+        with self._lock:
+            entries = self._entries
+            truncated = False
+            if words:
+                # Seed with the rarest required token, then check the others per candidate
+                postings = sorted((self._posting(word) for word in words), key=len)
+                if not postings[0]:
+                    return {'results': [], 'truncated': False}
+                candidates = postings[0]
+                required = set(words)
+            else:
+                candidates = (node_id for token in self._prefix_tokens(last) for node_id in self._posting(token))
+                required = ()
+
+            matches = {}
+            for node_id in candidates:
+                if node_id in matches:
+                    continue
+                entry = entries[node_id]
+                if node_type is not None and entry[0] != node_type:
+                    continue
+                tokens = entry[3]
+                if required and not required.issubset(tokens):
+                    continue
+                if words and last is not None and not any(token.startswith(last) for token in tokens):
+                    continue
+                matches[node_id] = entry
+                if len(matches) >= MAX_CANDIDATES:
+                    truncated = True
+                    break
+
+            text = ' '.join(f'{q or ""} {prefix or ""}'.split()).casefold()
+
+            def rank(item):
+                label = item[1][2]
+                return (label != text, not label.startswith(text), len(label), label)
+
+            best = heapq.nsmallest(limit, matches.items(), key=rank)
+        return {
+            'results': [{'id': node_id, 'label': entry[1], 'type': entry[0]} for node_id, entry in best],
+            'truncated': truncated
+        }
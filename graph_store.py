@@ -0,0 +1,1363 @@
+"""
+Indexed In-Memory Graph Store for Knowledge Graph
+
+This module keeps the nodes and edges of the knowledge graph behind a
+small set of hash indexes so that lookups, inserts and cascading deletes
+never have to scan the full edge list.
+
+The layout is kept compact for graphs with millions of edges: nodes are
+__slots__ records, node ids, types and relation names are interned, and
+edges exist only as entries in per-node adjacency dicts. Node and edge
+dicts are built on the way out, at the JSON boundary.
+"""
+
+import gc
+import heapq
+import sys
+import threading
+from array import array
+from collections import Counter, deque, namedtuple
+from contextlib import contextmanager
+from itertools import islice
+from operator import attrgetter
+
+from graph_backends import MemoryBackend
+from graph_index import PagingIndexes
+
+NODE_FIELDS = ('id', 'label', 'type', 'x', 'y')
+
+
+class _Missing:
+    """Marker for a core field a node does not have; pickles as the module's singleton."""
+
+    __slots__ = ()
+
+    def __reduce__(self):
+        return '_MISSING'
+
+    def __repr__(self):
+        return '<missing>'
+
+
+_MISSING = _Missing()
+
+# Columnar image of the graph for binary snapshots (see
+# GraphStore.snapshot_columns()). Node fields are parallel lists, extras
+# map a node's position to its extra fields, and each adjacency index is
+# flattened to (node ids, degrees, neighbor ids, relations).
+SnapshotColumns = namedtuple('SnapshotColumns', 'ids labels types xs ys extras out_edges in_edges')
+
+
+def make_edge_id(source, target):
+    """Build the public id of the edge from source to target."""
+    return f"{source}-{target}"
+
+
+def intern(value):
+    """Return the canonical copy of a string so equal ids share one object."""
+    return sys.intern(value) if type(value) is str else value
+
+
+def field_error(name, fields):
+    """
+    Check the core fields of a node or edge before anything is written.
+
+    Types and relations are counted and indexed, so they must be strings;
+    the other core fields must be JSON scalars. Extra node fields may hold
+    any JSON value.
+
+    Returns:
+        str or None: Error message for the first bad field
+    """
+    for key in ('type', 'relation'):
+        if key in fields and not isinstance(fields[key], str):
+            return f'{name}.{key} must be a string'
+    for key in NODE_FIELDS + ('source', 'target'):
+        value = fields.get(key)
+        if value is not None and not isinstance(value, (str, int, float, bool)):
+            return f'{name}.{key} must be a string, number, boolean or null'
+    return None
+
+
+def check_node_fields(fields):
+    """
+    Raise ValueError unless fields is a dict of valid node fields.
+
+    The store checks every node it writes, so a bad field is rejected
+    before any index changes instead of corrupting the type counts.
+    """
+    if not isinstance(fields, dict):
+        raise ValueError('node must be an object')
+    error = field_error('node', fields)
+    if error is not None:
+        raise ValueError(error)
+
+
+def check_relation(relation):
+    """Raise ValueError unless relation is a string, like check_node_fields()."""
+    if not isinstance(relation, str):
+        raise ValueError('edge.relation must be a string')
+
+
+def make_edge(source, target, relation):
+    """Build the public dict of an edge."""
+    return {
+        'id': make_edge_id(source, target),
+        'source': source,
+        'target': target,
+        'relation': relation
+    }
+
+
+class Node:
+    """
+    Compact node record.
+
+    The usual fields live in slots; any other keys set through the API
+    are kept in an `extra` dict that is only allocated when needed.
+    """
+
+    __slots__ = NODE_FIELDS + ('extra', 'seq')
+
+    def __init__(self, data):
+        get = data.get
+        self.id = get('id', _MISSING)
+        self.label = get('label', _MISSING)
+        self.type = intern(get('type', _MISSING))
+        self.x = get('x', _MISSING)
+        self.y = get('y', _MISSING)
+        self.extra = None
+        self.seq = None
+        present = 5 - (self.id, self.label, self.type, self.x, self.y).count(_MISSING)
+        if len(data) > present:
+            self.extra = {key: value for key, value in data.items() if key not in NODE_FIELDS}
+
+    def update(self, data):
+        for key, value in data.items():
+            if key in NODE_FIELDS:
+                if key == 'type':
+                    value = intern(value)
+                setattr(self, key, value)
+            else:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra[key] = value
+
+    def to_dict(self):
+        data = {}
+        for field in NODE_FIELDS:
+            value = getattr(self, field)
+            if value is not _MISSING:
+                data[field] = value
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+
+class GraphStore:
+    """
+    Knowledge graph held in memory with hash indexes.
+
+    Indexes:
+        _nodes: node id -> Node record
+        _out: node id -> {target id: relation} for its outgoing edges
+        _in: node id -> {source id: relation} for its incoming edges
+
+    An edge is identified by its (source, target) pair, so the adjacency
+    dicts double as the uniqueness index. Edge ids have the form
+    "source-target" and are resolved back to the pair on lookup.
+    Adjacency dicts are created on a node's first edge. Edges between
+    non-string ids cannot be found by splitting their id, so those are
+    also kept in _odd_edge_ids.
+
+    Node type and edge relation counts are kept up to date on every
+    mutation so reports never need to rescan the graph.
+
+    The ordered indexes behind page_nodes() and page_edges() (see
+    graph_index.py) are built on the first paginated read and maintained
+    from then on, so loading and writing cost nothing extra until a client
+    paginates.
+
+    Every mutation is written through to a storage backend (see
+    graph_backends.py) inside a transaction. `version` is the backend
+    version the in-memory copy reflects; refresh() catches the copy up when
+    another process has committed a newer version, replaying just the
+    versions it missed when the backend logs them (up to `replay_limit`)
+    and reloading everything otherwise. Index changes made in
+    a transaction are undo-logged, so a rollback restores the in-memory
+    copy without reloading it, even when the backend keeps no copy.
+
+    Committed mutations are also appended to a bounded change log so
+    clients can fetch deltas with changes_since() instead of the whole
+    graph, and passed to listeners registered with add_listener().
+    """
+
+    def __init__(self, backend=None, change_log_size=10000, replay_limit=1000):
+        self._backend = backend or MemoryBackend()
+        self._replay_limit = replay_limit
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._dirty = False
+        self._undo = None
+        self._changes = deque()
+        self._change_log_size = change_log_size
+        self._changes_floor = 0
+        self._pending = []
+        self._pending_overflow = False
+        self._listeners = []
+        self._nodes = {}
+        self._out = {}
+        self._in = {}
+        self._odd_edge_ids = {}
+        self._edge_count = 0
+        self._type_counts = Counter()
+        self._relation_counts = Counter()
+        self._paging = None
+        self._next_seq = 0
+        self.version = 0
+        self._reload()
+
+    # ------------------------------------------------------------------
+    # Transactions and synchronization
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def transaction(self):
+        """
+        Group mutations into one atomic backend write.
+
+        The outermost transaction takes the backend's write lock, reloads
+        the graph if it is stale, and bumps the version on commit when
+        anything changed. Transactions nest.
+        """
+        with self._lock:
+            outer = self._depth == 0
+            if outer:
+                self._backend.begin()
+                if self._backend.current_version() != self.version:
+                    self._catch_up()
+                self._dirty = False
+                self._undo = []
+                self._pending = []
+                self._pending_overflow = False
+            self._depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._depth -= 1
+                if outer:
+                    self._backend.rollback()
+                    self._rollback_indexes()
+                raise
+            self._depth -= 1
+            if outer:
+                self._undo = None
+                if self._dirty:
+                    self.version = self._backend.bump_version()
+                self._backend.commit()
+                if self._dirty:
+                    self._publish_changes()
+                    if self._backend.wants_snapshot():
+                        self._backend.write_snapshot(self.version, self.snapshot_columns())
+
+    @property
+    def instance_id(self):
+        """Id of the backend instance that versions are counted in."""
+        return self._backend.instance_id
+
+    @property
+    def etag(self):
+        """Strong entity tag identifying the current version of the graph."""
+        return f'{self.instance_id}-{self.version}'
+
+    def refresh(self):
+        """Catch up with versions another process committed, if any."""
+        if self._backend.current_version() != self.version:
+            with self._lock:
+                if self._depth == 0 and self._backend.current_version() != self.version:
+                    self._catch_up()
+
+    def _catch_up(self):
+        """
+        Apply the versions committed since ours, in O(items they changed).
+
+        Each replayed version is published like a local commit, so change
+        listeners get deltas instead of a reset. Falls back to _reload()
+        when the backend cannot supply the ops.
+        """
+        logged = self._backend.ops_since(self.version, self._replay_limit)
+        if logged is None:
+            self._reload()
+            return
+        try:
+            for version, ops in logged:
+                self._pending = []
+                self._pending_overflow = False
+                for op in ops:
+                    self._replay_op(op)
+                self.version = version
+                self._publish_changes()
+        except Exception:
+            # The log does not fit our copy; start over from the backend
+            self._reload()
+
+    def _replay_op(self, op):
+        """Apply one logged backend op to the indexes, recording its changes."""
+        name = op[0]
+        if name == 'put_nodes':
+            for data in op[1]:
+                existed = data['id'] in self._nodes
+                record = self._insert_node(data)
+                self._record('put_node' if existed else 'add_node', node=record)
+        elif name == 'delete_node':
+            node_id = op[1]
+            if node_id in self._nodes:
+                for target in list(self._out.get(node_id, ())):
+                    self._remove_pair(node_id, target)
+                for source in list(self._in.get(node_id, ())):
+                    self._remove_pair(source, node_id)
+                self._remove_node(node_id)
+                self._record('delete_node', id=node_id)
+        elif name == 'put_edges':
+            for edge in op[1]:
+                source, target, relation = edge['source'], edge['target'], edge['relation']
+                current = self._out.get(source, {}).get(target)
+                if current is None:
+                    self._insert_pair(source, target, relation)
+                    kind = 'add_edge'
+                elif current != relation:
+                    self._set_relation(source, target, relation)
+                    kind = 'update_edge'
+                else:
+                    continue
+                self._record(kind, edge=make_edge(source, target, relation))
+        elif name == 'delete_edge':
+            pair = self._find_edge(op[1])
+            if pair is not None:
+                self._remove_pair(*pair)
+                self._record('delete_edge', id=op[1])
+        elif name == 'clear':
+            self._reset()
+            self._record('clear')
+        else:
+            raise ValueError(f'Unknown logged op {name!r}')
+
+    def _reload(self):
+        # Loading allocates millions of objects that all stay alive, so
+        # cyclic GC passes during the load are pure overhead
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            version, graph, ops = self._backend.load()
+            self._reset()
+            if isinstance(graph, SnapshotColumns):
+                self._index_columns(graph)
+            else:
+                self._bulk_index(*graph)
+            for op in ops:
+                self._replay_op(op)
+            self._pending = []
+            self._pending_overflow = False
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        self.version = version
+        # History before a reload is unknown, so deltas restart from here
+        self._changes.clear()
+        self._changes_floor = version
+        self._notify(None)
+
+    def _bulk_index(self, nodes, edges):
+        """Index a freshly loaded graph; the hot loop avoids per-item method calls."""
+        node_index = self._nodes
+        for data in nodes:
+            node = Node(data)
+            node.id = intern(node.id)
+            node_index[node.id] = node
+        self._type_counts.update(node.type for node in node_index.values())
+
+        out_index, in_index = self._out, self._in
+        relation_counts = self._relation_counts
+        # Dict lookups are cheaper than intern() calls in this hot loop
+        canonical = {node_id: node_id for node_id in node_index}
+        relations = {}
+        count = 0
+        for edge in edges:
+            source, target = edge['source'], edge['target']
+            source = canonical.get(source, source)
+            target = canonical.get(target, target)
+            relation = edge['relation']
+            relation = relations.setdefault(relation, relation)
+            targets = out_index.get(source)
+            if targets is None:
+                targets = out_index[source] = {}
+            if target not in targets:
+                count += 1
+                relation_counts[relation] += 1
+            targets[target] = relation
+            sources = in_index.get(target)
+            if sources is None:
+                sources = in_index[target] = {}
+            sources[source] = relation
+            if type(source) is not str or type(target) is not str:
+                self._odd_edge_ids[make_edge_id(source, target)] = (source, target)
+        self._edge_count = count
+
+    def _index_columns(self, columns):
+        """Index a columnar snapshot; each adjacency dict is built by one dict() call."""
+        # Ids come out of the pickle as one shared object each, so they need no interning
+        ids = columns.ids
+        extras = columns.extras
+        node_index = self._nodes
+        new = Node.__new__
+        for position, fields in enumerate(zip(ids, columns.labels, columns.types, columns.xs, columns.ys)):
+            node = new(Node)
+            node.id, node.label, node.type, node.x, node.y = fields
+            node.extra = extras.get(position)
+            node.seq = None
+            node_index[node.id] = node
+        self._type_counts.update(columns.types)
+
+        self._out = self._unflatten(*columns.out_edges)
+        self._in = self._unflatten(*columns.in_edges)
+        relations = columns.out_edges[3]
+        self._edge_count = len(relations)
+        self._relation_counts.update(relations)
+        if any(type(node_id) is not str for node_id in ids):
+            for source, targets in self._out.items():
+                for target in targets:
+                    if type(source) is not str or type(target) is not str:
+                        self._odd_edge_ids[make_edge_id(source, target)] = (source, target)
+
+    @staticmethod
+    def _flatten(index):
+        neighbors, relations = [], []
+        for adjacency in index.values():
+            neighbors.extend(adjacency)
+            relations.extend(adjacency.values())
+        return list(index), array('L', map(len, index.values())), neighbors, relations
+
+    @staticmethod
+    def _unflatten(keys, degrees, neighbors, relations):
+        pairs = zip(neighbors, relations)
+        return {key: dict(islice(pairs, degree)) for key, degree in zip(keys, degrees)}
+
+    def snapshot_columns(self):
+        """
+        Capture the graph as SnapshotColumns.
+
+        Only list, map and dict-view copies run per item, with no per-edge
+        objects, so this is cheap enough for the committing thread. Each id
+        is one shared object across the columns, so pickling them writes
+        every id once and loading shares it again.
+        """
+        with self._lock:
+            records = list(self._nodes.values())
+            columns = [list(map(attrgetter(field), records)) for field in NODE_FIELDS]
+            extras = {position: dict(node.extra) for position, node in enumerate(records) if node.extra}
+            return SnapshotColumns(*columns, extras, self._flatten(self._out), self._flatten(self._in))
+
+    def _write(self, method, *args):
+        getattr(self._backend, method)(*args)
+        self._dirty = True
+
+    def _log_undo(self, method, *args):
+        """Record how to revert an index change made in the open transaction."""
+        undo = self._undo
+        # After a reset, putting the old containers back reverts everything
+        if undo is not None and not (undo and undo[-1][0] is GraphStore._restore_indexes):
+            undo.append((method.__func__, *args))
+
+    def _rollback_indexes(self):
+        """
+        Revert the index changes of a failed transaction, newest first.
+
+        Nodes and edges deleted in the transaction come back at the end of
+        the creation order; everything else keeps its position.
+        """
+        undo, self._undo = self._undo, None
+        if not undo:
+            return
+        # Sequence numbers of restored nodes are stale; rebuild on the next page read
+        self._paging = None
+        failed = False
+        for method, *args in reversed(undo):
+            try:
+                method(self, *args)
+            except Exception:
+                failed = True
+        if failed:
+            # Only a change that broke off halfway can trip its undo entry;
+            # the records are back by now, so recount from them
+            self._recount()
+
+    def _recount(self):
+        self._type_counts = Counter(node.type for node in self._nodes.values())
+        self._relation_counts = Counter(
+            relation for targets in self._out.values() for relation in targets.values()
+        )
+        self._edge_count = sum(len(targets) for targets in self._out.values())
+
+    # ------------------------------------------------------------------
+    # Change log
+    # ------------------------------------------------------------------
+
+    def changes_since(self, since):
+        """
+        Return the committed changes made after version `since`.
+
+        Each change is a dict with 'version', 'op' and the affected
+        'node', 'edge' or 'id'.
+
+        Returns:
+            tuple: (current version, changes in commit order); changes is
+            None if the log no longer reaches back to `since` and the
+            caller needs a full snapshot
+        """
+        with self._lock:
+            if since < self._changes_floor or since > self.version:
+                return self.version, None
+            changes = []
+            for change in reversed(self._changes):
+                if change['version'] <= since:
+                    break
+                changes.append(change)
+            changes.reverse()
+            return self.version, changes
+
+    def snapshot(self):
+        """Return (version, nodes, edges) captured consistently."""
+        with self._lock:
+            return self.version, self.nodes(), self.edges()
+
+    def add_listener(self, listener):
+        """
+        Call listener(version, changes) after every commit.
+
+        changes is the list of change dicts of the commit, or None when the
+        graph was reloaded or changed too much to describe as deltas.
+        Listeners run under the store lock and must not block.
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, changes):
+        for listener in self._listeners:
+            listener(self.version, changes)
+
+    def _record(self, op, **fields):
+        if self._pending_overflow:
+            return
+        if len(self._pending) >= self._change_log_size:
+            # Too large to replay as deltas; readers fall back to a snapshot
+            self._pending_overflow = True
+            self._pending = []
+            return
+        # Node records change in place, so snapshot them as dicts now
+        if isinstance(fields.get('node'), Node):
+            fields['node'] = fields['node'].to_dict()
+        fields['op'] = op
+        self._pending.append(fields)
+
+    def _publish_changes(self):
+        if self._pending_overflow:
+            self._changes.clear()
+            self._changes_floor = self.version
+            self._notify(None)
+            return
+        for change in self._pending:
+            change['version'] = self.version
+            if len(self._changes) >= self._change_log_size:
+                evicted = self._changes.popleft()
+                self._changes_floor = max(self._changes_floor, evicted['version'])
+            self._changes.append(change)
+        self._notify(self._pending)
+        self._pending = []
+
+    # ------------------------------------------------------------------
+    # Nodes
+    # ------------------------------------------------------------------
+
+    def node_count(self):
+        return len(self._nodes)
+
+    def has_node(self, node_id):
+        return node_id in self._nodes
+
+    def get_node(self, node_id):
+        """Return the node as a dict, or None."""
+        node = self._nodes.get(node_id)
+        return None if node is None else node.to_dict()
+
+    def nodes(self):
+        """Return all nodes as a list of dicts."""
+        with self._lock:
+            return [node.to_dict() for node in self._nodes.values()]
+
+    def node_tuples(self, fields):
+        """
+        Return a tuple of the given core fields for every node.
+
+        Fields a node does not have are None. Cheaper than nodes() when an
+        index only needs a few fields; the list is taken under the store
+        lock like edge_tuples().
+        """
+        get = attrgetter(*fields) if len(fields) > 1 else lambda node: (getattr(node, fields[0]),)
+        with self._lock:
+            rows = [get(node) for node in self._nodes.values()]
+        return [
+            row if _MISSING not in row else tuple(None if value is _MISSING else value for value in row)
+            for row in rows
+        ]
+
+    def add_node(self, node):
+        """
+        Insert a node dict keyed by its 'id'.
+
+        Returns:
+            bool: False if a node with the same id already exists
+        """
+        with self.transaction():
+            if node['id'] in self._nodes:
+                return False
+            record = self._insert_node(node)
+            self._write('put_node', node)
+            self._record('add_node', node=record)
+            return True
+
+    def put_node(self, node):
+        """Insert a node dict, replacing any node with the same id but keeping its edges."""
+        with self.transaction():
+            record = self._insert_node(node)
+            self._write('put_node', node)
+            self._record('put_node', node=record)
+
+    def put_nodes(self, nodes):
+        """Insert or replace a batch of node dicts with one backend write."""
+        with self.transaction():
+            for node in nodes:
+                record = self._insert_node(node)
+                self._record('put_node', node=record)
+            self._write('put_nodes', nodes)
+
+    def merge_nodes(self, nodes):
+        """
+        Upsert a batch of node dicts with one backend write.
+
+        A new id is inserted as given. For an existing id the given fields
+        override the stored ones and the rest are kept; if nothing changes
+        the item is skipped. Costs O(batch) whatever the size of the graph.
+
+        Returns:
+            tuple: (inserted, updated, skipped) counts
+        """
+        inserted = updated = skipped = 0
+        written = []
+        with self.transaction():
+            for node in nodes:
+                existing = self._nodes.get(node['id'])
+                if existing is None:
+                    op = 'add_node'
+                    inserted += 1
+                else:
+                    current = existing.to_dict()
+                    node = dict(current, **node)
+                    if node == current:
+                        skipped += 1
+                        continue
+                    op = 'put_node'
+                    updated += 1
+                record = self._insert_node(node)
+                self._record(op, node=record)
+                written.append(node)
+            if written:
+                self._write('put_nodes', written)
+        return inserted, updated, skipped
+
+    def update_node(self, node_id, data):
+        """
+        Merge data into an existing node. Returns the updated node dict or None.
+
+        The id names the node, so an 'id' key in data is ignored.
+
+        Raises:
+            ValueError: If data is not a dict of valid node fields
+        """
+        check_node_fields(data)
+        if 'id' in data:
+            data = {key: value for key, value in data.items() if key != 'id'}
+        with self.transaction():
+            node = self._nodes.get(node_id)
+            if node is None:
+                return None
+            self._log_undo(self._restore_node, node_id, Node(node.to_dict()))
+            self._count_type(node, -1)
+            node.update(data)
+            self._count_type(node, 1)
+            updated = node.to_dict()
+            self._write('put_node', updated)
+            self._record('update_node', node=updated)
+            return updated
+
+    def delete_node(self, node_id):
+        """
+        Delete a node and every edge attached to it.
+
+        Runs in O(degree) using the adjacency indexes.
+
+        Returns:
+            bool: False if the node does not exist
+        """
+        with self.transaction():
+            if node_id not in self._nodes:
+                return False
+            for target in list(self._out.get(node_id, ())):
+                self._delete_pair(node_id, target)
+            for source in list(self._in.get(node_id, ())):
+                self._delete_pair(source, node_id)
+            self._remove_node(node_id)
+            self._write('delete_node', node_id)
+            self._record('delete_node', id=node_id)
+            return True
+
+    def _insert_node(self, data):
+        check_node_fields(data)
+        node = Node(data)
+        node.id = intern(node.id)
+        old = self._nodes.get(node.id)
+        # Logged before the indexes change, so a failure below is undone too
+        self._log_undo(self._restore_node, node.id, old)
+        if old is not None:
+            node.seq = old.seq
+            self._count_type(old, -1)
+        elif self._paging is not None:
+            self._next_seq += 1
+            node.seq = self._next_seq
+            self._paging.nodes.add(node.seq, node.id)
+        self._nodes[node.id] = node
+        self._count_type(node, 1)
+        return node
+
+    def _remove_node(self, node_id):
+        node = self._nodes[node_id]
+        self._log_undo(self._restore_node, node_id, node)
+        del self._nodes[node_id]
+        self._count_type(node, -1)
+        if self._paging is not None:
+            self._paging.nodes.remove(node.seq)
+
+    def _restore_node(self, node_id, node):
+        """Put back a node record, or remove the node when record is None."""
+        current = self._nodes.get(node_id)
+        if current is not None:
+            self._count_type(current, -1)
+        if node is None:
+            self._nodes.pop(node_id, None)
+        else:
+            self._nodes[node_id] = node
+            self._count_type(node, 1)
+
+    # ------------------------------------------------------------------
+    # Edges
+    # ------------------------------------------------------------------
+
+    def edge_count(self):
+        return self._edge_count
+
+    def has_edge(self, source, target):
+        return target in self._out.get(source, ())
+
+    def get_edge(self, edge_id):
+        """Return the edge dict for edge_id, or None."""
+        with self._lock:
+            pair = self._find_edge(edge_id)
+            if pair is None:
+                return None
+            source, target = pair
+            return make_edge(source, target, self._out[source][target])
+
+    def edges(self):
+        """Return all edges as a list of dicts, grouped by source node."""
+        with self._lock:
+            return [
+                make_edge(source, target, relation)
+                for source, targets in self._out.items()
+                for target, relation in targets.items()
+            ]
+
+    def edge_tuples(self):
+        """
+        Return all edges as (source, target, relation) tuples.
+
+        The list is taken under the store lock, so callers can iterate it
+        lazily, e.g. while streaming a response, as other threads write.
+        """
+        with self._lock:
+            return [
+                (source, target, relation)
+                for source, targets in self._out.items()
+                for target, relation in targets.items()
+            ]
+
+    def add_edge(self, source, target, relation='related_to'):
+        """
+        Insert an edge between two existing nodes.
+
+        The caller is responsible for checking that both endpoints exist.
+
+        Returns:
+            dict: The new edge, or None if it would duplicate an existing one
+        """
+        with self.transaction():
+            if self._find_edge(make_edge_id(source, target)) is not None:
+                return None
+            self._insert_pair(source, target, relation)
+            edge = make_edge(source, target, relation)
+            self._write('put_edge', edge)
+            self._record('add_edge', edge=edge)
+            return edge
+
+    def add_edges(self, edges):
+        """
+        Insert a batch of edges with one backend write.
+
+        Each item is a dict with 'source', 'target' and 'relation'; both
+        endpoints must exist. Duplicates of existing edges or of earlier
+        items in the batch are skipped.
+
+        Returns:
+            list: The edges that were added
+        """
+        added = []
+        with self.transaction():
+            for item in edges:
+                source, target = item['source'], item['target']
+                if self._find_edge(make_edge_id(source, target)) is not None:
+                    continue
+                self._insert_pair(source, target, item['relation'])
+                edge = make_edge(source, target, item['relation'])
+                self._record('add_edge', edge=edge)
+                added.append(edge)
+            if added:
+                self._write('put_edges', added)
+        return added
+
+    def merge_edges(self, edges):
+        """
+        Upsert a batch of edges with one backend write.
+
+        Items are dicts with 'source', 'target' and 'relation' whose
+        endpoints exist. A new pair is inserted; since the store keeps one
+        edge per pair, an existing pair with a different relation has its
+        relation updated and one with the same relation is skipped.
+
+        Returns:
+            tuple: (inserted, updated, skipped) counts
+        """
+        inserted = updated = skipped = 0
+        written = []
+        with self.transaction():
+            for item in edges:
+                source, target, relation = item['source'], item['target'], item['relation']
+                pair = self._find_edge(make_edge_id(source, target))
+                if pair is None:
+                    self._insert_pair(source, target, relation)
+                    op = 'add_edge'
+                    inserted += 1
+                elif pair != (source, target) or self._out[source][target] == relation:
+                    # Same edge, or an id clash with a different hyphenated pair
+                    skipped += 1
+                    continue
+                else:
+                    self._set_relation(source, target, relation)
+                    op = 'update_edge'
+                    updated += 1
+                edge = make_edge(source, target, relation)
+                self._record(op, edge=edge)
+                written.append(edge)
+            if written:
+                self._write('put_edges', written)
+        return inserted, updated, skipped
+
+    def delete_edge(self, edge_id):
+        """
+        Delete an edge by id.
+
+        Returns:
+            bool: False if the edge does not exist
+        """
+        with self.transaction():
+            pair = self._find_edge(edge_id)
+            if pair is None:
+                return False
+            self._delete_pair(*pair)
+            return True
+
+    def _find_edge(self, edge_id):
+        """
+        Resolve an edge id to its (source, target) pair.
+
+        Tries each '-' in the id as the separator, so a lookup costs one
+        dict probe per hyphen, and returns the first split that matches.
+        There is no separate ambiguity check: add_edge(), add_edges() and
+        merge_edges() treat a new edge whose id is already taken by another
+        pair as a duplicate (a 409 from the API), which keeps ids unique
+        for edges written through them. Edges loaded from a backend are not
+        re-checked; if their ids clash, the pair with the shortest source wins.
+        """
+        if self._odd_edge_ids:
+            pair = self._odd_edge_ids.get(edge_id)
+            if pair is not None:
+                return pair
+        if not isinstance(edge_id, str):
+            return None
+        index = edge_id.find('-')
+        while index >= 0:
+            source, target = edge_id[:index], edge_id[index + 1:]
+            if target in self._out.get(source, ()):
+                return source, target
+            index = edge_id.find('-', index + 1)
+        return None
+
+    def _insert_pair(self, source, target, relation):
+        check_relation(relation)
+        source, target, relation = intern(source), intern(target), intern(relation)
+        targets = self._out.get(source)
+        if targets is None:
+            targets = self._out[source] = {}
+        targets[target] = relation
+        sources = self._in.get(target)
+        if sources is None:
+            sources = self._in[target] = {}
+        sources[source] = relation
+        self._edge_count += 1
+        self._relation_counts[relation] += 1
+        if self._paging is not None:
+            self._paging.add_relation(relation, self._nodes[source].seq, source)
+        if type(source) is not str or type(target) is not str:
+            self._odd_edge_ids[make_edge_id(source, target)] = (source, target)
+        self._log_undo(self._remove_pair, source, target)
+
+    def _set_relation(self, source, target, relation):
+        check_relation(relation)
+        relation = intern(relation)
+        old = self._out[source][target]
+        self._out[source][target] = relation
+        self._in[target][source] = relation
+        self._relation_counts[old] -= 1
+        if not self._relation_counts[old]:
+            del self._relation_counts[old]
+        self._relation_counts[relation] += 1
+        if self._paging is not None:
+            seq = self._nodes[source].seq
+            self._paging.remove_relation(old, seq, source)
+            self._paging.add_relation(relation, seq, source)
+        self._log_undo(self._set_relation, source, target, old)
+
+    def _delete_pair(self, source, target):
+        self._remove_pair(source, target)
+        edge_id = make_edge_id(source, target)
+        self._write('delete_edge', edge_id)
+        self._record('delete_edge', id=edge_id)
+
+    def _remove_pair(self, source, target):
+        targets = self._out[source]
+        relation = targets.pop(target)
+        if not targets:
+            del self._out[source]
+        sources = self._in[target]
+        del sources[source]
+        if not sources:
+            del self._in[target]
+        self._edge_count -= 1
+        self._relation_counts[relation] -= 1
+        if not self._relation_counts[relation]:
+            del self._relation_counts[relation]
+        if self._paging is not None:
+            self._paging.remove_relation(relation, self._nodes[source].seq, source)
+        self._odd_edge_ids.pop(make_edge_id(source, target), None)
+        self._log_undo(self._insert_pair, source, target, relation)
+
+    def out_edges(self, node_id):
+        """Return the outgoing edges of a node."""
+        with self._lock:
+            return [make_edge(node_id, target, relation) for target, relation in self._out.get(node_id, {}).items()]
+
+    def in_edges(self, node_id):
+        """Return the incoming edges of a node."""
+        with self._lock:
+            return [make_edge(source, node_id, relation) for source, relation in self._in.get(node_id, {}).items()]
+
+    def out_degree(self, node_id):
+        return len(self._out.get(node_id, ()))
+
+    def in_degree(self, node_id):
+        return len(self._in.get(node_id, ()))
+
+    # ------------------------------------------------------------------
+    # Traversal
+    # ------------------------------------------------------------------
+
+    def _adjacency_indexes(self, direction):
+        if direction == 'out':
+            return (self._out,)
+        if direction == 'in':
+            return (self._in,)
+        if direction == 'both':
+            return (self._out, self._in)
+        raise ValueError(f"direction must be 'in', 'out' or 'both', not {direction!r}")
+
+    def _oriented_edge(self, a, b):
+        """Return the edge joining a and b, whichever way it points."""
+        relation = self._out.get(a, {}).get(b)
+        if relation is not None:
+            return make_edge(a, b, relation)
+        return make_edge(b, a, self._out[b][a])
+
+    def neighborhood(self, node_id, depth=1, direction='both', limit=None):
+        """
+        Breadth-first expansion from a node over the adjacency indexes.
+
+        Costs O(nodes visited + their degree), independent of graph size.
+
+        Args:
+            node_id: Start node
+            depth: Maximum number of hops
+            direction: 'out' follows edges forward, 'in' backward, 'both' either way
+            limit: Maximum number of nodes returned, start node included
+
+        Returns:
+            dict: 'nodes' (dicts with their hop 'depth'), 'edges' (the edges
+                examined between returned nodes) and 'truncated' (whether
+                limit cut the expansion short), or None if the node does not exist
+        """
+        indexes = self._adjacency_indexes(direction)
+        with self._lock:
+            if node_id not in self._nodes:
+                return None
+            hops = {node_id: 0}
+            edges = {}
+            frontier = [node_id]
+            truncated = False
+            for hop in range(1, depth + 1):
+                next_frontier = []
+                for current in frontier:
+                    for index in indexes:
+                        outgoing = index is self._out
+                        for neighbor, relation in index.get(current, {}).items():
+                            if neighbor not in hops:
+                                if limit is not None and len(hops) >= limit:
+                                    truncated = True
+                                    continue
+                                hops[neighbor] = hop
+                                next_frontier.append(neighbor)
+                            pair = (current, neighbor) if outgoing else (neighbor, current)
+                            if pair not in edges:
+                                edges[pair] = make_edge(pair[0], pair[1], relation)
+                frontier = next_frontier
+                if not frontier:
+                    break
+            nodes = []
+            for visited, hop in hops.items():
+                node = self._nodes[visited].to_dict()
+                node['depth'] = hop
+                nodes.append(node)
+            return {'nodes': nodes, 'edges': list(edges.values()), 'truncated': truncated}
+
+    def shortest_path(self, source, target, direction='out', max_depth=None):
+        """
+        Find a shortest path with bidirectional breadth-first search.
+
+        Searches forward from source and backward from target, always
+        growing the smaller frontier, so a path of length d costs roughly
+        the square root of a one-sided search.
+
+        Args:
+            source: Start node
+            target: End node
+            direction: 'out' follows edges forward, 'in' backward, 'both' either way
+            max_depth: Give up on paths longer than this many hops
+
+        Returns:
+            dict: 'path' (node ids from source to target, or None when there
+                is none), 'edges' along it and 'explored' (nodes visited), or
+                None if either node does not exist
+        """
+        forward_indexes = self._adjacency_indexes(direction)
+        backward_indexes = self._adjacency_indexes({'out': 'in', 'in': 'out'}.get(direction, direction))
+        with self._lock:
+            if source not in self._nodes or target not in self._nodes:
+                return None
+            if source == target:
+                return {'path': [source], 'edges': [], 'explored': 1}
+
+            # Each side maps visited node -> (parent, hops from its root)
+            forward = {source: (None, 0)}
+            backward = {target: (None, 0)}
+            forward_frontier, backward_frontier = [source], [target]
+            meeting = None
+            hops = 0
+            while forward_frontier and backward_frontier and (max_depth is None or hops < max_depth):
+                if len(forward_frontier) <= len(backward_frontier):
+                    visited, other, indexes, frontier = forward, backward, forward_indexes, forward_frontier
+                else:
+                    visited, other, indexes, frontier = backward, forward, backward_indexes, backward_frontier
+                next_frontier = []
+                best = None
+                for current in frontier:
+                    depth = visited[current][1] + 1
+                    for index in indexes:
+                        for neighbor in index.get(current, ()):
+                            if neighbor in visited:
+                                continue
+                            visited[neighbor] = (current, depth)
+                            next_frontier.append(neighbor)
+                            if neighbor in other and (best is None or other[neighbor][1] < best[0]):
+                                best = (other[neighbor][1], neighbor)
+                hops += 1
+                if best is not None:
+                    meeting = best[1]
+                    break
+                if visited is forward:
+                    forward_frontier = next_frontier
+                else:
+                    backward_frontier = next_frontier
+
+            explored = len(forward) + len(backward)
+            if meeting is None:
+                return {'path': None, 'edges': [], 'explored': explored}
+            path = []
+            node = meeting
+            while node is not None:
+                path.append(node)
+                node = forward[node][0]
+            path.reverse()
+            node = backward[meeting][0]
+            while node is not None:
+                path.append(node)
+                node = backward[node][0]
+            edges = [self._oriented_edge(a, b) for a, b in zip(path, path[1:])]
+            return {'path': path, 'edges': edges, 'explored': explored}
+
+    # ------------------------------------------------------------------
+    # Pagination
+    # ------------------------------------------------------------------
+
+    def page_nodes(self, after=None, limit=100, node_type=None):
+        """
+        Return one page of nodes in creation order.
+
+        Costs O(log N + limit): the page starts with a bisect in the node
+        order index, or in the index of node_type when filtering.
+
+        Args:
+            after: Cursor returned with the previous page
+            limit: Maximum number of nodes
+            node_type: Only return nodes of this type
+
+        Returns:
+            tuple: (node dicts, cursor for the next page or None)
+        """
+        with self._lock:
+            paging = self._paging_indexes()
+            if node_type is None:
+                index = paging.nodes
+            else:
+                index = paging.types.get(node_type)
+                if index is None:
+                    return [], None
+            start = None if after is None else self._cursor_seq(after[0], after[1])
+            page = []
+            for seq, node_id in index.after(start):
+                if len(page) == limit:
+                    return page, last
+                page.append(self._nodes[node_id].to_dict())
+                last = (seq, node_id)
+            return page, None
+
+    def page_edges(self, after=None, limit=100, source=None, target=None, relation=None):
+        """
+        Return one page of edges, filtered by endpoint and relation.
+
+        Edges are ordered by the creation order of their source node (or
+        of the target node when filtering by target), then by adjacency
+        order. A source or target filter reads only that node's adjacency
+        dict; a relation filter only visits nodes that have outgoing edges
+        of that relation. A cursor resumes inside a node's adjacency by
+        offset, so an edge deleted between pages may shift the next page
+        by one.
+
+        Args:
+            after: Cursor returned with the previous page
+            limit: Maximum number of edges
+
+        Returns:
+            tuple: (edge dicts, cursor for the next page or None)
+        """
+        with self._lock:
+            paging = self._paging_indexes()
+            outgoing = target is None
+            if not outgoing:
+                node = self._nodes.get(target)
+                anchors = [] if node is None else [(node.seq, target)]
+                other = source
+            elif source is not None:
+                node = self._nodes.get(source)
+                anchors = [] if node is None else [(node.seq, source)]
+                other = None
+            else:
+                index = paging.nodes if relation is None else paging.relations.get(relation)
+                if index is None:
+                    return [], None
+                # The cursor's node may still have edges left, so start at it
+                start = None if after is None else self._cursor_seq(after[0], after[1]) - 1
+                anchors = index.after(start)
+                other = None
+            return self._page_adjacency(anchors, outgoing, after, limit, other, relation)
+
+    def _page_adjacency(self, anchors, outgoing, after, limit, other, relation):
+        adjacency_index = self._out if outgoing else self._in
+        resume_node, resume_offset = (None, 0) if after is None else (after[1], after[2])
+        page = []
+        for seq, node_id in anchors:
+            adjacency = adjacency_index.get(node_id)
+            if not adjacency:
+                continue
+            offset = resume_offset if node_id == resume_node else 0
+            for position, (neighbor, edge_relation) in enumerate(islice(adjacency.items(), offset, None), offset):
+                if (other is not None and neighbor != other) or (relation is not None and edge_relation != relation):
+                    continue
+                if len(page) == limit:
+                    return page, (seq, node_id, position)
+                if outgoing:
+                    page.append(make_edge(node_id, neighbor, edge_relation))
+                else:
+                    page.append(make_edge(neighbor, node_id, edge_relation))
+        return page, None
+
+    def _cursor_seq(self, seq, node_id):
+        """
+        Resolve a cursor to a local sequence number.
+
+        The node id wins over the number, which may have been issued by a
+        process that numbered its nodes differently.
+        """
+        node = self._nodes.get(node_id)
+        return seq if node is None else node.seq
+
+    def build_paging_indexes(self):
+        """Build the paging indexes now instead of on the first paginated read."""
+        with self._lock:
+            self._paging_indexes()
+
+    def _paging_indexes(self):
+        if self._paging is None:
+            self._paging, self._next_seq = PagingIndexes.build(self._nodes, self._out, self._next_seq)
+        return self._paging
+
+    # ------------------------------------------------------------------
+    # Statistics
+    # ------------------------------------------------------------------
+
+    def type_counts(self):
+        """Return a dict of node type -> node count."""
+        with self._lock:
+            return dict(self._type_counts)
+
+    def relation_counts(self):
+        """Return a dict of edge relation -> edge count."""
+        with self._lock:
+            return dict(self._relation_counts)
+
+    def degrees(self):
+        """Return (node_id, in_degree, out_degree) for every node in O(N), taken under the store lock."""
+        with self._lock:
+            out_index, in_index = self._out, self._in
+            return [
+                (node_id, len(in_index.get(node_id, ())), len(out_index.get(node_id, ())))
+                for node_id in self._nodes
+            ]
+
+    def top_degree_nodes(self, k):
+        """Return the k node ids with the highest total degree as (node_id, degree) pairs."""
+        totals = ((node_id, i + o) for node_id, i, o in self.degrees())
+        return heapq.nlargest(k, totals, key=lambda item: item[1])
+
+    def degree_histogram(self):
+        """Return a dict of total degree -> number of nodes with that degree."""
+        return dict(sorted(Counter(i + o for _, i, o in self.degrees()).items()))
+
+    def weak_components(self):
+        """
+        Find the weakly connected components with union-find over the edges.
+
+        Returns:
+            list: Component sizes, largest first
+        """
+        def find(node_id):
+            root = node_id
+            while parent[root] != root:
+                root = parent[root]
+            while parent[node_id] != root:
+                parent[node_id], node_id = root, parent[node_id]
+            return root
+
+        # Holds the store lock for O(N+E); cheaper than copying the edges
+        with self._lock:
+            parent = {node_id: node_id for node_id in self._nodes}
+            for source, targets in self._out.items():
+                for target in targets:
+                    a, b = find(source), find(target)
+                    if a != b:
+                        parent[a] = b
+
+        return sorted(Counter(find(node_id) for node_id in parent).values(), reverse=True)
+
+    # ------------------------------------------------------------------
+    # Whole graph
+    # ------------------------------------------------------------------
+
+    def close(self):
+        """Release the backend's per-process resources, e.g. before forking."""
+        with self._lock:
+            self._backend.close()
+
+    def is_empty(self):
+        return not self._nodes and not self._edge_count
+
+    def clear(self):
+        """Remove all nodes and edges."""
+        with self.transaction():
+            self._reset()
+            self._write('clear')
+            self._record('clear')
+
+    def _reset(self):
+        # Fresh containers, so a rollback can put the old ones back in O(1)
+        self._log_undo(self._restore_indexes, self._indexes())
+        self._nodes = {}
+        self._out = {}
+        self._in = {}
+        self._odd_edge_ids = {}
+        self._edge_count = 0
+        self._type_counts = Counter()
+        self._relation_counts = Counter()
+        self._paging = None
+
+    def _indexes(self):
+        return (self._nodes, self._out, self._in, self._odd_edge_ids,
+                self._edge_count, self._type_counts, self._relation_counts)
+
+    def _restore_indexes(self, indexes):
+        (self._nodes, self._out, self._in, self._odd_edge_ids,
+         self._edge_count, self._type_counts, self._relation_counts) = indexes
+
+    def _count_type(self, node, delta):
+        node_type = node.type
+        self._type_counts[node_type] += delta
+        if not self._type_counts[node_type]:
+            del self._type_counts[node_type]
+        if self._paging is not None:
+            if delta > 0:
+                self._paging.type_index(node_type).add(node.seq, node.id)
+            else:
+                self._paging.types[node_type].remove(node.seq)
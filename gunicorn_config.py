@@ -3,15 +3,36 @@ Gunicorn configuration for production deployment
 """
 import os
 import multiprocessing
+import sys
 
 # Server socket
 bind = os.getenv('GUNICORN_BIND', '127.0.0.1:8000')
 backlog = 2048
 
 # Worker processes
-workers = os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1)
-worker_class = 'sync'
-worker_connections = 1000
+# The memory and log graph backends are private to one process, so only
+# scale out when the graph lives in a shared backend (GRAPH_BACKEND=sqlite).
+# GUNICORN_WORKERS and --workers are overridden for the others (see on_starting)
+graph_backend = os.getenv('GRAPH_BACKEND', 'memory')
+single_worker = graph_backend in ('memory', 'log')
+if single_worker:
+    workers = 1
+else:
+    workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+# /api/graph/stream keeps a connection open per browser tab. The 'gevent'
+# worker serves each one from a greenlet, so an idle stream costs a few KB
+# instead of a thread; up to worker_connections clients share a worker.
+# A CPU-heavy request holds up the other greenlets in its worker until it
+# finishes, so set GUNICORN_WORKER_CLASS=gthread to fall back to a thread
+# pool (one thread per open stream) if that matters more than stream count.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gevent')
+threads = int(os.getenv('GUNICORN_THREADS', '32'))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '2000'))
+if worker_class == 'gevent':
+    # Patch before the app is preloaded, so the locks it creates in the
+    # master yield to other greenlets instead of blocking the worker
+    from gevent import monkey
+    monkey.patch_all()
 timeout = 30
 keepalive = 2
 
@@ -39,11 +60,52 @@ ca_certs = None
 suppress_ragged_eof = True
 
 # Application
+# The app is built once in the master by create_app() and the workers are
+# forked from it, sharing the loaded graph and indexes copy-on-write. Only
+# a shared backend can be preloaded: a worker respawned from a master that
+# holds a memory or log graph would restart from the master's stale copy
+# (and, for the log backend, its log file and fsync thread), so those
+# backends always build the app in the worker.
+wsgi_app = 'app:create_app()'
 raw_env = []
-preload_app = False
+preload_app = not single_worker and os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
 forwarded_allow_ips = os.getenv('GUNICORN_FORWARDED_ALLOW_IPS', '127.0.0.1')
 secure_scheme_headers = {
     'X-FORWARDED-PROTOCOL': 'ssl',
     'X-FORWARDED-PROTO': 'https',
     'X-FORWARDED-SSL': 'on',
 }
+
+
+def on_starting(server):
+    """
+    Keep one worker for unshared graph backends, even if --workers asks
+    for more, and refuse to start several workers with per-process sessions
+    or OpenAI jobs.
+    """
+    if single_worker and server.num_workers > 1:
+        server.log.warning(
+            'GRAPH_BACKEND=%s keeps the graph in one process; running 1 worker instead of %d. '
+            'Use GRAPH_BACKEND=sqlite to run several.', graph_backend, server.num_workers
+        )
+        server.num_workers = 1
+    if os.getenv('SESSION_BACKEND', 'sqlite') == 'memory' and server.num_workers > 1:
+        server.log.error(
+            'SESSION_BACKEND=memory keeps each login in the worker that served it; '
+            'use SESSION_BACKEND=sqlite or cookie with %d workers.', server.num_workers
+        )
+        sys.exit(1)
+    if os.getenv('JOB_BACKEND', 'sqlite') == 'memory' and server.num_workers > 1:
+        server.log.error(
+            'JOB_BACKEND=memory keeps each OpenAI job in the worker that accepted it; '
+            'use JOB_BACKEND=sqlite with %d workers.', server.num_workers
+        )
+        sys.exit(1)
+
+
+def pre_fork(server, worker):
+    """Close SQLite connections and freeze the GC heap before each fork."""
+    if server.cfg.preload_app:
+        # Already imported by the preload, so this only looks the module up
+        import app
+        app.prepare_fork()
@@ -0,0 +1,162 @@
+"""
+LLM Response Cache
+
+An LRU cache with a time-to-live for chat completion results. It also
+coalesces concurrent misses: while one thread calls the model for a key,
+other threads asking for the same key wait for that result instead of
+sending their own identical request.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_TTL_SECONDS = 3600
+
+
+def normalize_question(question):
+    """Fold case and whitespace so trivially different questions share an entry."""
+    return ' '.join(question.split()).casefold()
+
+
+def make_cache_key(question, **params):
+    """Build a cache key from the normalized question and the model parameters."""
+    return (normalize_question(question),) + tuple(sorted(params.items()))
+
+
+class _Flight:
+    """An upstream call in progress that other threads can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU + TTL cache with single-flight misses.
+
+    Cached results are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL_SECONDS, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.evictions = 0
+        self.tokens_saved = 0
+
+    def lookup(self, key, tokens=None):
+        """Return the cached result for key, counting a hit, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self._clock():
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self._save_tokens(tokens, entry[1])
+            return entry[1]
+
+    def put(self, key, result):
+        """Store a result computed outside get_or_compute()."""
+        with self._lock:
+            self._store(key, result)
+
+    def get_or_compute(self, key, compute, tokens=None):
+        """
+        Return the cached result for key, computing it at most once.
+
+        Args:
+            key: Hashable cache key, e.g. from make_cache_key()
+            compute: Callable returning the result on a miss
+            tokens: Optional callable giving the tokens a result cost, counted
+                as saved whenever the result is reused
+
+        Returns:
+            tuple: (result, status) where status is 'hit', 'miss' or 'coalesced'
+
+        Raises:
+            Exception: Whatever compute raised; failures are not cached
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, result = entry
+                if expires > self._clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    self._save_tokens(tokens, result)
+                    return result, 'hit'
+                del self._entries[key]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            with self._lock:
+                self._save_tokens(tokens, flight.result)
+            return flight.result, 'coalesced'
+
+        try:
+            flight.result = compute()
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                self.errors += 1
+            raise
+        else:
+            with self._lock:
+                self._store(key, flight.result)
+            return flight.result, 'miss'
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _store(self, key, result):
+        self._entries[key] = (self._clock() + self.ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _save_tokens(self, tokens, result):
+        if tokens is not None:
+            self.tokens_saved += tokens(result)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self):
+        """Return counters for monitoring."""
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'errors': self.errors,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits + self.coalesced) / lookups if lookups else 0.0,
+                'tokens_saved': self.tokens_saved
+            }
@@ -0,0 +1,298 @@
+"""
+LLM Job Pool
+
+Runs slow model calls on a small, bounded thread pool so they never tie
+up the web server's request threads. Callers either wait for a result
+until a deadline or submit a job and poll it by id. When the pool and its
+queue are both full, new work is rejected at once instead of piling up.
+
+The status and result of a polled job are kept in a job backend rather
+than in the pool, so a poll can be answered by any gunicorn worker, not
+only by the one running the job. Records expire `job_ttl` seconds after
+their last update; a job whose worker died keeps its last status until
+then.
+
+Available backends:
+    memory: jobs live in the process (single worker only)
+    sqlite: a SQLite database in WAL mode shared by all workers on a host
+"""
+
+import concurrent.futures
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_QUEUE = 16
+DEFAULT_DEADLINE_SECONDS = 25
+DEFAULT_JOB_TTL_SECONDS = 600
+DEFAULT_SWEEP_INTERVAL = 60
+
+
+class QueueFull(Exception):
+    """Raised when the pool has no free worker or queue slot."""
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a call did not finish before its deadline."""
+
+
+class Job:
+    """A submitted call whose status and result can be polled."""
+
+    def __init__(self, job_id, future, deadline):
+        self.id = job_id
+        self.future = future
+        self.deadline = deadline
+
+    @property
+    def status(self):
+        if not self.future.done():
+            return 'running' if self.future.running() else 'queued'
+        return 'failed' if self.future.exception() is not None else 'done'
+
+    def to_dict(self):
+        job = {'job_id': self.id, 'status': self.status}
+        if job['status'] == 'done':
+            job['result'] = self.future.result()
+        elif job['status'] == 'failed':
+            job['error'] = str(self.future.exception())
+        return job
+
+
+class MemoryJobBackend:
+    """Backend keeping job records in a dict of the current process."""
+
+    def __init__(self):
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def get(self, job_id):
+        return self._rows.get(job_id)
+
+    def put(self, job_id, data, expires):
+        self._rows[job_id] = (data, expires)
+
+    def sweep(self, now):
+        with self._lock:
+            expired = [job_id for job_id, (_, expires) in self._rows.items() if expires <= now]
+            for job_id in expired:
+                del self._rows[job_id]
+        return len(expired)
+
+    def count(self):
+        return len(self._rows)
+
+    def close(self):
+        pass
+
+
+class SQLiteJobBackend:
+    """
+    Backend storing job records in a SQLite database in WAL mode.
+
+    Each row holds the job as JSON and its expiry time; an index on the
+    expiry keeps sweeps from scanning live jobs.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            expires REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS jobs_expires ON jobs (expires);
+    """
+
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @property
+    def conn(self):
+        """Connection for the current thread, reopened after a fork."""
+        local = self._local
+        if getattr(local, 'conn', None) is None or local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(self.SCHEMA)
+            local.conn = conn
+            local.pid = os.getpid()
+        return local.conn
+
+    def close(self):
+        """Close the current thread's connection, e.g. before forking."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local.conn = None
+
+    def get(self, job_id):
+        return self.conn.execute('SELECT data, expires FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+
+    def put(self, job_id, data, expires):
+        self.conn.execute(
+            'INSERT OR REPLACE INTO jobs (job_id, data, expires) VALUES (?, ?, ?)',
+            (job_id, data, expires)
+        )
+
+    def sweep(self, now):
+        return self.conn.execute('DELETE FROM jobs WHERE expires <= ?', (now,)).rowcount
+
+    def count(self):
+        return self.conn.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+
+
+def create_job_backend(name, path=None):
+    """Build a job backend by name."""
+    if name == 'memory':
+        return MemoryJobBackend()
+    if name == 'sqlite':
+        return SQLiteJobBackend(path or 'jobs.db')
+    raise ValueError(f"Unknown job backend {name!r}: use 'memory' or 'sqlite'")
+
+
+class LLMExecutor:
+    """
+    Bounded thread pool for model calls.
+
+    At most max_workers calls run at once and at most max_queue more wait
+    for a worker. A job still queued when its deadline passes is dropped
+    without calling the model. Tracked jobs are recorded in `backend`
+    (in-process by default) as queued, running, then done or failed.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, max_queue=DEFAULT_MAX_QUEUE,
+                 deadline=DEFAULT_DEADLINE_SECONDS, job_ttl=DEFAULT_JOB_TTL_SECONDS,
+                 backend=None, sweep_interval=DEFAULT_SWEEP_INTERVAL):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self.job_ttl = job_ttl
+        self.backend = MemoryJobBackend() if backend is None else backend
+        self.sweep_interval = sweep_interval
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers, thread_name_prefix='llm')
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._next_sweep = time.time() + sweep_interval
+        self._in_flight = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def submit(self, fn, deadline=None, track=True):
+        """
+        Schedule fn on the pool.
+
+        Args:
+            fn: Callable making the model call
+            deadline: Seconds the call may take, queueing included
+            track: Record the job so it can be polled with get_job()
+
+        Returns:
+            Job
+
+        Raises:
+            QueueFull: If every worker and queue slot is taken
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise QueueFull('Too many model calls in progress, try again shortly')
+        timeout = self.deadline if deadline is None else deadline
+        expires = time.monotonic() + timeout
+        job_id = uuid.uuid4().hex
+
+        def run():
+            if time.monotonic() > expires:
+                raise DeadlineExceeded('Deadline passed while the call was queued')
+            if track:
+                self._record(job_id, {'status': 'running'}, self.job_ttl)
+            return fn()
+
+        if track:
+            # Recorded before the job can start, so it never overwrites a later status
+            try:
+                self._record(job_id, {'status': 'queued'}, timeout + self.job_ttl)
+            except Exception:
+                self._slots.release()
+                raise
+        with self._lock:
+            self._in_flight += 1
+            self.submitted += 1
+        future = self._executor.submit(run)
+        # Done callbacks also fire for cancelled jobs, which never run
+        future.add_done_callback(self._release)
+        if track:
+            future.add_done_callback(lambda future: self._record_result(job_id, future))
+        return Job(job_id, future, expires)
+
+    def run(self, fn, deadline=None):
+        """
+        Run fn on the pool and wait for its result.
+
+        Raises:
+            QueueFull: If the pool is saturated
+            DeadlineExceeded: If no result arrived in time; the call keeps its
+                slot until it returns, bounded by the client's own timeout
+        """
+        return self.wait(self.submit(fn, deadline, track=False))
+
+    def wait(self, job):
+        """Wait for a job's result until its deadline, re-raising its error."""
+        try:
+            return job.future.result(timeout=max(0, job.deadline - time.monotonic()))
+        except concurrent.futures.TimeoutError:
+            with self._lock:
+                self.timed_out += 1
+            raise DeadlineExceeded('Model call did not finish before its deadline')
+
+    def _release(self, future):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def _record(self, job_id, job, ttl):
+        """Write a job's record, sweeping expired records now and then."""
+        now = time.time()
+        self.backend.put(job_id, json.dumps(dict(job, job_id=job_id)), now + ttl)
+        with self._lock:
+            sweep = now >= self._next_sweep
+            if sweep:
+                self._next_sweep = now + self.sweep_interval
+        if sweep:
+            self.backend.sweep(now)
+
+    def _record_result(self, job_id, future):
+        if future.cancelled():
+            job = {'status': 'failed', 'error': 'Cancelled'}
+        elif future.exception() is not None:
+            job = {'status': 'failed', 'error': str(future.exception())}
+        else:
+            job = {'status': 'done', 'result': future.result()}
+        self._record(job_id, job, self.job_ttl)
+
+    def get_job(self, job_id):
+        """Return the record of a tracked job as a dict, or None if unknown or expired."""
+        row = self.backend.get(job_id)
+        if row is None or row[1] <= time.time():
+            return None
+        return json.loads(row[0])
+
+    def metrics(self):
+        tracked = self.backend.count()
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'in_flight': self._in_flight,
+                'tracked_jobs': tracked,
+                'submitted': self.submitted,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out
+            }
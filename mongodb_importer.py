@@ -3,9 +3,30 @@ MongoDB Sample Database Importer for Knowledge Graph
 
 This module provides utilities to import MongoDB sample databases
 into the knowledge graph structure.
+
+With MONGODB_URI set, import_database() reads the configured collections
+from a real server: documents come through batched cursors projected to
+the id and label fields, collections are read in parallel, and batches
+are written to the graph store as they arrive. Without it,
+get_sample_graph() builds a small placeholder graph from the config.
 """
 
-# Sample MongoDB databases that can be imported
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_WORKERS = 4
+
+# Sample MongoDB databases that can be imported. Each relationship's
+# reference_field builds one edge per value of that field in the source
+# documents (a single id or an array of ids of target documents), matched
+# against the target collection's id_field. import_database() skips, with
+# a warning, a relationship that has none.
 SAMPLE_DATABASES = {
     'sample_mflix': {
         'collections': {
@@ -17,16 +38,29 @@ SAMPLE_DATABASES = {
             },
             'users': {
                 'node_type': 'person',
-                'id_field': '_id',
+                'id_field': 'email',
                 'label_field': 'name',
                 'sample_size': 5
+            },
+            'comments': {
+                'node_type': 'concept',
+                'id_field': '_id',
+                'label_field': 'text',
+                'sample_size': 5
             }
         },
         'relationships': [
             {
-                'source_collection': 'users',
+                'source_collection': 'comments',
                 'target_collection': 'movies',
-                'relation': 'watched'
+                'relation': 'comments_on',
+                'reference_field': 'movie_id'
+            },
+            {
+                'source_collection': 'comments',
+                'target_collection': 'users',
+                'relation': 'written_by',
+                'reference_field': 'email'
             }
         ]
     },
@@ -51,7 +85,7 @@ SAMPLE_DATABASES = {
             },
             'accounts': {
                 'node_type': 'concept',
-                'id_field': '_id',
+                'id_field': 'account_id',
                 'label_field': 'account_title',
                 'sample_size': 5
             }
@@ -60,7 +94,8 @@ SAMPLE_DATABASES = {
             {
                 'source_collection': 'customers',
                 'target_collection': 'accounts',
-                'relation': 'owns'
+                'relation': 'owns',
+                'reference_field': 'accounts'
             }
         ]
     },
@@ -162,3 +197,257 @@ def get_database_info(database_name):
         ),
         'total_sample_edges': len(relationships) * 3  # Rough estimate
     }
+
+
+_client = None
+_client_pid = None
+
+
+def get_client(uri=None):
+    """
+    Return a shared MongoClient for MONGODB_URI, reconnecting after a fork.
+
+    Raises:
+        RuntimeError: If pymongo is not installed or no URI is configured
+    """
+    global _client, _client_pid
+    uri = uri or os.getenv('MONGODB_URI')
+    if not uri:
+        raise RuntimeError('MONGODB_URI is not configured')
+    if _client is None or _client_pid != os.getpid():
+        try:
+            from pymongo import MongoClient
+        except ImportError:
+            raise RuntimeError('Importing from MongoDB requires pymongo (pip install pymongo)')
+        _client = MongoClient(uri, serverSelectionTimeoutMS=5000)
+        _client_pid = os.getpid()
+    return _client
+
+
+def make_node_id(collection_name, value):
+    """Build the graph node id of a document from its collection and id value."""
+    return f"{collection_name}_{value}"
+
+
+def iter_node_batches(db, database_name, collection_name, collection_info, batch_size=DEFAULT_BATCH_SIZE, limit=None):
+    """
+    Read one collection as batches of node dicts.
+    
+    Only the id and label fields are fetched, through a cursor that pulls
+    batch_size documents per round trip.
+    
+    Yields:
+        list: Up to batch_size node dicts
+    """
+    id_field = collection_info['id_field']
+    label_field = collection_info['label_field']
+    projection = {id_field: 1, label_field: 1}
+    if id_field != '_id':
+        projection['_id'] = 0
+    
+    cursor = db[collection_name].find({}, projection, batch_size=batch_size)
+    if limit:
+        cursor = cursor.limit(limit)
+    
+    batch = []
+    for document in cursor:
+        value = document.get(id_field)
+        if value is None:
+            continue
+        label = document.get(label_field)
+        batch.append({
+            'id': make_node_id(collection_name, value),
+            'label': str(value) if label is None else str(label),
+            'type': collection_info['node_type'],
+            'x': 0,
+            'y': 0,
+            'source': database_name
+        })
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_edge_batches(db, collections, relationship, batch_size=DEFAULT_BATCH_SIZE, limit=None):
+    """
+    Read the reference field of a relationship's source collection as batches of edge dicts.
+    
+    Yields:
+        list: Up to batch_size edge dicts
+    """
+    source_collection = relationship['source_collection']
+    target_collection = relationship['target_collection']
+    reference_field = relationship['reference_field']
+    id_field = collections[source_collection]['id_field']
+    projection = {id_field: 1, reference_field: 1}
+    if id_field != '_id':
+        projection['_id'] = 0
+    
+    cursor = db[source_collection].find({reference_field: {'$exists': True}}, projection, batch_size=batch_size)
+    if limit:
+        cursor = cursor.limit(limit)
+    
+    batch = []
+    for document in cursor:
+        value = document.get(id_field)
+        references = document.get(reference_field)
+        if value is None or references is None:
+            continue
+        if not isinstance(references, list):
+            references = [references]
+        source_id = make_node_id(source_collection, value)
+        for reference in references:
+            batch.append({
+                'source': source_id,
+                'target': make_node_id(target_collection, reference),
+                'relation': relationship['relation']
+            })
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+def parallel_batches(producers, workers=DEFAULT_WORKERS):
+    """
+    Run batch generators on a thread pool and yield their batches in the caller's thread.
+    
+    At most 2 * workers batches wait in memory; producers block until the
+    caller catches up. The first producer error is re-raised here, and
+    closing the generator stops the producers.
+    
+    Args:
+        producers: Callables returning batch iterators
+        workers: Threads reading at the same time
+    """
+    results = queue.Queue(maxsize=workers * 2)
+    stop = threading.Event()
+    
+    def put(item):
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def drain(producer):
+        try:
+            for batch in producer():
+                if not put(batch):
+                    return
+        except Exception as e:
+            put(_Failure(e))
+        finally:
+            put(_DONE)
+    
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='mongodb-import') as executor:
+        for producer in producers:
+            executor.submit(drain, producer)
+        try:
+            remaining = len(producers)
+            while remaining:
+                item = results.get()
+                if item is _DONE:
+                    remaining -= 1
+                elif isinstance(item, _Failure):
+                    raise item.error
+                else:
+                    yield item
+        finally:
+            stop.set()
+
+
+def import_database(graph, db, database_name, batch_size=DEFAULT_BATCH_SIZE, workers=DEFAULT_WORKERS, limit=None,
+                    merge=False):
+    """
+    Stream a configured database from MongoDB into the graph store.
+    
+    Nodes of every collection are read in parallel and written batch by
+    batch, then edges are read from the reference fields. An edge whose
+    target document was not imported is skipped. Call it inside a graph
+    transaction to make the import atomic.
+    
+    With merge=True batches are upserted into the existing graph, nodes
+    that are already there keep their position, and the counts include
+    inserted, updated and skipped items.
+    
+    Args:
+        graph: GraphStore to write to
+        db: pymongo (or mongomock) Database
+        database_name: Key of SAMPLE_DATABASES
+        batch_size: Documents per cursor round trip and per store write
+        workers: Collections read in parallel
+        limit: Optional maximum number of documents read per collection
+        merge: Upsert instead of insert
+        
+    Returns:
+        dict: Import counts, or None if the database is not configured
+    """
+    if database_name not in SAMPLE_DATABASES:
+        return None
+    
+    db_schema = SAMPLE_DATABASES[database_name]
+    collections = db_schema.get('collections', {})
+    relationships = []
+    for rel in db_schema.get('relationships', []):
+        if rel.get('reference_field'):
+            relationships.append(rel)
+        else:
+            logger.warning(
+                'Skipping %s relationship %s -> %s (%s): it has no reference_field',
+                database_name, rel['source_collection'], rel['target_collection'], rel['relation']
+            )
+    counts = {'nodes_imported': 0, 'edges_imported': 0, 'dangling_references': 0}
+    if merge:
+        counts['nodes'] = {'inserted': 0, 'updated': 0, 'skipped': 0}
+        counts['edges'] = {'inserted': 0, 'updated': 0, 'skipped': 0}
+    
+    node_producers = [
+        lambda name=name, info=info: iter_node_batches(db, database_name, name, info, batch_size, limit)
+        for name, info in collections.items()
+    ]
+    for batch in parallel_batches(node_producers, workers):
+        if merge:
+            batch = [_without_position(node) if graph.has_node(node['id']) else node for node in batch]
+            _add_counts(counts['nodes'], graph.merge_nodes(batch))
+        else:
+            graph.put_nodes(batch)
+        counts['nodes_imported'] += len(batch)
+    
+    edge_producers = [
+        lambda rel=rel: iter_edge_batches(db, collections, rel, batch_size, limit)
+        for rel in relationships
+    ]
+    for batch in parallel_batches(edge_producers, workers):
+        edges = [edge for edge in batch if graph.has_node(edge['source']) and graph.has_node(edge['target'])]
+        counts['dangling_references'] += len(batch) - len(edges)
+        if merge:
+            inserted, updated, skipped = _add_counts(counts['edges'], graph.merge_edges(edges))
+            counts['edges_imported'] += inserted + updated
+        else:
+            counts['edges_imported'] += len(graph.add_edges(edges))
+    
+    return counts
+
+
+def _without_position(node):
+    return {key: value for key, value in node.items() if key not in ('x', 'y')}
+
+
+def _add_counts(totals, counts):
+    for key, count in zip(('inserted', 'updated', 'skipped'), counts):
+        totals[key] += count
+    return counts
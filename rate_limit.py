@@ -0,0 +1,85 @@
+"""
+Token Bucket Rate Limiter
+
+Each key (a client IP, a username) owns a bucket that holds up to `burst`
+tokens and refills at `rate` tokens per second. A request takes one token
+or is rejected with the time until the next token arrives. Buckets live
+in a bounded LRU dict, so a flood of distinct keys cannot grow memory; an
+evicted bucket was idle long enough to have refilled anyway.
+
+Buckets are per process: with several gunicorn workers a client can get
+up to `burst` tokens from each worker.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_KEYS = 100000
+
+
+class RateLimited(Exception):
+    """Raised when a key has no token left."""
+
+    def __init__(self, key, retry_after):
+        super().__init__(f'Too many attempts, retry in {retry_after:.0f}s')
+        self.key = key
+        self.retry_after = retry_after
+
+
+class TokenBucketLimiter:
+    """Thread-safe per-key token buckets."""
+
+    def __init__(self, rate, burst, max_keys=DEFAULT_MAX_KEYS, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = 0
+
+    def take(self, key):
+        """
+        Take one token for key.
+
+        Raises:
+            RateLimited: If the bucket is empty
+        """
+        now = self._clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = self.burst
+            else:
+                tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                self._buckets.move_to_end(key)
+                self.rejected += 1
+                raise RateLimited(key, (1 - tokens) / self.rate)
+            self._buckets[key] = (tokens - 1, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            self.allowed += 1
+
+    def reset(self, key=None):
+        """Refill the bucket of key, or of every key."""
+        with self._lock:
+            if key is None:
+                self._buckets.clear()
+            else:
+                self._buckets.pop(key, None)
+
+    def metrics(self):
+        """Return counters for monitoring."""
+        with self._lock:
+            return {
+                'rate_per_second': self.rate,
+                'burst': self.burst,
+                'keys': len(self._buckets),
+                'allowed': self.allowed,
+                'rejected': self.rejected
+            }
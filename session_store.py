@@ -0,0 +1,337 @@
+"""
+Server-Side Session Store
+
+A Flask session interface that keeps session data in a shared backend
+with an in-process LRU cache in front of it, so checking a logged-in
+session costs a dict lookup instead of a file read and unpickle.
+
+Stored sessions are immutable: whenever a request changes its session,
+the data is written under a fresh random session id and the old id is
+deleted. A cached entry can therefore never hold outdated data, only a
+session another worker has since deleted, and cached entries are
+re-checked against the backend after `cache_ttl` seconds. A logout is
+therefore seen at once by the worker that served it, but other workers
+may accept the old session id for up to `cache_ttl` seconds. Rotating
+the id on login also protects against session fixation.
+
+Available backends:
+    memory: sessions live in the process (single worker only)
+    sqlite: a SQLite database in WAL mode shared by all workers on a host
+    cookie: Flask's signed stateless cookies; no server-side store at all
+"""
+
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_CACHE_TTL = 10
+DEFAULT_SWEEP_INTERVAL = 300
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session dict that remembers its id and whether it was changed."""
+
+    def __init__(self, initial=None, sid=None, expires=None):
+        def on_update(session):
+            session.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.expires = expires
+        self.modified = False
+
+
+class MemorySessionBackend:
+    """Backend keeping sessions in a dict of the current process."""
+
+    def __init__(self):
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        return self._rows.get(sid)
+
+    def put(self, sid, data, expires):
+        self._rows[sid] = (data, expires)
+
+    def touch(self, sid, expires):
+        with self._lock:
+            row = self._rows.get(sid)
+            if row is not None:
+                self._rows[sid] = (row[0], expires)
+
+    def delete(self, sid):
+        self._rows.pop(sid, None)
+
+    def sweep(self, now):
+        with self._lock:
+            expired = [sid for sid, (_, expires) in self._rows.items() if expires <= now]
+            for sid in expired:
+                del self._rows[sid]
+        return len(expired)
+
+    def count(self):
+        return len(self._rows)
+
+    def close(self):
+        pass
+
+
+class SQLiteSessionBackend:
+    """
+    Backend storing sessions in a SQLite database in WAL mode.
+
+    Each row holds the serialized session and its expiry time; an index on
+    the expiry keeps sweeps from scanning live sessions.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            sid TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            expires REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires);
+    """
+
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @property
+    def conn(self):
+        """Connection for the current thread, reopened after a fork."""
+        local = self._local
+        if getattr(local, 'conn', None) is None or local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(self.SCHEMA)
+            local.conn = conn
+            local.pid = os.getpid()
+        return local.conn
+
+    def close(self):
+        """Close the current thread's connection, e.g. before forking."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local.conn = None
+
+    def get(self, sid):
+        return self.conn.execute('SELECT data, expires FROM sessions WHERE sid = ?', (sid,)).fetchone()
+
+    def put(self, sid, data, expires):
+        self.conn.execute(
+            'INSERT OR REPLACE INTO sessions (sid, data, expires) VALUES (?, ?, ?)',
+            (sid, data, expires)
+        )
+
+    def touch(self, sid, expires):
+        self.conn.execute('UPDATE sessions SET expires = ? WHERE sid = ?', (expires, sid))
+
+    def delete(self, sid):
+        self.conn.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+
+    def sweep(self, now):
+        return self.conn.execute('DELETE FROM sessions WHERE expires <= ?', (now,)).rowcount
+
+    def count(self):
+        return self.conn.execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+
+
+def create_session_backend(name, path=None):
+    """
+    Build a session backend by name.
+
+    Returns:
+        The backend, or None for 'cookie', which needs no server-side store
+    """
+    if name == 'cookie':
+        return None
+    if name == 'memory':
+        return MemorySessionBackend()
+    if name == 'sqlite':
+        return SQLiteSessionBackend(path or 'sessions.db')
+    raise ValueError(f"Unknown session backend {name!r}: use 'memory', 'sqlite' or 'cookie'")
+
+
+class CachedSessionInterface(SessionInterface):
+    """
+    Flask session interface over a backend with an LRU cache in front.
+
+    Sessions expire `ttl` seconds after they were last written or
+    refreshed. A request that finds its session past half its lifetime
+    pushes the expiry out again, so active users stay logged in at the
+    cost of one small write per half lifetime. Expired rows are swept
+    from the backend at most every `sweep_interval` seconds, piggybacked
+    on a request.
+    """
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, backend, ttl, max_entries=DEFAULT_MAX_ENTRIES, cache_ttl=DEFAULT_CACHE_TTL,
+                 sweep_interval=DEFAULT_SWEEP_INTERVAL, clock=time.time):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.cache_ttl = cache_ttl
+        self.sweep_interval = sweep_interval
+        self._clock = clock
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_sweep = clock() + sweep_interval
+        self.hits = 0
+        self.misses = 0
+        self.unknown = 0
+        self.writes = 0
+        self.refreshes = 0
+        self.deletes = 0
+        self.evictions = 0
+        self.sweeps = 0
+        self.swept = 0
+        self.lookup_seconds = 0.0
+
+    # ------------------------------------------------------------------
+    # Cache
+    # ------------------------------------------------------------------
+
+    def _load(self, sid):
+        """Return (data dict, expires) of a live session, or None."""
+        now = self._clock()
+        with self._lock:
+            entry = self._cache.get(sid)
+            if entry is not None:
+                data, expires, checked = entry
+                if expires > now and now - checked < self.cache_ttl:
+                    self._cache.move_to_end(sid)
+                    self.hits += 1
+                    return data, expires
+                del self._cache[sid]
+            self.misses += 1
+
+        row = self.backend.get(sid)
+        if row is None or row[1] <= now:
+            with self._lock:
+                self.unknown += 1
+            return None
+        data = self.serializer.loads(row[0])
+        with self._lock:
+            self._cache_put(sid, data, row[1], now)
+        return data, row[1]
+
+    def _cache_put(self, sid, data, expires, now):
+        self._cache[sid] = (data, expires, now)
+        self._cache.move_to_end(sid)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+
+    def _forget(self, sid):
+        with self._lock:
+            self._cache.pop(sid, None)
+            self.deletes += 1
+        self.backend.delete(sid)
+
+    def _maybe_sweep(self, now):
+        with self._lock:
+            if now < self._next_sweep:
+                return
+            self._next_sweep = now + self.sweep_interval
+            for sid in [sid for sid, entry in self._cache.items() if entry[1] <= now]:
+                del self._cache[sid]
+        swept = self.backend.sweep(now)
+        with self._lock:
+            self.sweeps += 1
+            self.swept += swept
+
+    # ------------------------------------------------------------------
+    # SessionInterface
+    # ------------------------------------------------------------------
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid:
+            return ServerSession()
+        started = time.perf_counter()
+        found = self._load(sid)
+        with self._lock:
+            self.lookup_seconds += time.perf_counter() - started
+        if found is None:
+            return ServerSession()
+        return ServerSession(found[0], sid=sid, expires=found[1])
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        now = self._clock()
+        self._maybe_sweep(now)
+
+        if not session:
+            if session.sid is not None:
+                self._forget(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if session.modified or session.sid is None:
+            # Stored data never changes in place, so write it under a new id
+            if session.sid is not None:
+                self._forget(session.sid)
+            sid = secrets.token_urlsafe(32)
+            data = dict(session)
+            expires = now + self.ttl
+            self.backend.put(sid, self.serializer.dumps(data), expires)
+            with self._lock:
+                self.writes += 1
+                self._cache_put(sid, data, expires, now)
+            response.set_cookie(
+                name,
+                sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app)
+            )
+        elif session.expires - now < self.ttl / 2:
+            expires = now + self.ttl
+            self.backend.touch(session.sid, expires)
+            with self._lock:
+                self.refreshes += 1
+                self._cache_put(session.sid, dict(session), expires, now)
+
+    def metrics(self):
+        """Return counters for monitoring."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            metrics = {
+                'backend': type(self.backend).__name__,
+                'cached': len(self._cache),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'cache_ttl_seconds': self.cache_ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'unknown': self.unknown,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'writes': self.writes,
+                'refreshes': self.refreshes,
+                'deletes': self.deletes,
+                'evictions': self.evictions,
+                'sweeps': self.sweeps,
+                'swept': self.swept,
+                'avg_lookup_us': round(self.lookup_seconds / lookups * 1e6, 2) if lookups else 0.0
+            }
+        metrics['stored'] = self.backend.count()
+        return metrics
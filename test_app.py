@@ -1,20 +1,73 @@
+import json
+import re
+import threading
+import time
+from types import SimpleNamespace
+
 import pytest
-from app import app
+from app import app, authenticator, create_app, graph_events, openai_cache
+from graph_extract import make_node_id, merge_extractions
+from graph_store import GraphStore
+from llm_cache import ResponseCache
+from llm_jobs import LLMExecutor, SQLiteJobBackend
+from rate_limit import TokenBucketLimiter
+from session_store import CachedSessionInterface, SQLiteSessionBackend
+from user_store import Authenticator, MemoryUserBackend, hash_password, needs_rehash, verify_password
 
 
 @pytest.fixture
 def client():
     """Create a test client for the Flask app."""
     app.config['TESTING'] = True
+    create_app()
     with app.test_client() as client:
         yield client
 
 
+class StubOpenAI:
+    """Local stand-in for the OpenAI client that counts completion calls."""
+
+    def __init__(self, reply=None):
+        self.calls = 0
+        self.reply = reply or (lambda messages: 'Answer: ' + messages[-1]['content'])
+        self.gate = threading.Event()
+        self.gate.set()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, **params):
+        self.calls += 1
+        self.gate.wait(5)
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(message=SimpleNamespace(content=self.reply(messages)))],
+            usage=SimpleNamespace(prompt_tokens=5, completion_tokens=7, total_tokens=12)
+        )
+
+
+@pytest.fixture
+def openai_stub(monkeypatch):
+    """Route OpenAI calls to a StubOpenAI and start from an empty cache."""
+    stub = StubOpenAI()
+    monkeypatch.setattr('app.openai_client', stub)
+    monkeypatch.setattr('app.ENABLE_OPENAI_NLP', True)
+    openai_cache.clear()
+    return stub
+
+
+def login_admin(client):
+    client.post('/login', json={'username': 'admin', 'password': 'admin123'})
+
+
 def test_home_page(client):
-    """Test the home page endpoint."""
+    """The home page sends anonymous users to the login page and others to /nlp."""
     response = client.get('/')
-    assert response.status_code == 200
-    assert response.json['message'] == 'Hello, Flask!'
+    assert response.status_code == 302
+    assert response.location.endswith('/login')
+
+    login_admin(client)
+    response = client.get('/')
+    assert response.status_code == 302
+    assert response.location.endswith('/nlp')
 
 
 def test_health_check(client):
@@ -28,3 +81,665 @@ def test_invalid_route(client):
     """Test an invalid route returns 404."""
     response = client.get('/invalid')
     assert response.status_code == 404
+
+
+def test_node_and_edge_writes_reject_bad_fields(client):
+    """Malformed bodies and non-scalar fields are a 400 and leave the graph untouched."""
+    etag = client.get('/api/graph').headers['ETag']
+    counts = client.get('/api/report/graph-stats').json['node_types']
+    bad_writes = [
+        ('PUT', '/api/nodes/user', {'type': ['x']}),
+        ('PUT', '/api/nodes/user', {'label': {'text': 'User'}}),
+        ('PUT', '/api/nodes/user', {'x': [1, 2]}),
+        ('PUT', '/api/nodes/user', ['label']),
+        ('POST', '/api/nodes', {'id': 'zzz', 'label': 'Z', 'type': ['x']}),
+        ('POST', '/api/nodes', 'zzz'),
+        ('POST', '/api/edges', {'source': 'user', 'target': 'order', 'relation': ['knows']}),
+    ]
+    for method, path, body in bad_writes:
+        assert client.open(path, method=method, json=body).status_code == 400
+
+    assert client.get('/api/graph', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/api/report/graph-stats').json['node_types'] == counts
+
+
+def test_node_delete_cascades_edges(client):
+    """Deleting a node removes only the edges attached to it."""
+    client.delete('/api/graph/clear')
+    for node_id in ('a', 'b', 'c'):
+        client.post('/api/nodes', json={'id': node_id, 'label': node_id.upper()})
+    client.post('/api/edges', json={'source': 'a', 'target': 'b'})
+    client.post('/api/edges', json={'source': 'b', 'target': 'c'})
+
+    response = client.post('/api/edges', json={'source': 'a', 'target': 'b'})
+    assert response.status_code == 409
+
+    response = client.delete('/api/nodes/a')
+    assert response.status_code == 200
+    assert client.get('/api/edges/a-b').status_code == 404
+    assert client.get('/api/edges/b-c').status_code == 200
+    assert [e['id'] for e in client.get('/api/edges').json['edges']] == ['b-c']
+
+
+def test_graph_stats_optional_metrics(client):
+    """Stats report degrees and the opt-in component/top-k/histogram metrics."""
+    client.delete('/api/graph/clear')
+    for node_id in ('a', 'b', 'c', 'd'):
+        client.post('/api/nodes', json={'id': node_id, 'label': node_id})
+    client.post('/api/edges', json={'source': 'a', 'target': 'b'})
+    client.post('/api/edges', json={'source': 'c', 'target': 'a'})
+
+    stats = client.get('/api/report/graph-stats').json
+    assert stats['total_edges'] == 2
+    assert stats['node_degrees']['a'] == {'in_degree': 1, 'out_degree': 1, 'total_degree': 2}
+    assert stats['relationship_types'] == {'related_to': 2}
+    assert 'components' not in stats
+
+    stats = client.get('/api/report/graph-stats?components=true&top_k=1&histogram=true&degrees=false').json
+    assert 'node_degrees' not in stats
+    assert stats['components'] == {'count': 2, 'largest': 3, 'sizes': [3, 1]}
+    assert stats['top_degree_nodes'] == [{'id': 'a', 'total_degree': 2}]
+    assert stats['degree_histogram'] == {'0': 1, '1': 2, '2': 1}
+
+
+def test_import_ndjson_stream(client):
+    """NDJSON imports are parsed line by line, deduplicated and batched."""
+    lines = [json.dumps({'node': {'id': f'n{i}', 'label': f'Node {i}'}}) for i in range(5)]
+    lines.append(json.dumps({'edges': [
+        {'source': 'n0', 'target': 'n1'},
+        {'source': 'n0', 'target': 'n1', 'relation': 'again'},
+        {'source': 'n1', 'target': 'n2', 'relation': 'knows'},
+    ]}))
+    body = '\n'.join(lines) + '\n'
+
+    response = client.post('/api/graph/import?batch_size=2&progress=true', data=body,
+                           content_type='application/x-ndjson')
+    progress = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert len(progress) > 1
+    assert progress[-1]['done']
+    assert progress[-1]['nodes_imported'] == 5
+    assert progress[-1]['edges_imported'] == 2
+    assert progress[-1]['duplicate_edges'] == 1
+    assert client.get('/api/edges/n1-n2').json['edge']['relation'] == 'knows'
+
+    etag = client.get('/api/graph').headers['ETag']
+    bad = body + json.dumps({'edge': {'source': 'n0', 'target': 'missing'}}) + '\n'
+    response = client.post('/api/graph/import?batch_size=2', data=bad, content_type='application/x-ndjson')
+    assert response.status_code == 400
+    assert 'Line 7' in response.json['error']
+    # The failed import rolled back in memory too: same version, same graph
+    assert client.get('/api/graph', headers={'If-None-Match': etag}).status_code == 304
+    assert len(client.get('/api/graph').json['nodes']) == 5
+    assert client.get('/api/edges/n1-n2').json['edge']['relation'] == 'knows'
+
+
+def test_import_ndjson_rejects_bad_fields(client):
+    """Malformed records are a 400 and leave nothing behind, with or without progress."""
+    etag = client.get('/api/graph').headers['ETag']
+    bad_imports = [
+        ('merge', json.dumps({'node': {'id': 'zzz', 'label': 'Z', 'type': ['x']}})),
+        ('merge', json.dumps({'nodes': 5})),
+        ('replace', json.dumps({'edge': {'source': 'user', 'target': 'order', 'relation': {'a': 1}}})),
+        ('merge&progress=true', json.dumps({'node': {'id': 'zzz', 'label': ['Z']}})),
+    ]
+    for mode, line in bad_imports:
+        response = client.post(f'/api/graph/import?mode={mode}', data=line + '\n', content_type='application/x-ndjson')
+        assert response.status_code == 400
+        assert response.json['error'].startswith('Import error: Line 1')
+
+    # Once a progress line is out, the error ends the stream instead
+    lines = [json.dumps({'node': {'id': f'p{i}', 'label': 'P'}}) for i in range(3)]
+    lines.append(json.dumps({'edge': {'source': 'p0', 'target': 'p1', 'relation': 7}}))
+    response = client.post('/api/graph/import?mode=merge&batch_size=2&progress=true', data='\n'.join(lines),
+                           content_type='application/x-ndjson')
+    assert response.status_code == 200
+    assert 'edge.relation must be a string' in json.loads(response.data.decode().splitlines()[-1])['error']
+
+    assert client.get('/api/graph', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/api/nodes/zzz').status_code == 404
+    assert client.get('/api/nodes?type=entity').status_code == 200
+
+
+def test_rollback_restores_memory_graph():
+    """A failed transaction leaves a memory-backed store exactly as it was."""
+    store = GraphStore()
+    store.merge_nodes([{'id': i, 'label': i, 'type': 't'} for i in 'abc'])
+    store.add_edges([{'source': 'a', 'target': 'b', 'relation': 'r'}, {'source': 'b', 'target': 'c', 'relation': 's'}])
+    state = lambda: (store.version, sorted(store.nodes(), key=lambda node: node['id']),
+                     sorted(store.edges(), key=lambda edge: edge['id']), store.type_counts(), store.relation_counts())
+    before = state()
+    store.build_paging_indexes()
+
+    for clear in (False, True):
+        with pytest.raises(RuntimeError):
+            with store.transaction():
+                store.update_node('a', {'label': 'changed', 'type': 'u'})
+                store.merge_edges([{'source': 'a', 'target': 'b', 'relation': 'x'}])
+                store.delete_node('b')
+                if clear:
+                    store.clear()
+                store.add_node({'id': 'd', 'label': 'd'})
+                raise RuntimeError('abort')
+        assert state() == before
+        assert store.get_edge('b-c') is not None
+        assert sorted(node['id'] for node in store.page_nodes(limit=10)[0]) == ['a', 'b', 'c']
+
+
+def test_graph_conditional_get(client):
+    """Read endpoints return an ETag and answer a matching If-None-Match with 304."""
+    response = client.get('/api/graph')
+    etag = response.headers['ETag']
+    assert response.status_code == 200
+    assert client.get('/api/nodes').headers['ETag'] == etag
+
+    response = client.get('/api/graph', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+    client.post('/api/nodes', json={'id': 'etag-node', 'label': 'New'})
+    response = client.get('/api/graph', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert any(n['id'] == 'etag-node' for n in response.json['nodes'])
+
+
+def test_graph_changes_feed(client):
+    """The changes feed returns deltas since a version, or a snapshot."""
+    client.delete('/api/graph/clear')
+    start = client.get('/api/graph/changes').json
+    assert start['snapshot'] and start['nodes'] == []
+
+    client.post('/api/nodes', json={'id': 'a', 'label': 'A'})
+    client.post('/api/nodes', json={'id': 'b', 'label': 'B'})
+    client.post('/api/edges', json={'source': 'a', 'target': 'b'})
+    client.delete('/api/nodes/b')
+
+    feed = client.get(f"/api/graph/changes?since={start['version']}&instance={start['instance']}").json
+    assert not feed['snapshot']
+    assert [c['op'] for c in feed['changes']] == ['add_node', 'add_node', 'add_edge', 'delete_edge', 'delete_node']
+    assert feed['changes'][-1]['id'] == 'b'
+
+    assert client.get(f"/api/graph/changes?since={feed['version']}").json['changes'] == []
+    assert client.get(f"/api/graph/changes?since={start['version']}&instance=other").json['snapshot']
+
+
+def test_graph_stream_pushes_changes(client):
+    """Committed mutations are pushed to SSE subscribers as they happen."""
+    response = client.get('/api/graph/stream', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    stream = (chunk.decode() for chunk in response.response)
+    assert next(stream).startswith('retry:')
+    assert 'event: hello' in next(stream)
+
+    client.post('/api/nodes', json={'id': 'streamed', 'label': 'Streamed'})
+    message = next(stream)
+    assert 'event: change' in message
+    assert '"op": "add_node"' in message
+    assert '"streamed"' in message
+    response.close()
+    assert graph_events.subscriber_count() == 0
+
+
+def test_schema_generation(client):
+    """Schemas cover every node type and edge, and the SQL DDL can be streamed."""
+    client.delete('/api/graph/clear')
+    client.post('/api/nodes', json={'id': 'a', 'label': 'A', 'type': 'Person'})
+    client.post('/api/nodes', json={'id': 'b', 'label': 'B', 'type': 'Place'})
+    client.post('/api/edges', json={'source': 'a', 'target': 'b', 'relation': 'lives_in'})
+
+    sql = client.get('/api/schemas/sql')
+    assert sql.json['table_count'] == 2
+    assert sql.json['relationship_count'] == 1
+    assert 'CREATE TABLE persons' in sql.json['schema']
+    assert client.get('/api/schemas/sql', headers={'If-None-Match': sql.headers['ETag']}).status_code == 304
+
+    text = client.get('/api/schemas/sql?format=text')
+    assert text.mimetype == 'text/plain'
+    assert text.get_data(as_text=True) == sql.json['schema']
+
+    mongo = client.get('/api/schemas/mongodb').json
+    assert set(mongo['schema']['collections']) == {'person', 'place'}
+    assert mongo['schema']['relationshipTypes'] == ['lives_in']
+
+
+def test_openai_query_cached(client, openai_stub):
+    """Repeated questions are answered from the cache and counted in the metrics."""
+    login_admin(client)
+    before = client.get('/api/openai/metrics').json['cache']
+
+    first = client.post('/api/openai/query', json={'question': 'What is a graph?'}).json
+    second = client.post('/api/openai/query', json={'question': '  what IS a   graph? '}).json
+    assert not first['cached'] and second['cached']
+    assert second['answer'] == first['answer']
+    assert openai_stub.calls == 1
+
+    after = client.get('/api/openai/metrics').json['cache']
+    assert after['hits'] == before['hits'] + 1
+    assert after['tokens_saved'] == before['tokens_saved'] + 12
+
+
+def test_response_cache_coalesces_concurrent_misses():
+    """Concurrent lookups of one key share a single computation."""
+    cache = ResponseCache()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return 'result'
+
+    statuses = []
+    threads = [
+        threading.Thread(target=lambda: statuses.append(cache.get_or_compute('key', compute)[1]))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    while cache.metrics()['coalesced'] < 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(statuses) == ['coalesced'] * 3 + ['miss']
+
+
+def test_openai_query_jobs_and_backpressure(client, openai_stub, monkeypatch):
+    """Async queries return a pollable job, and a saturated pool answers 429."""
+    monkeypatch.setattr('app.llm_pool', LLMExecutor(max_workers=1, max_queue=0))
+    login_admin(client)
+    openai_stub.gate.clear()
+
+    submitted = client.post('/api/openai/query', json={'question': 'Slow question', 'async': True})
+    assert submitted.status_code == 202
+    job_url = submitted.headers['Location']
+
+    rejected = client.post('/api/openai/query', json={'question': 'Another question'})
+    assert rejected.status_code == 429
+    assert rejected.headers['Retry-After'] == '1'
+
+    openai_stub.gate.set()
+    for _ in range(500):
+        job = client.get(job_url).json
+        if job['status'] == 'done':
+            break
+        time.sleep(0.01)
+    assert job['result']['answer'] == 'Answer: Slow question'
+    assert client.get('/api/openai/jobs/missing').status_code == 404
+
+
+def test_openai_jobs_are_polled_from_a_shared_backend(client, openai_stub, monkeypatch, tmp_path):
+    """A job accepted by one worker's pool can be polled through another's."""
+    path = str(tmp_path / 'jobs.db')
+    accepting = LLMExecutor(max_workers=1, backend=SQLiteJobBackend(path))
+    monkeypatch.setattr('app.llm_pool', accepting)
+    login_admin(client)
+    openai_stub.gate.clear()
+
+    submitted = client.post('/api/openai/query', json={'question': 'Shared question', 'async': True})
+    assert submitted.status_code == 202
+    job_url = submitted.headers['Location']
+
+    monkeypatch.setattr('app.llm_pool', LLMExecutor(max_workers=1, backend=SQLiteJobBackend(path)))
+    assert client.get(job_url).json['status'] in ('queued', 'running')
+
+    openai_stub.gate.set()
+    for _ in range(500):
+        job = client.get(job_url).json
+        if job['status'] == 'done':
+            break
+        time.sleep(0.01)
+    assert job['result']['answer'] == 'Answer: Shared question'
+    assert accepting.metrics()['tracked_jobs'] == 1
+
+
+def extraction_reply(messages):
+    """Stub extraction: capitalized words are entities, linked in order of mention."""
+    chunks = re.findall(r'\[chunk (\d+)\]\n(.*?)(?=\n\n\[chunk|\Z)', messages[-1]['content'], re.S)
+    replies = []
+    for index, text in chunks:
+        names = re.findall(r'\b[A-Z][a-z]+\b', text)
+        replies.append({
+            'index': int(index),
+            'entities': [{'name': name, 'type': 'Person'} for name in names],
+            'relations': [
+                {'source': a, 'target': b, 'relation': 'knows'} for a, b in zip(names, names[1:])
+            ]
+        })
+    return json.dumps({'chunks': replies})
+
+
+def test_nlp_extract_batches_and_caches(client, openai_stub, monkeypatch):
+    """Text is chunked, extracted in batched calls, merged once and cached per chunk."""
+    openai_stub.reply = extraction_reply
+    monkeypatch.setenv('NLP_EXTRACT_CHUNK_CHARS', '30')
+    monkeypatch.setenv('NLP_EXTRACT_CHUNKS_PER_CALL', '2')
+    client.delete('/api/graph/clear')
+    login_admin(client)
+    text = 'Alice met Bob.\n\nBob called Carol.\n\nCarol visited Alice.'
+
+    first = client.post('/api/nlp/extract', json={'text': text}).json
+    assert first['chunks'] == 3 and first['llm_calls'] == 2
+    assert first['nodes_added'] == 3 and first['edges_added'] == 3
+    nodes = {node['id']: node for node in client.get('/api/nodes').json['nodes']}
+    assert nodes['alice']['label'] == 'Alice' and nodes['alice']['type'] == 'person'
+
+    second = client.post('/api/nlp/extract', json={'text': text}).json
+    assert second['cached_chunks'] == 3 and second['llm_calls'] == 0
+    assert second['nodes_added'] == 0 and second['edges_added'] == 0
+    assert openai_stub.calls == 2
+
+
+def test_extracted_node_ids_keep_distinct_names_apart():
+    """Non-Latin names keep their slug, and names sharing a slug get distinct ids."""
+    assert make_node_id('New York') == 'new_york'
+    assert make_node_id('東京') == '東京'
+    assert make_node_id('++') and make_node_id('  ') == ''
+    nodes, edges = merge_extractions([{
+        'entities': [{'name': 'C++', 'type': 'language'}, {'name': 'C#', 'type': 'language'}],
+        'relations': [{'source': 'c#', 'target': 'C++', 'relation': 'influenced by'}]
+    }])
+    ids = [node['id'] for node in nodes]
+    assert ids[0] == 'c' and ids[1].startswith('c_') and len(set(ids)) == 2
+    assert edges == [{'source': ids[1], 'target': 'c', 'relation': 'influenced_by'}]
+
+
+def test_import_merge_mode(client):
+    """mode=merge upserts into the existing graph and reports the counts."""
+    client.post('/api/graph/import', json={
+        'nodes': [{'id': 'a', 'label': 'A', 'x': 50}, {'id': 'b', 'label': 'B'}],
+        'edges': [{'source': 'a', 'target': 'b', 'relation': 'knows'}]
+    })
+
+    result = client.post('/api/graph/import?mode=merge', json={
+        'nodes': [{'id': 'a', 'label': 'Alpha'}, {'id': 'c', 'label': 'C'}],
+        'edges': [{'source': 'a', 'target': 'b', 'relation': 'knows'}, {'source': 'b', 'target': 'c'}]
+    }).json
+    assert result['nodes'] == {'inserted': 1, 'updated': 1, 'skipped': 0}
+    assert result['edges'] == {'inserted': 1, 'updated': 0, 'skipped': 1}
+    assert client.get('/api/nodes/a').json['node']['x'] == 50
+
+    lines = '\n'.join(json.dumps(record) for record in [
+        {'node': {'id': 'c', 'label': 'C'}},
+        {'edge': {'source': 'c', 'target': 'a', 'relation': 'cites'}}
+    ])
+    result = client.post('/api/graph/import?mode=merge', data=lines, content_type='application/x-ndjson').json
+    assert result['nodes'] == {'inserted': 0, 'updated': 0, 'skipped': 1}
+    assert result['edges'] == {'inserted': 1, 'updated': 0, 'skipped': 0}
+    assert result['nodes_count'] == 3 and result['edges_count'] == 3
+
+    bad = client.post('/api/graph/import?mode=merge', json={'nodes': [], 'edges': [{'source': 'a', 'target': 'zz'}]})
+    assert bad.status_code == 400
+
+
+def test_import_merge_rejects_bad_fields(client):
+    """A merge with a malformed node or edge is a 400 and changes nothing."""
+    etag = client.get('/api/graph').headers['ETag']
+    bad_merges = [
+        {'nodes': [{'id': 'zzz', 'label': 'Z'}, {'id': 'user', 'label': 'U', 'type': ['entity']}], 'edges': []},
+        {'nodes': [{'id': 'zzz', 'label': 'Z', 'x': {'a': 1}}], 'edges': []},
+        {'nodes': [], 'edges': [{'source': 'user', 'target': 'order', 'relation': ['knows']}]},
+        {'nodes': 5, 'edges': []},
+    ]
+    for body in bad_merges:
+        response = client.post('/api/graph/import?mode=merge', json=body)
+        assert response.status_code == 400
+        assert response.json['error'].startswith('Invalid')
+
+    assert client.get('/api/graph', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/api/nodes/zzz').status_code == 404
+    assert client.get('/api/nodes?type=entity').status_code == 200
+
+
+def test_paginated_listings(client):
+    """List endpoints page with opaque cursors, filter and project fields."""
+    client.delete('/api/graph/clear')
+    nodes = [{'id': f'n{i}', 'label': f'Node {i}', 'type': 'even' if i % 2 == 0 else 'odd'} for i in range(5)]
+    edges = [{'source': 'n0', 'target': f'n{i}', 'relation': 'links'} for i in range(1, 5)]
+    client.post('/api/graph/import', json={'nodes': nodes, 'edges': edges})
+
+    first = client.get('/api/nodes?limit=2&fields=id').json
+    assert first['nodes'] == [{'id': 'n0'}, {'id': 'n1'}]
+    second = client.get(f"/api/nodes?limit=2&fields=id&cursor={first['next_cursor']}").json
+    assert second['nodes'] == [{'id': 'n2'}, {'id': 'n3'}]
+
+    evens = client.get('/api/nodes?type=even').json
+    assert [node['id'] for node in evens['nodes']] == ['n0', 'n2', 'n4'] and evens['next_cursor'] is None
+
+    page = client.get('/api/edges?target=n3&fields=source,relation').json
+    assert page['edges'] == [{'source': 'n0', 'relation': 'links'}]
+    assert client.get('/api/edges?limit=0').status_code == 400
+    assert client.get('/api/edges?cursor=bogus').status_code == 400
+
+
+def test_neighbors_and_path_endpoints(client):
+    """Traversal endpoints return the subgraph or path with timing info."""
+    client.delete('/api/graph/clear')
+    nodes = [{'id': node_id, 'label': node_id.upper()} for node_id in 'abcd']
+    edges = [{'source': 'a', 'target': 'b'}, {'source': 'b', 'target': 'c'}, {'source': 'c', 'target': 'd'}]
+    client.post('/api/graph/import', json={'nodes': nodes, 'edges': edges})
+
+    result = client.get('/api/nodes/b/neighbors?depth=2&direction=out').json
+    assert {node['id'] for node in result['nodes']} == {'b', 'c', 'd'}
+    assert 'took_ms' in result
+
+    path = client.get('/api/graph/path?source=a&target=d').json
+    assert path['found'] and path['path'] == ['a', 'b', 'c', 'd'] and path['length'] == 3
+    assert not client.get('/api/graph/path?source=d&target=a').json['found']
+    assert client.get('/api/graph/path?source=a&target=zz').status_code == 404
+    assert client.get('/api/nodes/a/neighbors?direction=sideways').status_code == 400
+
+
+def test_search_endpoint(client):
+    """Search finds nodes by whole words or typeahead prefix and follows edits."""
+    client.delete('/api/graph/clear')
+    nodes = [
+        {'id': 'ada', 'label': 'Ada Lovelace', 'type': 'person'},
+        {'id': 'engine', 'label': 'Analytical Engine', 'type': 'machine'}
+    ]
+    client.post('/api/graph/import', json={'nodes': nodes, 'edges': []})
+
+    result = client.get('/api/search?prefix=an').json
+    assert [r['id'] for r in result['results']] == ['engine'] and 'took_ms' in result
+    assert client.get('/api/search?q=lovelace&type=person').json['count'] == 1
+    assert client.get('/api/search?q=lovelace&type=machine').json['count'] == 0
+    client.put('/api/nodes/ada', json={'label': 'Ada King'})
+    assert client.get('/api/search?q=lovelace').json['count'] == 0
+    assert client.get('/api/search').status_code == 400
+
+
+def test_layout_endpoint(client):
+    """Layouts are cached per version and incremental mode only moves new nodes."""
+    pytest.importorskip('numpy')
+    client.delete('/api/graph/clear')
+    nodes = [{'id': f'n{i}', 'label': f'N{i}', 'x': 0, 'y': 0} for i in range(20)]
+    edges = [{'source': f'n{i}', 'target': f'n{i + 1}'} for i in range(19)]
+    client.post('/api/graph/import', json={'nodes': nodes, 'edges': edges})
+
+    first = client.get('/api/graph/layout')
+    assert first.status_code == 200 and len(first.json['positions']) == 20
+    assert client.get('/api/graph/layout', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    assert client.post('/api/graph/layout').json['nodes_moved'] == 20
+    placed = {node['id']: (node['x'], node['y']) for node in client.get('/api/nodes').json['nodes']}
+    assert all(position != (0, 0) for position in placed.values())
+
+    client.post('/api/nodes', json={'id': 'new', 'label': 'New', 'x': 0, 'y': 0})
+    client.post('/api/edges', json={'source': 'new', 'target': 'n5'})
+    result = client.get('/api/graph/layout?mode=incremental').json
+    assert result['mode'] == 'incremental'
+    assert set(result['positions']) == {'new', 'n5'}
+    assert client.get('/api/graph/layout?mode=sideways').status_code == 400
+
+
+def test_analytics_endpoint(client, monkeypatch):
+    """Analytics run inline for small graphs and on the process pool on request."""
+    pytest.importorskip('scipy')
+    client.delete('/api/graph/clear')
+    nodes = [{'id': node_id, 'label': node_id} for node_id in 'abcd']
+    edges = [
+        {'source': 'a', 'target': 'b'}, {'source': 'b', 'target': 'c'},
+        {'source': 'c', 'target': 'a'}, {'source': 'd', 'target': 'a'}
+    ]
+    client.post('/api/graph/import', json={'nodes': nodes, 'edges': edges})
+
+    report = client.get('/api/report/analytics?top=2').json
+    assert report['nodes'] == 4
+    assert report['pagerank']['top'][0]['id'] == 'a'
+    assert report['weak_components']['count'] == 1
+    assert report['strong_components'] == {'count': 2, 'largest': [3, 1], 'singletons': 1}
+    assert report['betweenness']['top'][0]['id'] == 'a'
+
+    client.post('/api/nodes', json={'id': 'e', 'label': 'e'})
+    response = client.get('/api/report/analytics?background=true')
+    deadline = time.monotonic() + 60
+    while response.status_code == 202 and time.monotonic() < deadline:
+        time.sleep(0.05)
+        response = client.get('/api/report/analytics')
+    assert response.status_code == 200
+    assert response.json['weak_components']['count'] == 2
+
+    # A failed run is reported once, then retried instead of cached
+    import graph_analytics
+    for count, target in ((6, 'graph_arrays'), (7, 'analyze')):
+        node_id = f'n{count}'
+        client.post('/api/nodes', json={'id': node_id, 'label': node_id})
+        original = getattr(graph_analytics, target)
+        monkeypatch.setattr(graph_analytics, target, lambda *args: 1 / 0)
+        response = client.get('/api/report/analytics')
+        assert response.status_code == 500
+        assert 'division by zero' in response.json['error']
+        monkeypatch.setattr(graph_analytics, target, original)
+        assert client.get('/api/report/analytics').json['nodes'] == count
+
+
+def test_graph_batch_is_atomic(client):
+    """A batch applies every operation in order, or none when one is invalid."""
+    client.delete('/api/graph/clear')
+    client.post('/api/nodes', json={'id': 'a', 'label': 'A'})
+
+    result = client.post('/api/graph/batch', json={'operations': [
+        {'op': 'add_node', 'node': {'id': 'b', 'label': 'B'}},
+        {'op': 'add_node', 'node': {'id': 'c', 'label': 'C', 'type': 'city'}},
+        {'op': 'add_edge', 'edge': {'source': 'a', 'target': 'b'}},
+        {'op': 'add_edge', 'edge': {'source': 'b', 'target': 'c', 'relation': 'knows'}},
+        {'op': 'update_node', 'id': 'a', 'node': {'label': 'Alpha'}},
+        {'op': 'update_edge', 'id': 'a-b', 'edge': {'relation': 'cites'}},
+        {'op': 'delete_node', 'id': 'c'}
+    ]})
+    assert result.status_code == 200
+    assert [r['status'] for r in result.json['results']] == [201, 201, 201, 201, 200, 200, 200]
+    assert result.json['results'][4]['node']['label'] == 'Alpha'
+    assert [e['id'] for e in client.get('/api/edges').json['edges']] == ['a-b']
+    assert client.get('/api/edges/a-b').json['edge']['relation'] == 'cites'
+
+    version = client.get('/api/graph/changes').json['version']
+    result = client.post('/api/graph/batch', json={'operations': [
+        {'op': 'add_node', 'node': {'id': 'd', 'label': 'D'}},
+        {'op': 'delete_node', 'id': 'b'},
+        {'op': 'add_edge', 'edge': {'source': 'd', 'target': 'b'}},
+        {'op': 'delete_edge', 'id': 'a-b'}
+    ]})
+    assert result.status_code == 404
+    assert [(e['index'], e['status']) for e in result.json['errors']] == [(2, 404), (3, 404)]
+    assert client.get('/api/nodes/d').status_code == 404
+    assert client.get('/api/graph/changes').json['version'] == version
+
+    assert client.post('/api/graph/batch', json={'operations': [{'op': 'add_node', 'node': {'id': 'a', 'label': 'A'}}]}).status_code == 409
+    assert client.post('/api/graph/batch', json={'operations': [{'op': 'rename'}]}).status_code == 400
+
+    result = client.post('/api/graph/batch', json={'operations': [
+        {'op': 'add_node', 'node': {'id': 'e', 'label': 'E'}},
+        {'op': 'add_node', 'node': {'id': 'f', 'label': 'F', 'type': ['list']}},
+        {'op': 'add_edge', 'edge': {'source': 'e', 'target': 'a', 'relation': ['x']}},
+        {'op': 'update_edge', 'id': 'a-b', 'edge': {'relation': {'x': 1}}}
+    ]})
+    assert result.status_code == 400
+    assert [e['index'] for e in result.json['errors']] == [1, 2, 3]
+    assert client.get('/api/nodes/e').status_code == 404
+    assert client.post('/api/graph/batch', json=[]).status_code == 400
+
+
+def test_sessions_cached_rotated_and_swept(client, tmp_path):
+    """Sessions are served from the cache, get a new id on change and expire."""
+    login_admin(client)
+    sid = client.get_cookie('session').value
+    assert client.get('/nlp').status_code == 200
+    metrics = client.get('/api/sessions/metrics').json
+    assert metrics['hits'] >= 2 and metrics['stored'] >= 1
+
+    client.get('/logout')
+    assert client.get_cookie('session') is None
+    client.set_cookie('session', sid)
+    assert client.get('/nlp').status_code == 302
+
+    # Two interfaces over one database behave like two gunicorn workers
+    now = [1000.0]
+    workers = [
+        CachedSessionInterface(SQLiteSessionBackend(str(tmp_path / 'sessions.db')), ttl=60,
+                               cache_ttl=5, sweep_interval=10, clock=lambda: now[0])
+        for _ in range(2)
+    ]
+    data = workers[0].serializer.dumps({'user_id': 'user'})
+    workers[0].backend.put('abc', data, now[0] + 60)
+    assert workers[1]._load('abc')[0] == {'user_id': 'user'}
+    workers[0].backend.delete('abc')
+    assert workers[1]._load('abc') is not None
+    now[0] += 6
+    assert workers[1]._load('abc') is None
+
+    workers[0].backend.put('old', data, now[0] + 1)
+    now[0] += 20
+    workers[0]._maybe_sweep(now[0])
+    assert workers[0].metrics()['swept'] == 1 and workers[1].backend.count() == 0
+
+
+def test_login_rate_limited_before_hashing(client, monkeypatch):
+    """Floods get 429 without hashing; verified credentials skip the hash."""
+    monkeypatch.setattr(authenticator, 'user_limiter', TokenBucketLimiter(rate=0.001, burst=2))
+    hashes = authenticator.hashes
+    for _ in range(2):
+        assert client.post('/login', json={'username': 'user', 'password': 'guess'}).status_code == 401
+    response = client.post('/login', json={'username': 'user', 'password': 'guess'})
+    assert response.status_code == 429 and int(response.headers['Retry-After']) > 0
+    assert authenticator.hashes == hashes + 2
+
+    login_admin(client)
+    login_admin(client)
+    assert client.get('/api/auth/metrics').json['hashes'] <= hashes + 3
+
+
+def test_password_hashes_upgrade_and_invalidate_cache():
+    """Hashes are salted, upgraded on login and a new password voids the cache."""
+    auth = Authenticator(MemoryUserBackend(), 'secret', TokenBucketLimiter(100, 100),
+                         TokenBucketLimiter(100, 100), n=2 ** 4)
+    auth.add_user('ada', 'pw', 'admin')
+    stored = auth.backend.get('ada')[0]
+    assert stored != hash_password('pw', n=2 ** 4) and verify_password('pw', stored)
+    assert auth.authenticate('ada', 'pw', '1.1.1.1') == {'username': 'ada', 'role': 'admin'}
+    assert auth.authenticate('nobody', 'pw', '1.1.1.1') is None
+
+    auth.params = (2 ** 5, 8, 1)
+    hashes = auth.hashes
+    auth.authenticate('ada', 'pw', '1.1.1.1')
+    assert auth.hashes == hashes
+    auth._verified.clear()
+    auth.authenticate('ada', 'pw', '1.1.1.1')
+    assert not needs_rehash(auth.backend.get('ada')[0], 2 ** 5)
+
+    auth.add_user('ada', 'new')
+    assert auth.authenticate('ada', 'pw', '1.1.1.1') is None
+
+
+def test_create_app_initializes_once(client):
+    """create_app() is idempotent and startup metrics record each phase."""
+    assert create_app() is app
+    client.get('/health')
+    login_admin(client)
+    metrics = client.get('/api/startup/metrics').json
+    assert metrics['initialized'] and metrics['startup_ms'] > 0
+    assert {'graph_load', 'search_index', 'sample_data', 'openai_client'} <= set(metrics['phases'])
+    assert metrics['first_request']['latency_ms'] >= 0
+    assert [f.__name__ for f in app.before_request_funcs[None]] == ['sync_graph']
@@ -0,0 +1,427 @@
+import threading
+
+import pytest
+
+from graph_backends import LogBackend, SQLiteBackend
+from graph_events import EventBroadcaster
+from graph_search import SearchIndex
+from graph_store import GraphStore
+
+
+def make_store():
+    store = GraphStore()
+    for node_id in ('a', 'b', 'c'):
+        store.add_node({'id': node_id, 'label': node_id, 'type': 'entity'})
+    return store
+
+
+def test_add_edge_rejects_duplicate_pair():
+    """Only one edge is kept per (source, target) pair."""
+    store = make_store()
+    assert store.add_edge('a', 'b', 'knows')['id'] == 'a-b'
+    assert store.add_edge('a', 'b', 'likes') is None
+    assert store.edge_count() == 1
+
+
+def test_delete_node_updates_indexes():
+    """Cascade delete keeps the pair and adjacency indexes consistent."""
+    store = make_store()
+    store.add_edge('a', 'b')
+    store.add_edge('c', 'a')
+    store.add_edge('b', 'c')
+
+    assert store.delete_node('a')
+    assert not store.has_edge('a', 'b')
+    assert store.get_edge('c-a') is None
+    assert store.out_degree('c') == 0
+    assert store.in_degree('b') == 0
+    assert [e['id'] for e in store.edges()] == ['b-c']
+    assert store.add_edge('c', 'b') is not None
+
+
+def test_type_and_relation_counts_follow_mutations():
+    """Counters used by the stats report stay in step with the graph."""
+    store = make_store()
+    store.add_edge('a', 'b', 'knows')
+    store.update_node('c', {'type': 'person'})
+    assert store.type_counts() == {'entity': 2, 'person': 1}
+
+    store.delete_node('b')
+    assert store.type_counts() == {'entity': 1, 'person': 1}
+    assert store.relation_counts() == {}
+
+
+def test_invalid_fields_leave_store_untouched():
+    """Bad node fields and relations are rejected before any index changes."""
+    store = make_store()
+    store.add_edge('a', 'b', 'knows')
+    state = lambda: (store.version, store.nodes(), store.edges(), store.type_counts(), store.relation_counts())
+    before = state()
+
+    with pytest.raises(ValueError):
+        store.update_node('a', {'type': ['x']})
+    with pytest.raises(ValueError):
+        store.merge_nodes([{'id': 'd', 'label': 'd', 'type': 'entity'}, {'id': 'zzz', 'label': 'Z', 'type': ['x']}])
+    with pytest.raises(ValueError):
+        store.merge_edges([{'source': 'a', 'target': 'c', 'relation': 'r'}, {'source': 'b', 'target': 'c', 'relation': [1]}])
+    with pytest.raises(ValueError):
+        store.update_node('a', ['label'])
+
+    assert state() == before
+    assert not store.has_node('zzz')
+    assert [node['id'] for node in store.page_nodes(node_type='entity')[0]] == ['a', 'b', 'c']
+
+
+def test_update_node_keeps_its_id(tmp_path):
+    """An id in the update fields cannot rename the node or fork its stored row."""
+    path = str(tmp_path / 'graph.db')
+    store = GraphStore(SQLiteBackend(path))
+    store.add_node({'id': 'a', 'label': 'A'})
+
+    assert store.update_node('a', {'id': 'b', 'label': 'Alpha'}) == {'id': 'a', 'label': 'Alpha'}
+    assert store.get_node('a')['label'] == 'Alpha'
+    assert [node['id'] for node in GraphStore(SQLiteBackend(path)).nodes()] == ['a']
+
+
+def test_sqlite_backend_shares_graph_between_stores(tmp_path):
+    """Two stores on one SQLite file behave like two workers sharing a graph."""
+    path = str(tmp_path / 'graph.db')
+    worker_a = GraphStore(SQLiteBackend(path))
+    worker_b = GraphStore(SQLiteBackend(path))
+
+    with worker_a.transaction():
+        worker_a.add_node({'id': 'a', 'label': 'A', 'type': 'entity'})
+        worker_a.add_node({'id': 'b', 'label': 'B', 'type': 'entity'})
+        worker_a.add_edge('a', 'b', 'knows')
+    assert worker_a.version == 1
+
+    assert not worker_b.has_node('a')
+    worker_b.refresh()
+    assert worker_b.version == 1
+    assert worker_b.get_edge('a-b')['relation'] == 'knows'
+
+    # A write from a stale store first catches up with the shared state
+    worker_b.delete_node('b')
+    assert not worker_a.add_node({'id': 'a', 'label': 'A again'})
+    assert worker_a.version == 2
+    assert worker_a.edge_count() == 0
+    assert worker_a.type_counts() == {'entity': 1}
+
+
+def test_sqlite_workers_replay_foreign_writes(tmp_path):
+    """A stale store replays the logged versions it missed instead of reloading."""
+    path = str(tmp_path / 'graph.db')
+    writer = GraphStore(SQLiteBackend(path, max_logged_items=5))
+    reader = GraphStore(SQLiteBackend(path))
+    received = []
+    reader.add_listener(lambda version, changes: received.append((version, changes)))
+    state = lambda store: (store.version, store.nodes(), store.edges(), store.type_counts(), store.relation_counts())
+
+    writer.put_nodes([{'id': i, 'label': i, 'type': 'entity'} for i in 'abc'])
+    writer.add_edges([{'source': 'a', 'target': 'b', 'relation': 'knows'}, {'source': 'b', 'target': 'c', 'relation': 'r'}])
+    writer.update_node('a', {'type': 'person'})
+    writer.merge_edges([{'source': 'a', 'target': 'b', 'relation': 'likes'}])
+    writer.delete_node('c')
+    reader.build_paging_indexes()
+    reader.refresh()
+    assert state(reader) == state(writer)
+    assert [version for version, _ in received] == [1, 2, 3, 4, 5]
+    assert [change['op'] for change in received[-1][1]] == ['delete_edge', 'delete_node']
+    assert [node['id'] for node in reader.page_nodes(node_type='person')[0]] == ['a']
+    assert reader.changes_since(0)[1] is not None
+
+    # Too many items to log: the reader reloads instead
+    writer.put_nodes([{'id': str(i), 'label': str(i)} for i in range(6)])
+    reader.refresh()
+    assert state(reader) == state(writer)
+    assert received[-1] == (6, None)
+
+
+def test_broadcaster_pushes_foreign_writes_as_changes(tmp_path):
+    """Subscribers get another worker's commits as change events, not resets."""
+    path = str(tmp_path / 'graph.db')
+    writer = GraphStore(SQLiteBackend(path))
+    reader = GraphStore(SQLiteBackend(path))
+    broadcaster = EventBroadcaster(poll_interval=0.01)
+    reader.add_listener(broadcaster.on_graph_change)
+    pollers = lambda: [thread for thread in threading.enumerate() if thread.name == 'graph-events-poll']
+    idle = len(pollers())
+    events = broadcaster.subscribe()
+    broadcaster.watch(reader)
+    broadcaster.watch(reader)
+    assert len(pollers()) == idle + 1
+
+    writer.add_node({'id': 'a', 'label': 'A'})
+    writer.add_node({'id': 'b', 'label': 'B'})
+    received = [events.get(timeout=5), events.get(timeout=5)]
+    assert [(event['event'], event['version'], event['op']) for event in received] == [
+        ('change', 1, 'add_node'), ('change', 2, 'add_node')
+    ]
+
+    # The poller stops with the last subscriber
+    broadcaster.unsubscribe(events)
+    for thread in pollers():
+        thread.join(5)
+    assert len(pollers()) == 0
+
+
+def test_change_log_falls_back_to_snapshot_when_evicted():
+    """Versions evicted from the bounded change log can no longer be replayed."""
+    store = GraphStore(change_log_size=2)
+    for node_id in ('a', 'b', 'c'):
+        store.add_node({'id': node_id, 'label': node_id, 'type': 'entity'})
+
+    version, changes = store.changes_since(1)
+    assert version == 3
+    assert [c['node']['id'] for c in changes] == ['b', 'c']
+    assert store.changes_since(0) == (3, None)
+
+    with store.transaction():
+        store.clear()
+        store.put_nodes([{'id': str(i), 'label': str(i)} for i in range(5)])
+    assert store.changes_since(3) == (4, None)
+    assert store.changes_since(4) == (4, [])
+
+
+def test_log_backend_restores_graph_after_restart(tmp_path):
+    """Snapshots plus the op log rebuild the graph in a new process."""
+    directory = str(tmp_path / 'graph_data')
+    store = GraphStore(LogBackend(directory, snapshot_every=3))
+    store.add_node({'id': 'a', 'label': 'A', 'type': 'entity'})
+    store.add_node({'id': 'b', 'label': 'B', 'type': 'entity'})
+    store.add_edge('a', 'b', 'knows')
+    store.update_node('b', {'label': 'Bee'})
+    store.add_node({'id': 'c', 'label': 'C', 'type': 'entity'})
+    store.delete_node('c')
+    store._backend.close()
+
+    restarted = GraphStore(LogBackend(directory))
+    assert restarted.version == store.version
+    assert restarted.instance_id == store.instance_id
+    assert restarted.get_node('b')['label'] == 'Bee'
+    assert restarted.get_edge('a-b')['relation'] == 'knows'
+    assert not restarted.has_node('c')
+
+
+def test_log_backend_columnar_snapshot_round_trip(tmp_path):
+    """A columnar snapshot keeps extra fields, missing fields, odd ids and edge order."""
+    directory = str(tmp_path / 'graph_data')
+    store = GraphStore(LogBackend(directory, snapshot_every=1))
+    with store.transaction():
+        store.put_nodes([
+            {'id': 'a', 'label': 'A', 'type': 'entity', 'x': 1, 'y': None, 'note': {'k': [1]}},
+            {'id': 'b', 'label': 'B'},
+            {'id': 7, 'label': 'Seven', 'type': 'number'},
+        ])
+        store.add_edges([
+            {'source': 'a', 'target': 'b', 'relation': 'knows'},
+            {'source': 'a', 'target': 7, 'relation': 'counts'},
+            {'source': 7, 'target': 'b', 'relation': 'knows'},
+        ])
+    store.update_node('b', {'label': 'Bee'})
+    store._backend.close()
+
+    restarted = GraphStore(LogBackend(directory))
+    state = lambda graph: (graph.version, graph.nodes(), graph.edges(), graph.type_counts(),
+                           graph.relation_counts(), graph.in_edges('b'))
+    assert state(restarted) == state(store)
+    assert restarted.get_edge('a-7')['relation'] == 'counts'
+
+
+def test_edge_ids_with_hyphens_and_non_string_ids():
+    """Edge ids resolve back to their pair even when node ids contain '-'."""
+    store = GraphStore()
+    for node_id in ('a-b', 'c', 'a', 'b-c', 1, 2):
+        store.add_node({'id': node_id, 'label': str(node_id)})
+    assert store.add_edge('a-b', 'c')['id'] == 'a-b-c'
+    # Same public id as the edge above, so it is refused
+    assert store.add_edge('a', 'b-c') is None
+    assert store.add_edge(1, 2)['id'] == '1-2'
+
+    assert store.get_edge('a-b-c')['source'] == 'a-b'
+    assert store.get_edge('1-2') == {'id': '1-2', 'source': 1, 'target': 2, 'relation': 'related_to'}
+    assert store.delete_edge('1-2')
+    assert store.get_edge('1-2') is None
+    assert store.edge_count() == 1
+
+
+def test_node_records_keep_extra_fields():
+    """Fields outside the fixed slots survive updates and round trips."""
+    store = GraphStore()
+    store.add_node({'id': 'a', 'label': 'A', 'type': 'entity', 'x': 1, 'y': 2})
+    updated = store.update_node('a', {'label': 'Alpha', 'source': 'sample_mflix'})
+    assert updated == {'id': 'a', 'label': 'Alpha', 'type': 'entity', 'x': 1, 'y': 2, 'source': 'sample_mflix'}
+    assert store.get_node('a') == updated
+    assert store.nodes() == [updated]
+
+
+def test_merge_upserts_nodes_and_edges():
+    """Merging inserts new items, updates changed ones and skips the rest."""
+    store = make_store()
+    store.update_node('a', {'x': 10})
+    store.add_edge('a', 'b', 'knows')
+
+    assert store.merge_nodes([
+        {'id': 'a', 'label': 'A'},
+        {'id': 'b', 'label': 'b'},
+        {'id': 'd', 'label': 'd', 'type': 'entity'}
+    ]) == (1, 1, 1)
+    assert store.get_node('a') == {'id': 'a', 'label': 'A', 'type': 'entity', 'x': 10}
+
+    assert store.merge_edges([
+        {'source': 'a', 'target': 'b', 'relation': 'likes'},
+        {'source': 'b', 'target': 'c', 'relation': 'knows'},
+        {'source': 'b', 'target': 'c', 'relation': 'knows'}
+    ]) == (1, 1, 1)
+    assert store.get_edge('a-b')['relation'] == 'likes'
+    assert store.relation_counts() == {'likes': 1, 'knows': 1}
+
+
+def test_merge_edges_persists_relation_updates(tmp_path):
+    path = str(tmp_path / 'graph.db')
+    store = GraphStore(SQLiteBackend(path))
+    store.merge_nodes([{'id': 'a', 'label': 'a'}, {'id': 'b', 'label': 'b'}])
+    store.merge_edges([{'source': 'a', 'target': 'b', 'relation': 'knows'}])
+    store.merge_edges([{'source': 'a', 'target': 'b', 'relation': 'likes'}])
+
+    assert GraphStore(SQLiteBackend(path)).get_edge('a-b')['relation'] == 'likes'
+
+
+def collect_pages(fetch, limit, **filters):
+    items, cursor = fetch(limit=limit, **filters)
+    while cursor is not None:
+        page, cursor = fetch(after=cursor, limit=limit, **filters)
+        items.extend(page)
+    return items
+
+
+def test_page_nodes_follows_mutations():
+    """Pages walk nodes in creation order and the type index tracks updates."""
+    store = GraphStore()
+    for i in range(10):
+        store.add_node({'id': f'n{i}', 'label': str(i), 'type': 'even' if i % 2 == 0 else 'odd'})
+
+    page, cursor = store.page_nodes(limit=4)
+    assert [node['id'] for node in page] == ['n0', 'n1', 'n2', 'n3']
+    store.delete_node('n4')
+    store.update_node('n5', {'type': 'even'})
+    store.add_node({'id': 'n10', 'label': '10', 'type': 'even'})
+    page, _ = store.page_nodes(after=cursor, limit=3)
+    assert [node['id'] for node in page] == ['n5', 'n6', 'n7']
+
+    evens = collect_pages(store.page_nodes, 2, node_type='even')
+    assert [node['id'] for node in evens] == ['n0', 'n2', 'n5', 'n6', 'n8', 'n10']
+
+
+def test_page_edges_filters():
+    """Edge pages can be filtered by source, target and relation."""
+    store = GraphStore()
+    for node_id in 'abcd':
+        store.add_node({'id': node_id, 'label': node_id, 'type': 'entity'})
+    store.page_edges(limit=1)
+    store.add_edges([
+        {'source': 'a', 'target': 'b', 'relation': 'knows'},
+        {'source': 'a', 'target': 'c', 'relation': 'likes'},
+        {'source': 'a', 'target': 'd', 'relation': 'knows'},
+        {'source': 'b', 'target': 'c', 'relation': 'knows'},
+        {'source': 'd', 'target': 'c', 'relation': 'likes'}
+    ])
+    store.merge_edges([{'source': 'a', 'target': 'c', 'relation': 'knows'}])
+
+    assert [edge['id'] for edge in collect_pages(store.page_edges, 2)] == ['a-b', 'a-c', 'a-d', 'b-c', 'd-c']
+    assert [edge['id'] for edge in collect_pages(store.page_edges, 1, relation='knows')] == ['a-b', 'a-c', 'a-d', 'b-c']
+    assert [edge['id'] for edge in collect_pages(store.page_edges, 1, relation='likes')] == ['d-c']
+    assert [edge['id'] for edge in collect_pages(store.page_edges, 2, target='c')] == ['a-c', 'b-c', 'd-c']
+    assert [edge['id'] for edge in collect_pages(store.page_edges, 2, source='a', relation='knows')] == ['a-b', 'a-c', 'a-d']
+
+
+def make_chain_store():
+    """a -> b -> c -> d, plus a shortcut a -> x -> d and a stray y -> b."""
+    store = GraphStore()
+    for node_id in 'abcdxy':
+        store.add_node({'id': node_id, 'label': node_id, 'type': 'entity'})
+    for source, target in ('ab', 'bc', 'cd', 'ax', 'xd', 'yb'):
+        store.add_edge(source, target)
+    return store
+
+
+def test_neighborhood_directions_and_limit():
+    store = make_chain_store()
+    result = store.neighborhood('b', depth=1, direction='out')
+    assert {node['id']: node['depth'] for node in result['nodes']} == {'b': 0, 'c': 1}
+
+    result = store.neighborhood('b', depth=2, direction='both')
+    assert {node['id'] for node in result['nodes']} == {'a', 'b', 'c', 'd', 'x', 'y'}
+    assert len(result['edges']) == 5 and not result['truncated']
+
+    assert store.neighborhood('b', depth=2, limit=3)['truncated']
+    assert store.neighborhood('missing') is None
+
+
+def test_shortest_path_bidirectional():
+    store = make_chain_store()
+    assert store.shortest_path('a', 'd')['path'] == ['a', 'x', 'd']
+    assert store.shortest_path('d', 'a')['path'] is None
+    assert store.shortest_path('d', 'a', direction='in')['path'] == ['d', 'x', 'a']
+    result = store.shortest_path('y', 'x', direction='both')
+    assert result['path'] == ['y', 'b', 'a', 'x']
+    assert [edge['id'] for edge in result['edges']] == ['y-b', 'a-b', 'a-x']
+    assert store.shortest_path('a', 'c', max_depth=1)['path'] is None
+
+
+def test_search_index_follows_mutations():
+    store = GraphStore()
+    index = SearchIndex(store)
+    store.add_listener(index.on_graph_change)
+    store.put_nodes([
+        {'id': 'p1', 'label': 'Ada Lovelace', 'type': 'person'},
+        {'id': 'p2', 'label': 'Alan Turing', 'type': 'person'},
+        {'id': 'c1', 'label': 'Analytical Engine', 'type': 'machine'}
+    ])
+    assert [r['id'] for r in index.search(q='turing')['results']] == ['p2']
+    assert {r['id'] for r in index.search(prefix='a')['results']} == {'p1', 'p2', 'c1'}
+    assert [r['id'] for r in index.search(prefix='an', node_type='machine')['results']] == ['c1']
+    assert [r['id'] for r in index.search(prefix='alan tu')['results']] == ['p2']
+    assert [r['id'] for r in index.search(q='P1')['results']] == ['p1']
+
+    store.update_node('p2', {'label': 'Grace Hopper'})
+    assert index.search(q='turing')['results'] == []
+    assert [r['id'] for r in index.search(prefix='hop')['results']] == ['p2']
+    store.delete_node('c1')
+    assert index.search(prefix='analy')['results'] == []
+    store.clear()
+    assert len(index) == 0
+
+
+def test_node_tuples_fill_missing_fields():
+    store = GraphStore()
+    store.add_node({'id': 'a', 'label': 'A'})
+    assert store.node_tuples(('id', 'type', 'label')) == [('a', None, 'A')]
+    assert store.node_tuples(('x',)) == [(None,)]
+
+
+def test_whole_graph_reads_run_alongside_writes():
+    """Full scans take the store lock instead of failing on a concurrent write."""
+    store = make_store()
+    stop = threading.Event()
+
+    def write():
+        i = 0
+        while not stop.is_set():
+            store.add_node({'id': f'w{i}', 'label': 'w'})
+            store.add_edge(f'w{i}', 'a')
+            store.delete_node(f'w{i}')
+            i += 1
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        for _ in range(2000):
+            store.nodes()
+            store.edges()
+            store.degrees()
+            store.weak_components()
+            store.relation_counts()
+    finally:
+        stop.set()
+        writer.join()
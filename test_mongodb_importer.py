@@ -0,0 +1,93 @@
+import logging
+
+import pytest
+
+from graph_store import GraphStore
+from mongodb_importer import SAMPLE_DATABASES, import_database, parallel_batches
+
+mongomock = pytest.importorskip('mongomock')
+
+
+@pytest.fixture
+def analytics_db():
+    db = mongomock.MongoClient()['sample_analytics']
+    db.customers.insert_many([
+        {'_id': 'c1', 'username': 'alice', 'accounts': [101, 102], 'address': 'not imported'},
+        {'_id': 'c2', 'username': 'bob', 'accounts': [103, 999]},
+        {'_id': 'c3', 'username': 'carol'}
+    ])
+    db.accounts.insert_many([
+        {'account_id': 101, 'account_title': 'Savings'},
+        {'account_id': 102, 'account_title': 'Checking'},
+        {'account_id': 103}
+    ])
+    return db
+
+
+def test_import_database_reads_documents_and_references(analytics_db):
+    """Documents become nodes and reference fields become edges to imported targets."""
+    graph = GraphStore()
+    counts = import_database(graph, analytics_db, 'sample_analytics', batch_size=2, workers=2)
+
+    assert counts == {'nodes_imported': 6, 'edges_imported': 3, 'dangling_references': 1}
+    assert graph.get_node('customers_c1')['label'] == 'alice'
+    assert 'address' not in graph.get_node('customers_c1')
+    assert graph.get_node('accounts_103')['label'] == '103'
+    assert graph.has_edge('customers_c2', 'accounts_103')
+    assert graph.relation_counts() == {'owns': 3}
+
+
+def test_import_database_limit(analytics_db):
+    graph = GraphStore()
+    import_database(graph, analytics_db, 'sample_analytics', limit=1)
+    assert graph.node_count() == 2
+
+
+def test_parallel_batches_reraises_producer_errors():
+    def failing():
+        yield [1]
+        raise ValueError('cursor failed')
+
+    with pytest.raises(ValueError, match='cursor failed'):
+        list(parallel_batches([lambda: iter([[2], [3]]), failing], workers=2))
+
+
+def test_import_database_merge(analytics_db):
+    graph = GraphStore()
+    import_database(graph, analytics_db, 'sample_analytics')
+    graph.update_node('customers_c1', {'x': 40})
+    analytics_db.customers.update_one({'_id': 'c3'}, {'$set': {'username': 'caroline'}})
+
+    counts = import_database(graph, analytics_db, 'sample_analytics', merge=True)
+    assert counts['nodes'] == {'inserted': 0, 'updated': 1, 'skipped': 5}
+    assert counts['edges'] == {'inserted': 0, 'updated': 0, 'skipped': 3}
+    assert graph.get_node('customers_c1')['x'] == 40
+
+
+def test_import_database_links_every_relationship():
+    """Every configured relationship builds edges; mflix comments link to movies and users."""
+    db = mongomock.MongoClient()['sample_mflix']
+    db.movies.insert_many([{'_id': 'm1', 'title': 'Alien'}, {'_id': 'm2', 'title': 'Heat'}])
+    db.users.insert_many([{'_id': 'u1', 'name': 'Ned', 'email': 'ned@example.com'}])
+    db.comments.insert_many([
+        {'_id': 'k1', 'text': 'Scary', 'movie_id': 'm1', 'email': 'ned@example.com'},
+        {'_id': 'k2', 'text': 'Long', 'movie_id': 'm2', 'email': 'gone@example.com'}
+    ])
+    graph = GraphStore()
+    counts = import_database(graph, db, 'sample_mflix')
+
+    assert counts == {'nodes_imported': 5, 'edges_imported': 3, 'dangling_references': 1}
+    assert graph.has_edge('comments_k1', 'users_ned@example.com')
+    assert graph.relation_counts() == {'comments_on': 2, 'written_by': 1}
+
+
+def test_import_database_warns_about_relationships_without_reference_field(analytics_db, monkeypatch, caplog):
+    schema = dict(SAMPLE_DATABASES['sample_analytics'])
+    schema['relationships'] = schema['relationships'] + [
+        {'source_collection': 'accounts', 'target_collection': 'customers', 'relation': 'held_by'}
+    ]
+    monkeypatch.setitem(SAMPLE_DATABASES, 'sample_analytics', schema)
+    with caplog.at_level(logging.WARNING, logger='mongodb_importer'):
+        counts = import_database(GraphStore(), analytics_db, 'sample_analytics')
+    assert counts['edges_imported'] == 3
+    assert 'accounts -> customers (held_by)' in caplog.text
@@ -0,0 +1,292 @@
+"""
+Hashed Credential Store
+
+Keeps user accounts with salted scrypt password hashes and checks logins
+in a fixed order, cheapest first, so credential-stuffing floods are
+rejected before they cost any hashing:
+
+    1. per-IP token bucket (see rate_limit.py)
+    2. verified-credential cache: a keyed HMAC of credentials that passed
+       scrypt recently, so a returning user skips the hash
+    3. per-username token bucket
+    4. a bounded number of concurrent scrypt verifications per process
+
+Unknown usernames are verified against a dummy hash, so the response
+time does not reveal which accounts exist. Hashes carry their scrypt
+parameters and are upgraded on the next successful login after the
+parameters change.
+
+Available backends:
+    memory: accounts live in the process (single worker only)
+    sqlite: a SQLite database shared by all workers on a host
+
+Manage accounts from the command line:
+    python user_store.py --db users.db add alice --role admin
+    python user_store.py --db users.db delete alice
+"""
+
+import argparse
+import base64
+import getpass
+import hashlib
+import hmac
+import os
+import sqlite3
+import threading
+
+from llm_cache import ResponseCache
+from rate_limit import RateLimited
+
+# n=2**14, r=8 takes ~16 MiB and ~60 ms of one core per hash
+DEFAULT_SCRYPT_N = 2 ** 14
+DEFAULT_SCRYPT_R = 8
+DEFAULT_SCRYPT_P = 1
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+
+def _b64(data):
+    return base64.b64encode(data).decode('ascii')
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(
+        password.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+        maxmem=2 * 128 * r * n, dklen=KEY_BYTES
+    )
+
+
+def hash_password(password, n=DEFAULT_SCRYPT_N, r=DEFAULT_SCRYPT_R, p=DEFAULT_SCRYPT_P):
+    """Hash a password with a fresh salt, e.g. 'scrypt$16384$8$1$<salt>$<key>'."""
+    salt = os.urandom(SALT_BYTES)
+    return f'scrypt${n}${r}${p}${_b64(salt)}${_b64(_scrypt(password, salt, n, r, p))}'
+
+
+def _parse(encoded):
+    scheme, n, r, p, salt, key = encoded.split('$')
+    if scheme != 'scrypt':
+        raise ValueError(f'Unknown password hash scheme {scheme!r}')
+    return int(n), int(r), int(p), base64.b64decode(salt), base64.b64decode(key)
+
+
+def verify_password(password, encoded):
+    """Check a password against a hash, comparing in constant time."""
+    n, r, p, salt, key = _parse(encoded)
+    return hmac.compare_digest(_scrypt(password, salt, n, r, p), key)
+
+
+def needs_rehash(encoded, n=DEFAULT_SCRYPT_N, r=DEFAULT_SCRYPT_R, p=DEFAULT_SCRYPT_P):
+    """Return True if a hash was made with other parameters than these."""
+    return _parse(encoded)[:3] != (n, r, p)
+
+
+class MemoryUserBackend:
+    """Backend keeping accounts in a dict of the current process."""
+
+    def __init__(self):
+        self._users = {}
+
+    def get(self, username):
+        """Return (password hash, role), or None."""
+        return self._users.get(username)
+
+    def put(self, username, password_hash, role):
+        self._users[username] = (password_hash, role)
+
+    def delete(self, username):
+        return self._users.pop(username, None) is not None
+
+    def count(self):
+        return len(self._users)
+
+    def close(self):
+        pass
+
+
+class SQLiteUserBackend:
+    """Backend storing accounts in a SQLite database in WAL mode."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            username TEXT PRIMARY KEY,
+            password_hash TEXT NOT NULL,
+            role TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @property
+    def conn(self):
+        """Connection for the current thread, reopened after a fork."""
+        local = self._local
+        if getattr(local, 'conn', None) is None or local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(self.SCHEMA)
+            local.conn = conn
+            local.pid = os.getpid()
+        return local.conn
+
+    def close(self):
+        """Close the current thread's connection, e.g. before forking."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local.conn = None
+
+    def get(self, username):
+        """Return (password hash, role), or None."""
+        return self.conn.execute(
+            'SELECT password_hash, role FROM users WHERE username = ?', (username,)
+        ).fetchone()
+
+    def put(self, username, password_hash, role):
+        self.conn.execute(
+            'INSERT OR REPLACE INTO users (username, password_hash, role) VALUES (?, ?, ?)',
+            (username, password_hash, role)
+        )
+
+    def delete(self, username):
+        return self.conn.execute('DELETE FROM users WHERE username = ?', (username,)).rowcount > 0
+
+    def count(self):
+        return self.conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+
+
+def create_user_backend(name, path=None):
+    """Build a user backend by name."""
+    if name == 'memory':
+        return MemoryUserBackend()
+    if name == 'sqlite':
+        return SQLiteUserBackend(path or 'users.db')
+    raise ValueError(f"Unknown user backend {name!r}: use 'memory' or 'sqlite'")
+
+
+class Authenticator:
+    """
+    Verify logins against a user backend behind rate limits and a cache.
+
+    Args:
+        backend: User backend from create_user_backend()
+        secret: Key for the verified-credential HMACs, e.g. the app's SECRET_KEY
+        ip_limiter, user_limiter: TokenBucketLimiter instances
+        max_hashes: scrypt verifications allowed to run at once
+        hash_wait: Seconds a login waits for a free hashing slot
+        cache_size, cache_ttl: Bounds of the verified-credential cache
+        n, r, p: scrypt parameters for new hashes
+    """
+
+    def __init__(self, backend, secret, ip_limiter, user_limiter, max_hashes=2, hash_wait=1.0,
+                 cache_size=10000, cache_ttl=900,
+                 n=DEFAULT_SCRYPT_N, r=DEFAULT_SCRYPT_R, p=DEFAULT_SCRYPT_P):
+        self.backend = backend
+        self.ip_limiter = ip_limiter
+        self.user_limiter = user_limiter
+        self.hash_wait = hash_wait
+        self.params = (n, r, p)
+        self._secret = secret.encode('utf-8') if isinstance(secret, str) else secret
+        self._slots = threading.BoundedSemaphore(max_hashes)
+        self._verified = ResponseCache(max_entries=cache_size, ttl=cache_ttl)
+        self._dummy_hash = hash_password('', *self.params)
+        self._lock = threading.Lock()
+        self.hashes = 0
+        self.busy = 0
+        self.failures = 0
+
+    def add_user(self, username, password, role='user'):
+        self.backend.put(username, hash_password(password, *self.params), role)
+
+    def _credential_key(self, username, password):
+        message = username.encode('utf-8') + b'\0' + password.encode('utf-8')
+        return hmac.new(self._secret, message, hashlib.sha256).digest()
+
+    def authenticate(self, username, password, ip):
+        """
+        Check a username and password.
+
+        Returns:
+            dict: {'username': ..., 'role': ...}, or None if the credentials are wrong
+
+        Raises:
+            RateLimited: If the IP or username is over its limit, or every
+                hashing slot stayed busy for hash_wait seconds
+        """
+        self.ip_limiter.take(ip)
+
+        record = self.backend.get(username)
+        key = self._credential_key(username, password)
+        cached = self._verified.lookup(key)
+        # A changed password or role replaces the stored row, voiding the entry
+        if cached is not None and record is not None and cached == tuple(record):
+            return {'username': username, 'role': record[1]}
+
+        self.user_limiter.take(username)
+        if not self._slots.acquire(timeout=self.hash_wait):
+            with self._lock:
+                self.busy += 1
+            raise RateLimited('hashing', 1.0)
+        try:
+            with self._lock:
+                self.hashes += 1
+            password_hash = self._dummy_hash if record is None else record[0]
+            valid = verify_password(password, password_hash) and record is not None
+            if valid and needs_rehash(password_hash, *self.params):
+                password_hash = hash_password(password, *self.params)
+                self.backend.put(username, password_hash, record[1])
+                record = (password_hash, record[1])
+        finally:
+            self._slots.release()
+
+        if not valid:
+            with self._lock:
+                self.failures += 1
+            return None
+        self._verified.put(key, tuple(record))
+        return {'username': username, 'role': record[1]}
+
+    def metrics(self):
+        """Return counters for monitoring."""
+        cache = self._verified.metrics()
+        with self._lock:
+            return {
+                'users': self.backend.count(),
+                'scrypt': dict(zip(('n', 'r', 'p'), self.params)),
+                'hashes': self.hashes,
+                'failures': self.failures,
+                'hash_slots_busy': self.busy,
+                'verified_cache': {key: cache[key] for key in ('entries', 'hits', 'evictions')},
+                'ip_limit': self.ip_limiter.metrics(),
+                'user_limit': self.user_limiter.metrics()
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage login accounts.')
+    parser.add_argument('--db', default=os.getenv('USER_DB_PATH', 'users.db'))
+    commands = parser.add_subparsers(dest='command', required=True)
+    add = commands.add_parser('add', help='Add a user or reset their password')
+    add.add_argument('username')
+    add.add_argument('--role', choices=['user', 'admin'], default='user')
+    delete = commands.add_parser('delete', help='Delete a user')
+    delete.add_argument('username')
+    args = parser.parse_args()
+
+    backend = SQLiteUserBackend(args.db)
+    if args.command == 'add':
+        password = getpass.getpass(f'Password for {args.username}: ')
+        if not password or password != getpass.getpass('Repeat password: '):
+            parser.error('passwords are empty or do not match')
+        backend.put(args.username, hash_password(password), args.role)
+        print(f'Saved {args.username} ({args.role})')
+    elif not backend.delete(args.username):
+        parser.error(f'no user {args.username!r}')
+    else:
+        print(f'Deleted {args.username}')
+
+
+if __name__ == '__main__':
+    main()